@@ -2,33 +2,80 @@
 Custom API server for Biome Coaching Agent with video upload support.
 Wraps the ADK agent and provides REST endpoints for the React frontend.
 """
+import asyncio
+import hmac
+import json
 import os
-import uuid
-import shutil
 import time
+import uuid
+from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import (
+    BackgroundTasks,
+    Depends,
+    FastAPI,
+    UploadFile,
+    File,
+    Form,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import (
+    FileResponse,
+    JSONResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
+from starlette.concurrency import run_in_threadpool
+from starlette.types import Receive, Scope, Send
 import uvicorn
 
 # Import ADK agent and tools
 from biome_coaching_agent.config import settings
 from biome_coaching_agent.tools.upload_video import upload_video
-from biome_coaching_agent.tools.extract_pose_landmarks import extract_pose_landmarks
-from biome_coaching_agent.tools.analyze_workout_form import analyze_workout_form
-from biome_coaching_agent.tools.save_analysis_results import save_analysis_results
+from biome_coaching_agent.ingest import CHUNK_SIZE, validate_extension, ingest_stream
+from biome_coaching_agent import resumable_upload
+from biome_coaching_agent import progress
+from biome_coaching_agent import live
+from biome_coaching_agent import result_cache
+from biome_coaching_agent import janitor
+from biome_coaching_agent import storage
+from biome_coaching_agent import http_range
+from biome_coaching_agent import clips
+from biome_coaching_agent import thumbnails
+from biome_coaching_agent import metrics
+from biome_coaching_agent import tracing
+from biome_coaching_agent import profiling
+from biome_coaching_agent.pipeline import run_analysis
 from biome_coaching_agent.logging_config import get_logger
 from biome_coaching_agent.exceptions import (
     ValidationError,
     DatabaseError,
     PoseExtractionError,
     AnalysisError,
+    UploadTooLargeError,
+    UploadNotFoundError,
+    StorageError,
+    SessionNotFoundError,
+    VideoProcessingError,
+    ConfigurationError,
+)
+from db.connection import close_pool, get_pool_stats
+from db.async_connection import (
+    close_async_pool,
+    get_async_db_connection,
+    get_async_pool_stats,
+    open_async_pool,
 )
-from db.connection import get_db_connection
-from db import queries
+from db import async_queries
+from db.pagination import clamp_page_size, decode_cursor, encode_cursor
 
 # Initialize logger
 logger = get_logger(__name__)
@@ -63,12 +110,166 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Error message prefixes per pipeline step (kept stable for the frontend)
+STEP_ERROR_PREFIXES = {
+    "pose_extraction": "Pose extraction failed",
+    "analysis": "Analysis failed",
+    "save_results": "Failed to save results",
+}
+
+# Allowance for multipart boundaries and form fields around the video part
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Seconds between SSE keep-alive comments
+SSE_KEEPALIVE_SECONDS = 15
+
+# Stored videos are content-addressed, so a cached copy never goes stale
+VIDEO_CACHE_CONTROL = "private, max-age=86400"
+
+# Thumbnail sheet names are content-addressed
+THUMBNAIL_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+# Probes and scrapes would drown real requests in traces
+UNTRACED_PATHS = {"/health", "/metrics"}
+
+# Values accepted by the status filter of session listings
+SESSION_STATUSES = {"pending", "queued", "processing", "completed", "failed"}
+
 # Ensure uploads directory exists
 UPLOADS_DIR = Path(settings.uploads_dir)
 UPLOADS_DIR.mkdir(exist_ok=True)
 logger.info(f"Uploads directory: {UPLOADS_DIR.absolute()}")
 
 
+@app.on_event("startup")
+async def start_progress_listener():
+    """Receive progress published by other instances (postgres backend only)."""
+    progress.get_broker().start_listener()
+
+
+@app.on_event("shutdown")
+async def stop_progress_listener():
+    progress.get_broker().stop_listener()
+
+
+@app.on_event("startup")
+async def start_janitor():
+    """Keep UPLOADS_DIR within its disk budget (JANITOR_ENABLED only)."""
+    janitor.start_background()
+
+
+@app.on_event("shutdown")
+async def stop_janitor():
+    janitor.stop_background()
+
+
+@app.on_event("shutdown")
+async def stop_clip_renders():
+    clips.shutdown()
+
+
+@app.on_event("shutdown")
+async def flush_traces():
+    await run_in_threadpool(tracing.shutdown)
+
+
+@app.on_event("startup")
+async def open_database_pool():
+    """Open the async pool used by the read endpoints."""
+    try:
+        await open_async_pool()
+    except Exception as e:
+        # Connections are retried by the pool; /health reports the outage
+        logger.error(f"Failed to open async database pool: {e}")
+
+
+@app.on_event("shutdown")
+async def close_database_pool():
+    await close_async_pool()
+    close_pool()
+
+
+def _is_admin(x_admin_token: Optional[str]) -> bool:
+    return bool(
+        settings.admin_api_token
+        and x_admin_token
+        and hmac.compare_digest(x_admin_token, settings.admin_api_token)
+    )
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Dependency guarding admin endpoints with the X-Admin-Token header."""
+    if not settings.admin_api_token:
+        raise HTTPException(status_code=403, detail="Admin API is disabled (ADMIN_API_TOKEN not set)")
+    if not _is_admin(x_admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+def profile_trigger(
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None),
+) -> Optional[str]:
+    """Dependency deciding whether the new session's analysis is profiled."""
+    requested = bool(x_profile) and x_profile.strip().lower() not in ("0", "false")
+    if requested and not _is_admin(x_admin_token):
+        # Profiling is expensive: only admins may force it
+        logger.warning("Ignoring X-Profile without a valid admin token")
+        requested = False
+    return profiling.choose_trigger(requested)
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Reject uploads whose declared size is over the limit before reading them."""
+    content_length = request.headers.get("content-length")
+    if request.method in ("POST", "PUT") and content_length and content_length.isdigit():
+        if int(content_length) > settings.max_upload_size_bytes + MULTIPART_OVERHEAD_BYTES:
+            logger.warning(
+                f"Rejected {request.method} {request.url.path}: "
+                f"Content-Length {content_length} over limit"
+            )
+            return JSONResponse(
+                status_code=413,
+                content={
+                    "detail": {
+                        "error": f"File exceeds {settings.max_upload_size_mb}MB limit",
+                        "error_type": "validation",
+                        "step": "upload"
+                    }
+                },
+            )
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Open the root trace span of each request (registered last: outermost)."""
+    if request.url.path in UNTRACED_PATHS:
+        return await call_next(request)
+    with tracing.span(
+        f"{request.method} {request.url.path}",
+        root=True,
+        traceparent=request.headers.get("traceparent"),
+        kind="server",
+        **{"http.method": request.method, "url.path": request.url.path},
+    ) as span:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if route is not None and hasattr(route, "path"):
+            # Templated name groups spans across sessions
+            span.name = f"{request.method} {route.path}"
+            span.set_attribute("http.route", route.path)
+        session_id = request.scope.get("path_params", {}).get("session_id")
+        if session_id:
+            span.set_attribute("session_id", session_id)
+        span.set_attribute("http.status_code", response.status_code)
+        if span.recording:
+            if response.status_code >= 500:
+                span.status = "error"
+            response.headers["X-Trace-Id"] = span.trace_id
+        return response
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -78,24 +279,46 @@ async def root():
         "status": "running",
         "endpoints": {
             "health": "/health",
+            "metrics": "/metrics",
             "analyze": "/api/analyze",
-            "results": "/api/results/{session_id}"
+            "uploads": "/api/uploads",
+            "results": "/api/results/{session_id}",
+            "events": "/api/sessions/{session_id}/events",
+            "video": "/api/sessions/{session_id}/video",
+            "issue_clip": "/api/sessions/{session_id}/issues/{issue_id}/clip",
+            "thumbnails": "/api/sessions/{session_id}/thumbnails",
+            "progress": "/api/users/{user_id}/progress",
+            "user_sessions": "/api/users/{user_id}/sessions",
+            "live": "/ws/live?exercise=squat"
         }
     }
 
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint (text exposition format)"""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    # Collectors query the database and take locks: keep them off the event loop
+    body = await run_in_threadpool(metrics.render)
+    return Response(content=body, media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     try:
         # Test database connection
-        with get_db_connection() as conn:
-            queries.ping(conn)
+        async with get_async_db_connection() as conn:
+            await async_queries.ping(conn)
         
         return {
             "status": "healthy",
             "service": "biome-coaching-api",
-            "database": "connected"
+            "database": "connected",
+            "pool": get_pool_stats(),
+            "async_pool": get_async_pool_stats(),
+            "janitor": janitor.last_report(),
         }
     except Exception as e:
         logger.error(f"Health check failed: {e}")
@@ -111,9 +334,12 @@ async def health_check():
 
 @app.post("/api/analyze")
 async def analyze_video_endpoint(
+    background_tasks: BackgroundTasks,
     video: UploadFile = File(...),
     exercise_name: str = Form(...),
     user_id: Optional[str] = Form(None),
+    wait: bool = Form(True),
+    profile: Optional[str] = Depends(profile_trigger),
 ):
     """
     Upload and analyze a workout video.
@@ -125,16 +351,21 @@ async def analyze_video_endpoint(
     4. Saves results to database
     5. Returns complete analysis
     
+    When ANALYSIS_QUEUE_ENABLED is set, or the client sends wait=false,
+    steps 2-4 run in the background and the endpoint returns 202 with the
+    session ID right away; progress is streamed from
+    /api/sessions/{session_id}/events.
+    
     Args:
         video: Uploaded video file
         exercise_name: Name of exercise being performed
         user_id: Optional user identifier
+        wait: Hold the request until analysis finishes (default True)
     
     Returns:
         Complete analysis results with issues, metrics, strengths, and recommendations
     """
     start_time = time.time()
-    temp_path = None
     
     try:
         logger.info(
@@ -142,31 +373,35 @@ async def analyze_video_endpoint(
             f"user_id: {user_id}, filename: {video.filename}"
         )
         
-        # Generate session ID
-        session_id = str(uuid.uuid4())
-        
-        # Save uploaded file temporarily
-        temp_path = UPLOADS_DIR / f"temp_{session_id}_{video.filename}"
-        logger.debug(f"Saving uploaded file to temporary location: {temp_path}")
-        
-        with temp_path.open("wb") as buffer:
-            shutil.copyfileobj(video.file, buffer)
-        
-        file_size = temp_path.stat().st_size
-        logger.info(f"File saved: {file_size} bytes")
-        
-        # Step 1: Upload video (copies to permanent location with session_id)
-        logger.info(f"Step 1/4: Uploading video for session {session_id}")
-        upload_result = upload_video(
-            video_file_path=str(temp_path),
-            exercise_name=exercise_name,
-            user_id=user_id,
-        )
+        # Stream the upload straight into the content store: one write,
+        # hashed and size-checked as it arrives.
+        upload_started = time.perf_counter()
+        try:
+            ext = validate_extension(video.filename)
+            stored = await run_in_threadpool(ingest_stream, video.file, ext)
+        except ValidationError as ve:
+            logger.warning(f"Upload rejected: {ve}")
+            raise HTTPException(
+                status_code=413 if isinstance(ve, UploadTooLargeError) else 400,
+                detail={
+                    "error": str(ve),
+                    "error_type": "validation",
+                    "step": "upload"
+                }
+            )
+        logger.info(f"File saved: {stored.size_bytes} bytes")
         
-        # Clean up temp file
-        if temp_path and temp_path.exists():
-            temp_path.unlink()
-            logger.debug("Temporary file cleaned up")
+        # Step 1: Upload video (creates the session for the stored file)
+        logger.info(f"Step 1/4: Uploading video {stored.content_hash}")
+        with tracing.span("upload_video", size_bytes=stored.size_bytes):
+            upload_result = await run_in_threadpool(
+                upload_video,
+                video_file_path=stored.path,
+                exercise_name=exercise_name,
+                user_id=user_id,
+                enqueue=settings.analysis_queue_enabled,
+                profile=profile,
+            )
         
         if upload_result.get("status") != "success":
             error_msg = upload_result.get("message", "Upload failed")
@@ -182,70 +417,49 @@ async def analyze_video_endpoint(
             )
         
         session_id = upload_result["session_id"]
+        metrics.STAGE_SECONDS.labels("upload").observe(time.perf_counter() - upload_started)
+        tracing.set_session(session_id)
         logger.info(f"Video uploaded successfully, session_id: {session_id}")
         
-        # Step 2: Extract pose landmarks
-        logger.info(f"Step 2/4: Extracting pose landmarks for session {session_id}")
-        pose_result = extract_pose_landmarks(session_id=session_id, fps=10)
+        if upload_result.get("reused_session_id"):
+            # Identical video already analyzed: answer from the stored results
+            return await _reused_analysis_response(session_id, upload_result, start_time)
         
-        if pose_result.get("status") != "success":
-            error_msg = pose_result.get("message", "Pose extraction failed")
-            logger.error(f"Pose extraction failed: {error_msg}")
-            raise HTTPException(
-                status_code=500,
-                detail={
-                    "error": f"Pose extraction failed: {error_msg}",
-                    "step": "pose_extraction",
-                    "session_id": session_id
-                }
+        if settings.analysis_queue_enabled or not wait:
+            # Runs in a worker (python -m biome_coaching_agent.worker) or a
+            # background task; clients follow the events stream instead.
+            status = _start_analysis(background_tasks, session_id, exercise_name, profile)
+            logger.info(f"Session {session_id} analysis running in background ({status})")
+            return JSONResponse(
+                status_code=202,
+                content={
+                    "status": status,
+                    "session_id": session_id,
+                    "status_url": f"/api/sessions/{session_id}",
+                    "events_url": f"/api/sessions/{session_id}/events",
+                    "results_url": f"/api/results/{session_id}",
+                },
             )
         
-        logger.info(
-            f"Pose extraction complete: {pose_result.get('total_frames', 0)} frames processed"
-        )
-        
-        # Step 3: Analyze form
-        logger.info(f"Step 3/4: Analyzing form for session {session_id}")
-        analysis_result = analyze_workout_form(
-            pose_data=pose_result,
-            exercise_name=exercise_name,
+        # Steps 2-4: Extract pose, analyze form, save results
+        # Off the event loop: live sockets and event streams keep flowing meanwhile
+        pipeline_result = await run_in_threadpool(
+            run_analysis, session_id, exercise_name, profile=profile
         )
         
-        if analysis_result.get("status") != "success":
-            error_msg = analysis_result.get("message", "Analysis failed")
-            logger.error(f"Form analysis failed: {error_msg}")
+        if pipeline_result.get("status") != "success":
+            step = pipeline_result.get("step", "unknown")
+            error_msg = pipeline_result.get("message", "Analysis failed")
             raise HTTPException(
                 status_code=500,
                 detail={
-                    "error": f"Analysis failed: {error_msg}",
-                    "step": "analysis",
+                    "error": f"{STEP_ERROR_PREFIXES.get(step, 'Analysis failed')}: {error_msg}",
+                    "step": step,
                     "session_id": session_id
                 }
             )
         
-        logger.info(
-            f"Form analysis complete: score {analysis_result.get('overall_score')}/10, "
-            f"{len(analysis_result.get('issues', []))} issues found"
-        )
-        
-        # Step 4: Save results to database
-        logger.info(f"Step 4/4: Saving results for session {session_id}")
-        save_result = save_analysis_results(
-            session_id=session_id,
-            analysis_data=analysis_result,
-        )
-        
-        if save_result.get("status") != "success":
-            error_msg = save_result.get("message", "Failed to save results")
-            logger.error(f"Save results failed: {error_msg}")
-            raise HTTPException(
-                status_code=500,
-                detail={
-                    "error": f"Failed to save results: {error_msg}",
-                    "step": "save_results",
-                    "session_id": session_id
-                }
-            )
+        analysis_result = pipeline_result["analysis"]
         
         processing_time = time.time() - start_time
         logger.info(
@@ -256,7 +470,7 @@ async def analyze_video_endpoint(
         return JSONResponse({
             "status": "success",
             "session_id": session_id,
-            "result_id": save_result.get("result_id"),
+            "result_id": pipeline_result.get("result_id"),
             "overall_score": analysis_result.get("overall_score"),
             "total_frames": analysis_result.get("total_frames"),
             "processing_time": round(processing_time, 2),
@@ -270,13 +484,6 @@ async def analyze_video_endpoint(
         raise
     except Exception as e:
         logger.critical(f"Unexpected error in analyze endpoint: {e}", exc_info=True)
-        # Clean up temp file on error
-        if temp_path and temp_path.exists():
-            try:
-                temp_path.unlink()
-            except Exception:
-                pass
-        
         raise HTTPException(
             status_code=500,
             detail={
@@ -286,24 +493,254 @@ async def analyze_video_endpoint(
         )
 
 
+async def _reused_analysis_response(
+    session_id: str,
+    upload_result: dict,
+    start_time: float,
+) -> JSONResponse:
+    """Analyze-style response for a session linked to an earlier identical analysis."""
+    async with get_async_db_connection() as conn:
+        document = await async_queries.get_analysis_result_json(conn, session_id)
+    if not document:
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "error": "Reused analysis results are missing",
+                "step": "save_results",
+                "session_id": session_id
+            }
+        )
+    stored = json.loads(document)
+    
+    processing_time = time.time() - start_time
+    logger.info(
+        f"Session {session_id} reused results of {upload_result['reused_session_id']} "
+        f"in {processing_time:.2f}s"
+    )
+    return JSONResponse({
+        "status": "success",
+        "session_id": session_id,
+        "result_id": stored["result"]["id"],
+        "reused_session_id": upload_result["reused_session_id"],
+        "overall_score": stored["result"]["overall_score"],
+        "total_frames": stored["result"]["total_frames"],
+        "processing_time": round(processing_time, 2),
+        "issues": stored["issues"],
+        "metrics": stored["metrics"],
+        "strengths": [s["strength_text"] for s in stored["strengths"]],
+        "recommendations": stored["recommendations"],
+    })
+
+
+def _start_analysis(
+    background_tasks: BackgroundTasks,
+    session_id: str,
+    exercise_name: str,
+    profile: Optional[str] = None,
+) -> str:
+    """
+    Kick off steps 2-4 for an uploaded session without holding the request.
+    
+    Returns the session status the client should expect ("queued" when the
+    worker queue is enabled, otherwise "processing" in a background task).
+    """
+    if settings.analysis_queue_enabled:
+        return "queued"  # The worker reads the profile request from the session
+    background_tasks.add_task(run_analysis, session_id, exercise_name, profile=profile)
+    return "processing"
+
+
+def _upload_error(e: Exception) -> HTTPException:
+    """Map resumable-upload errors to HTTP responses."""
+    if isinstance(e, UploadNotFoundError):
+        return HTTPException(status_code=404, detail=str(e))
+    if isinstance(e, UploadTooLargeError):
+        return HTTPException(status_code=413, detail=str(e))
+    return HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/api/uploads", status_code=201)
+async def initiate_resumable_upload(
+    filename: str = Form(...),
+    total_size: int = Form(...),
+    exercise_name: str = Form(...),
+    user_id: Optional[str] = Form(None),
+):
+    """
+    Start a resumable upload.
+    
+    The client then PUTs chunks to /api/uploads/{upload_id}?offset=N with an
+    X-Chunk-SHA256 header, can GET the upload to see which ranges arrived,
+    and POSTs /api/uploads/{upload_id}/finalize to start analysis.
+    """
+    try:
+        manifest = await run_in_threadpool(
+            resumable_upload.initiate_upload, filename, total_size, exercise_name, user_id
+        )
+    except ValidationError as e:
+        raise _upload_error(e)
+    
+    return JSONResponse(
+        status_code=201,
+        content={
+            **manifest.to_status(),
+            "upload_url": f"/api/uploads/{manifest.upload_id}",
+        },
+    )
+
+
+@app.put("/api/uploads/{upload_id}")
+async def put_upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    x_chunk_sha256: str = Header(...),
+    content_length: Optional[int] = Header(None),
+):
+    """
+    Store one chunk of a resumable upload at the given byte offset.
+    
+    A Content-Length over RESUMABLE_CHUNK_SIZE_MB is refused with 413
+    before the body is read; the body is streamed into the partial file
+    in 1 MB writes, never buffered whole.
+    """
+    try:
+        writer = await run_in_threadpool(
+            resumable_upload.open_chunk, upload_id, offset, content_length
+        )
+        try:
+            pending: List[bytes] = []
+            pending_size = 0
+            async for piece in request.stream():
+                pending.append(piece)
+                pending_size += len(piece)
+                if pending_size >= CHUNK_SIZE:
+                    await run_in_threadpool(writer.write, b"".join(pending))
+                    pending, pending_size = [], 0
+            if pending:
+                await run_in_threadpool(writer.write, b"".join(pending))
+            manifest = await run_in_threadpool(writer.commit, x_chunk_sha256)
+        finally:
+            writer.close()
+    except (ValidationError, UploadNotFoundError) as e:
+        raise _upload_error(e)
+    return JSONResponse(manifest.to_status())
+
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload_status(upload_id: str):
+    """Report received byte ranges so a client can resume where it left off."""
+    try:
+        manifest = await run_in_threadpool(resumable_upload.get_upload, upload_id)
+    except UploadNotFoundError as e:
+        raise _upload_error(e)
+    return JSONResponse(manifest.to_status())
+
+
+@app.post("/api/uploads/{upload_id}/finalize", status_code=202)
+async def finalize_resumable_upload(
+    upload_id: str,
+    background_tasks: BackgroundTasks,
+    sha256: Optional[str] = Form(None),
+    profile: Optional[str] = Depends(profile_trigger),
+):
+    """Verify a complete upload, create its analysis session and start analysis."""
+    upload_started = time.perf_counter()
+    try:
+        manifest, stored = await run_in_threadpool(
+            resumable_upload.finalize_upload, upload_id, sha256
+        )
+    except (ValidationError, UploadNotFoundError) as e:
+        raise _upload_error(e)
+    
+    with tracing.span("upload_video", size_bytes=stored.size_bytes):
+        upload_result = await run_in_threadpool(
+            upload_video,
+            video_file_path=stored.path,
+            exercise_name=manifest.exercise_name,
+            user_id=manifest.user_id,
+            enqueue=settings.analysis_queue_enabled,
+            profile=profile,
+        )
+    if upload_result.get("status") != "success":
+        error_type = upload_result.get("error_type", "unknown")
+        raise HTTPException(
+            status_code=400 if error_type == "validation" else 500,
+            detail={
+                "error": upload_result.get("message", "Upload failed"),
+                "error_type": error_type,
+                "step": "upload"
+            }
+        )
+    
+    session_id = upload_result["session_id"]
+    metrics.STAGE_SECONDS.labels("upload").observe(time.perf_counter() - upload_started)
+    tracing.set_session(session_id)
+    if upload_result.get("reused_session_id"):
+        # Identical video already analyzed; results are available now
+        status = "completed"
+    else:
+        status = _start_analysis(background_tasks, session_id, manifest.exercise_name, profile)
+    logger.info(f"Upload {upload_id} finalized as session {session_id} ({status})")
+    
+    return JSONResponse(
+        status_code=200 if status == "completed" else 202,
+        content={
+            "status": status,
+            "session_id": session_id,
+            "reused_session_id": upload_result.get("reused_session_id"),
+            "status_url": f"/api/sessions/{session_id}",
+            "events_url": f"/api/sessions/{session_id}/events",
+            "results_url": f"/api/results/{session_id}",
+        },
+    )
+
+
+def _cached_response(entry: result_cache.CacheEntry, if_none_match: Optional[str]) -> Response:
+    """Serve a cache entry with validators, or 304 when the client's copy is current."""
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": (
+            f"private, max-age={settings.result_cache_max_age_seconds}"
+            if entry.final else "no-cache"
+        ),
+    }
+    if result_cache.etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
 @app.get("/api/results/{session_id}")
-async def get_results(session_id: str):
+async def get_results(session_id: str, if_none_match: Optional[str] = Header(None)):
     """
     Get analysis results for a session.
     
+    Results are immutable once saved, so they are cached in-process and
+    served with a strong ETag; clients revalidate with If-None-Match.
+    
     Args:
         session_id: The analysis session ID
     
     Returns:
         Complete analysis results if available
     """
+    cache = result_cache.get_result_cache()
     try:
         logger.info(f"Fetching results for session {session_id}")
         
-        with get_db_connection() as conn:
-            result = queries.get_analysis_result_by_session(conn, session_id)
+        entry = cache.get(result_cache.RESULTS, session_id)
+        if entry is None:
+            async with get_async_db_connection() as conn:
+                document = await async_queries.get_analysis_result_json(conn, session_id)
+            
+            if document:
+                # Postgres already built the JSON document; send it without re-encoding
+                entry = cache.put(result_cache.RESULTS, session_id, document.encode("utf-8"), final=True)
+            else:
+                # Not saved yet: remember briefly so tight polling loops stay off the database
+                entry = cache.put(result_cache.RESULTS, session_id, b"", final=False, status_code=404)
         
-        if not result:
+        if entry.status_code == 404:
             logger.warning(f"No results found for session {session_id}")
             raise HTTPException(
                 status_code=404,
@@ -311,7 +748,7 @@ async def get_results(session_id: str):
             )
         
         logger.info(f"Results retrieved successfully for session {session_id}")
-        return JSONResponse(result)
+        return _cached_response(entry, if_none_match)
         
     except HTTPException:
         raise
@@ -324,34 +761,39 @@ async def get_results(session_id: str):
 
 
 @app.get("/api/sessions/{session_id}")
-async def get_session(session_id: str):
+async def get_session(session_id: str, if_none_match: Optional[str] = Header(None)):
     """
     Get session information including status.
     
+    Finished sessions are cached until evicted; in-flight ones for
+    RESULT_CACHE_PENDING_TTL_SECONDS.
+    
     Args:
         session_id: The analysis session ID
     
     Returns:
         Session details including status
     """
+    cache = result_cache.get_result_cache()
     try:
         logger.debug(f"Fetching session info for {session_id}")
         
-        with get_db_connection() as conn:
-            session_row = queries.get_analysis_session(conn, session_id)
-        
-        if not session_row:
-            raise HTTPException(status_code=404, detail="Session not found")
+        entry = cache.get(result_cache.SESSION, session_id)
+        if entry is None:
+            async with get_async_db_connection() as conn:
+                session = await async_queries.get_session_summary(conn, session_id)
+            
+            if not session:
+                raise HTTPException(status_code=404, detail="Session not found")
+            
+            entry = cache.put(
+                result_cache.SESSION,
+                session_id,
+                JSONResponse(session).body,
+                final=session["status"] in progress.TERMINAL_EVENTS,
+            )
         
-        # Parse the row (structure: id, user_id, exercise_id, exercise_name, video_url, ...)
-        return JSONResponse({
-            "session_id": str(session_row[0]),
-            "user_id": str(session_row[1]) if session_row[1] else None,
-            "exercise_name": session_row[3],
-            "video_url": session_row[4],
-            "status": session_row[6],
-            "created_at": session_row[7].isoformat() if session_row[7] else None,
-        })
+        return _cached_response(entry, if_none_match)
         
     except HTTPException:
         raise
@@ -360,6 +802,517 @@ async def get_session(session_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/sessions/{session_id}/video")
+async def get_session_video(
+    session_id: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Serve the uploaded video of a session for playback and seeking.
+    
+    Supports single byte ranges (206 / 416), If-Range and If-None-Match
+    against a strong ETag (the content hash). Local files are streamed in
+    chunks without loading them into memory; with an object store backend
+    the client is redirected to a pre-signed URL, and the store serves
+    the ranges itself.
+    
+    Args:
+        session_id: The analysis session ID
+    
+    Returns:
+        The video (200/206), 304, or a 307 redirect to the object store
+    """
+    _require_uuid(session_id, "Session not found")
+    try:
+        async with get_async_db_connection() as conn:
+            video = await async_queries.get_session_video(conn, session_id)
+    except Exception as e:
+        logger.error(f"Error fetching video of session {session_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if not video:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if not video["video_url"]:
+        raise HTTPException(status_code=404, detail="Video not found for this session")
+    
+    try:
+        signed_url = await run_in_threadpool(
+            storage.signed_video_url, video["video_url"], settings.video_signed_url_ttl_seconds
+        )
+        if signed_url:
+            return RedirectResponse(signed_url, status_code=307, headers={"Cache-Control": "no-store"})
+        path = await run_in_threadpool(storage.local_video_path, video["video_url"])
+        stat = await run_in_threadpool(os.stat, path)
+    except (StorageError, FileNotFoundError) as e:
+        logger.warning(f"Video of session {session_id} unavailable: {e}")
+        raise HTTPException(status_code=404, detail="Video not found for this session")
+    
+    etag = (
+        f'"{video["content_hash"]}"' if video["content_hash"]
+        else f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    )
+    return _media_response(path, stat, etag, range_header, if_range, if_none_match)
+
+
+@app.get("/api/sessions/{session_id}/issues/{issue_id}/clip")
+async def get_issue_clip(
+    session_id: str,
+    issue_id: str,
+    style: str = Query(clips.DEFAULT_STYLE),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Get a short clip of one flagged issue with the skeleton drawn over it.
+    
+    The first request renders the clip from the stored landmarks (only the
+    issue's frames are decoded and encoded); later ones are served from the
+    clip cache with the same range support as the session video.
+    
+    Args:
+        session_id: The analysis session ID
+        issue_id: The issue's ID (`issues[].id` of the results)
+        style: Annotation style (`skeleton` or `coach`)
+    
+    Returns:
+        The clip as video/mp4 (200/206), or 304
+    """
+    _require_uuid(session_id, "Session not found")
+    _require_uuid(issue_id, "Issue not found")
+    if style not in clips.STYLES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid style; expected one of {', '.join(sorted(clips.STYLES))}"
+        )
+    
+    try:
+        render = asyncio.wrap_future(clips.get_issue_clip(session_id, issue_id, style))
+        # Shielded: a client giving up must not cancel a render others wait for
+        path = await asyncio.wait_for(asyncio.shield(render), settings.clip_render_timeout_seconds)
+        stat = await run_in_threadpool(os.stat, path)
+    except SessionNotFoundError:
+        raise HTTPException(status_code=404, detail="Issue not found for this session")
+    except (VideoProcessingError, StorageError) as e:
+        logger.warning(f"Clip of issue {issue_id} (session {session_id}) unavailable: {e}")
+        raise HTTPException(status_code=404, detail=f"Clip not available: {e}")
+    except ConfigurationError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=503,
+            detail="Clip is still rendering; retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    except Exception as e:
+        logger.error(f"Error rendering clip of issue {issue_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    etag = f'"{session_id}.{issue_id}.{style}-{stat.st_mtime_ns:x}"'
+    return _media_response(path, stat, etag, range_header, if_range, if_none_match)
+
+
+@app.get("/api/sessions/{session_id}/thumbnails")
+async def get_session_thumbnails(session_id: str, if_none_match: Optional[str] = Header(None)):
+    """
+    Get the preview thumbnail index of a session.
+    
+    All thumbnails (issue starts/ends, rep tops/bottoms) are tiles of one
+    sprite sheet at `sheet_url`; each entry gives its frame, time and tile
+    offset. The sheet is built during analysis, or here if it is missing.
+    
+    Args:
+        session_id: The analysis session ID
+    
+    Returns:
+        {sheet_url, format, tile_width, tile_height, columns, rows, thumbnails}
+    """
+    _require_uuid(session_id, "Session not found")
+    try:
+        index = await run_in_threadpool(thumbnails.ensure_sheet, session_id)
+    except (VideoProcessingError, StorageError) as e:
+        logger.warning(f"Thumbnails of session {session_id} unavailable: {e}")
+        raise HTTPException(status_code=404, detail=f"Thumbnails not available: {e}")
+    except Exception as e:
+        logger.error(f"Error building thumbnails for session {session_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    if index is None:
+        raise HTTPException(status_code=404, detail="Results not found for this session")
+    
+    etag = f'"{index["sheet"]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if result_cache.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    body = {
+        "sheet_url": f"/api/sessions/{session_id}/thumbnails/{index['sheet']}",
+        **{k: v for k, v in index.items() if k != "sheet"},
+    }
+    return JSONResponse(body, headers=headers)
+
+
+@app.get("/api/sessions/{session_id}/thumbnails/{name}")
+async def get_thumbnail_sheet(session_id: str, name: str):
+    """
+    Get a thumbnail sprite sheet (URL from the thumbnail index).
+    
+    Sheet names carry a digest of their content, so they are cached as
+    immutable.
+    """
+    path = thumbnails.sheet_path(name)
+    if path is None or not await run_in_threadpool(os.path.isfile, path):
+        raise HTTPException(status_code=404, detail="Thumbnail sheet not found")
+    return FileResponse(
+        path,
+        media_type=storage.content_type(path),
+        headers={"Cache-Control": THUMBNAIL_CACHE_CONTROL},
+    )
+
+
+class _WholeFileResponse(FileResponse):
+    """
+    FileResponse that always sends the whole file.
+    
+    Ranges are resolved by http_range before this is chosen; without this
+    Starlette would re-parse the request's Range and answer multi-range
+    requests with multipart/byteranges or malformed ones with a 400.
+    """
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        headers = [(k, v) for k, v in scope["headers"] if k not in (b"range", b"if-range")]
+        await super().__call__({**scope, "headers": headers}, receive, send)
+
+
+def _media_response(
+    path: str,
+    stat: os.stat_result,
+    etag: str,
+    range_header: Optional[str],
+    if_range: Optional[str],
+    if_none_match: Optional[str],
+) -> Response:
+    """Serve an immutable local media file with validators and single byte ranges."""
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": VIDEO_CACHE_CONTROL,
+    }
+    if result_cache.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    
+    media_type = storage.content_type(path)
+    try:
+        byte_range = (
+            http_range.parse_range(range_header, stat.st_size)
+            if http_range.if_range_allows(if_range, etag) else None
+        )
+    except http_range.RangeNotSatisfiable:
+        return Response(
+            status_code=416,
+            headers={**headers, "Content-Range": f"bytes */{stat.st_size}"},
+        )
+    
+    if byte_range is None:
+        # Whole file: servers with the ASGI pathsend extension send it zero-copy
+        return _WholeFileResponse(path, media_type=media_type, headers=headers, stat_result=stat)
+    
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        http_range.iter_file(path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+@app.get("/api/users/{user_id}/progress")
+async def get_user_progress(
+    user_id: str,
+    exercise: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None),
+    cursor: Optional[str] = Query(None),
+):
+    """
+    Progress summary and recent sessions for a user.
+    
+    Aggregates (count, mean score, recent score, trend) come from one
+    `user_progress` row per exercise, maintained on every save; the recent
+    list is keyset-paginated, so the cost does not grow with history.
+    
+    Args:
+        user_id: The user ID
+        exercise: Restrict to one exercise name
+        limit: Recent sessions per page (default 20, max 100)
+        cursor: `next_cursor` from the previous page
+    
+    Returns:
+        {user_id, progress: [...], recent: [...], next_cursor}
+    """
+    _require_uuid(user_id, "User not found")
+    after = _decode_cursor(cursor)
+    page_size = clamp_page_size(limit)
+    
+    try:
+        async with get_async_db_connection() as conn:
+            aggregates = await async_queries.get_user_progress(conn, user_id, exercise)
+            # One extra row tells us whether another page exists
+            recent = await async_queries.list_sessions(
+                conn, page_size + 1, after=after, user_id=user_id, exercise_name=exercise
+            )
+    except Exception as e:
+        logger.error(f"Error fetching progress for user {user_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    recent, next_cursor = _session_page(recent, page_size)
+    return JSONResponse({
+        "user_id": user_id,
+        "progress": aggregates,
+        "recent": recent,
+        "next_cursor": next_cursor,
+    })
+
+
+@app.get("/api/users/{user_id}/sessions")
+async def list_user_sessions(
+    user_id: str,
+    exercise: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    limit: Optional[int] = Query(None),
+    cursor: Optional[str] = Query(None),
+):
+    """
+    A user's session history, newest first.
+    
+    Args:
+        user_id: The user ID
+        exercise: Restrict to one exercise name
+        status: Restrict to one session status
+        created_from: Only sessions created at or after this time (ISO 8601)
+        created_to: Only sessions created before this time (ISO 8601)
+        limit: Sessions per page (default 20, max 100)
+        cursor: `next_cursor` from the previous page
+    
+    Returns:
+        {sessions: [...], next_cursor}
+    """
+    _require_uuid(user_id, "User not found")
+    return await _list_sessions_response(
+        cursor, limit,
+        user_id=user_id,
+        exercise_name=exercise,
+        status=status,
+        created_from=created_from,
+        created_to=created_to,
+    )
+
+
+@app.get("/api/sessions", dependencies=[Depends(require_admin)])
+async def list_all_sessions(
+    user_id: Optional[str] = Query(None),
+    exercise: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    limit: Optional[int] = Query(None),
+    cursor: Optional[str] = Query(None),
+):
+    """
+    Admin listing of all sessions, newest first (requires X-Admin-Token).
+    
+    Same filters and cursor pagination as /api/users/{user_id}/sessions.
+    """
+    if user_id:
+        _require_uuid(user_id, "User not found")
+    return await _list_sessions_response(
+        cursor, limit,
+        user_id=user_id,
+        exercise_name=exercise,
+        status=status,
+        created_from=created_from,
+        created_to=created_to,
+    )
+
+
+@app.get("/api/admin/profiling", dependencies=[Depends(require_admin)])
+async def get_profiling_settings():
+    """Current profiling sample rate and sampler settings of this instance."""
+    return profiling.status()
+
+
+@app.put("/api/admin/profiling", dependencies=[Depends(require_admin)])
+async def set_profiling_sample_rate(sample_rate: float = Query(..., ge=0.0, le=1.0)):
+    """
+    Profile this share of new sessions (0 turns sampling off).
+    
+    Applies to the API instance that receives the call; workers follow the
+    decision stored with each session.
+    """
+    profiling.set_sample_rate(sample_rate)
+    return profiling.status()
+
+
+@app.get("/api/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles(limit: Optional[int] = Query(None)):
+    """Newest stored run profiles (summaries)."""
+    async with get_async_db_connection() as conn:
+        profiles = await async_queries.list_session_profiles(conn, clamp_page_size(limit))
+    return {"profiles": profiles}
+
+
+@app.get("/api/admin/profiles/{session_id}", dependencies=[Depends(require_admin)])
+async def get_profile(session_id: str):
+    """Per-stage timings, memory and top allocations of a session's profiled run."""
+    _require_uuid(session_id, "Profile not found")
+    async with get_async_db_connection() as conn:
+        report = await async_queries.get_session_profile(conn, session_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    report["stacks_url"] = f"/api/admin/profiles/{session_id}/stacks"
+    return report
+
+
+@app.get("/api/admin/profiles/{session_id}/stacks", dependencies=[Depends(require_admin)])
+async def get_profile_stacks(session_id: str):
+    """Folded stacks of a profiled run (flamegraph.pl, speedscope, inferno)."""
+    _require_uuid(session_id, "Profile not found")
+    async with get_async_db_connection() as conn:
+        stacks = await async_queries.get_session_profile_stacks(conn, session_id)
+    if stacks is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(
+        content=stacks,
+        media_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="{session_id}.folded"'},
+    )
+
+
+def _require_uuid(value: str, not_found: str) -> None:
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        raise HTTPException(status_code=404, detail=not_found)
+
+
+def _decode_cursor(cursor: Optional[str]):
+    try:
+        return decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _session_page(rows: List[Dict[str, Any]], page_size: int):
+    """Trim the look-ahead row, build the next cursor and serialize timestamps."""
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["session_id"])
+    for row in rows:
+        row["created_at"] = row["created_at"].isoformat() if row["created_at"] else None
+    return rows, next_cursor
+
+
+async def _list_sessions_response(cursor: Optional[str], limit: Optional[int], **filters) -> JSONResponse:
+    if filters.get("status") and filters["status"] not in SESSION_STATUSES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid status; expected one of {', '.join(sorted(SESSION_STATUSES))}"
+        )
+    after = _decode_cursor(cursor)
+    page_size = clamp_page_size(limit)
+    
+    try:
+        async with get_async_db_connection() as conn:
+            rows = await async_queries.list_sessions(conn, page_size + 1, after=after, **filters)
+    except Exception as e:
+        logger.error(f"Error listing sessions: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    sessions, next_cursor = _session_page(rows, page_size)
+    return JSONResponse({"sessions": sessions, "next_cursor": next_cursor})
+
+
+@app.get("/api/sessions/{session_id}/events")
+async def stream_session_events(
+    session_id: str,
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Stream analysis progress as Server-Sent Events.
+    
+    Events: `stage` (pipeline step transitions), `progress` (percent of
+    frames processed by the extractor), `metrics` (partial results before
+    persistence), `retrying` (a queued attempt failed transiently and the
+    session went back to the queue), then a terminal `completed` or
+    `failed`. Reconnecting clients resume from the Last-Event-ID header.
+    """
+    try:
+        uuid.UUID(session_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    after_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    broker = progress.get_broker()
+    
+    if not broker.history(session_id):
+        # Nothing published in this process: fall back to the stored status so
+        # finished (or unknown) sessions do not leave the client hanging.
+        async with get_async_db_connection() as conn:
+            session_status = await async_queries.get_session_status(conn, session_id)
+        if not session_status:
+            raise HTTPException(status_code=404, detail="Session not found")
+        status = session_status["status"]
+        if status in progress.TERMINAL_EVENTS:
+            event = {
+                "id": 1,
+                "session_id": session_id,
+                "event": status,
+                "data": {"message": session_status["error_message"]} if status == "failed" else {},
+                "ts": time.time(),
+            }
+            return StreamingResponse(
+                iter([progress.format_sse(event)]),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache"},
+            )
+    
+    async def event_stream():
+        subscription = broker.subscribe(session_id, after_id=after_id)
+        try:
+            while not await request.is_disconnected():
+                event = await subscription.next(timeout=SSE_KEEPALIVE_SECONDS)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield progress.format_sse(event)
+                if event["event"] in progress.TERMINAL_EVENTS:
+                    break
+        finally:
+            subscription.close()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/ws/live")
+async def live_coaching(websocket: WebSocket, exercise: str = "squat"):
+    """
+    Real-time rep counting and form cues.
+    
+    Send JPEG frames (with a seq/timestamp header) or landmark packets; see
+    biome_coaching_agent.live for the message format.
+    """
+    await live.serve(websocket, exercise=exercise)
+
+
 if __name__ == "__main__":
     # Configure server using centralized settings
     logger.info(f"Starting Biome Coaching API server on {settings.host}:{settings.port}")
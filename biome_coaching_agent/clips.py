@@ -0,0 +1,343 @@
+"""
+Annotated clips of flagged form issues.
+
+A clip shows one issue's frame range (plus a little padding) of the
+original video with the MediaPipe skeleton drawn over it, in the colours of
+vision_test/pushup_tracker.py. Nothing is re-detected: landmarks come from
+the pose series the extractor stored (see pose_store), sampled at
+POSE_DETECTION_FPS and interpolated for the frames in between. Only the
+issue's segment is decoded (the capture seeks to its first frame) and
+encoded, so the cost of a clip depends on the issue, not on the length of
+the video.
+
+Clips are rendered on first request by a small thread pool (decoding,
+drawing and ffmpeg all release the GIL) and cached in UPLOADS_DIR/clips,
+keyed by (session, issue, style). Issue rows never change - re-scoring
+writes new ones - so a cached clip stays valid until the janitor evicts it.
+Requests for a clip that is already rendering share the same job.
+"""
+import os
+import subprocess
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+import cv2  # type: ignore
+import numpy as np  # type: ignore
+
+from db.connection import get_db_connection  # type: ignore
+from db import queries  # type: ignore
+from biome_coaching_agent.config import settings
+from biome_coaching_agent.logging_config import get_logger
+from biome_coaching_agent.ingest import uploads_dir
+from biome_coaching_agent import pose_store
+from biome_coaching_agent.storage import local_video_path, mark_used
+from biome_coaching_agent.transcode import ffmpeg_available
+from biome_coaching_agent.exceptions import (
+  ConfigurationError,
+  DatabaseError,
+  SessionNotFoundError,
+  ValidationError,
+  VideoProcessingError,
+)
+
+# Initialize logger
+logger = get_logger(__name__)
+
+# Subdirectory of UPLOADS_DIR (the janitor evicts it as derived data)
+CLIPS_SUBDIR = "clips"
+
+# Drawing sizes are for a 480-pixel-high frame and scale with the output
+_REFERENCE_HEIGHT = 480.0
+
+# Severity colours of the caption bar (BGR)
+SEVERITY_COLORS = {
+  "severe": (68, 68, 239),
+  "moderate": (8, 179, 234),
+  "minor": (246, 130, 59),
+}
+
+
+@dataclass(frozen=True)
+class ClipStyle:
+  """How a clip is annotated."""
+  name: str
+  landmark_color: Tuple[int, int, int]  # BGR
+  connection_color: Tuple[int, int, int]  # BGR
+  thickness: int = 2
+  circle_radius: int = 2
+  caption: bool = False  # Issue type bar during the flagged frames
+
+
+STYLES: Dict[str, ClipStyle] = {
+  style.name: style for style in (
+    ClipStyle("skeleton", landmark_color=(245, 117, 66), connection_color=(245, 66, 230)),
+    ClipStyle("coach", landmark_color=(245, 117, 66), connection_color=(245, 66, 230), caption=True),
+  )
+}
+DEFAULT_STYLE = "skeleton"
+
+_connections: Optional[FrozenSet[Tuple[int, int]]] = None
+
+
+def _pose_connections() -> FrozenSet[Tuple[int, int]]:
+  global _connections
+  if _connections is None:
+    # Lazy import, as in the extractor (MediaPipe pulls in protobuf)
+    import mediapipe as mp  # type: ignore
+    _connections = frozenset(mp.solutions.pose.POSE_CONNECTIONS)
+  return _connections
+
+
+def clips_dir() -> str:
+  path = os.path.join(uploads_dir(), CLIPS_SUBDIR)
+  os.makedirs(path, exist_ok=True)
+  return path
+
+
+def clip_path(session_id: str, issue_id: str, style: str) -> str:
+  return os.path.join(clips_dir(), f"{session_id}.{issue_id}.{style}.mp4")
+
+
+class _LandmarkTrack:
+  """Stored landmarks by source frame, interpolated between samples."""
+
+  def __init__(self, series: pose_store.PoseSeries):
+    self.frames = series.frame_indices.astype(np.int64)
+    self.points = series.landmarks[:, :, :2]
+    spacing = float(np.median(np.diff(self.frames))) if len(self.frames) > 1 else 1.0
+    # Wider gaps are frames without a detection: draw nothing there
+    self.max_gap = spacing * 2.5
+    self.hold = spacing / 2
+
+  def at(self, frame: int) -> Optional[np.ndarray]:
+    """(33, 2) normalized x/y for a source frame, or None if no pose is known."""
+    i = int(np.searchsorted(self.frames, frame, side="right"))
+    if i == 0:
+      return self.points[0] if self.frames[0] - frame <= self.hold else None
+    lo = i - 1
+    if i == len(self.frames) or self.frames[lo] == frame:
+      return self.points[lo] if frame - self.frames[lo] <= self.hold else None
+    gap = self.frames[i] - self.frames[lo]
+    if gap > self.max_gap:
+      return None
+    t = (frame - self.frames[lo]) / gap
+    return self.points[lo] * (1 - t) + self.points[i] * t
+
+
+def draw_skeleton(image: np.ndarray, points: np.ndarray, style: ClipStyle) -> None:
+  """Draw landmarks and connections like `mp_drawing.draw_landmarks`, in place."""
+  height, width = image.shape[:2]
+  scale = max(height / _REFERENCE_HEIGHT, 1.0)
+  thickness = max(int(round(style.thickness * scale)), 1)
+  radius = max(int(round(style.circle_radius * scale)), 1)
+  # Landmarks outside the frame are skipped, as mp_drawing does
+  visible = np.all((points >= 0) & (points <= 1), axis=1)
+  pixels = np.rint(points * (width - 1, height - 1)).astype(np.int32)
+  for a, b in _pose_connections():
+    if visible[a] and visible[b]:
+      cv2.line(image, tuple(pixels[a]), tuple(pixels[b]), style.connection_color, thickness, cv2.LINE_AA)
+  for idx in np.flatnonzero(visible):
+    cv2.circle(image, tuple(pixels[idx]), radius, style.landmark_color, thickness, cv2.LINE_AA)
+
+
+def _draw_caption(image: np.ndarray, issue: Dict[str, Any]) -> None:
+  height, width = image.shape[:2]
+  scale = max(height / _REFERENCE_HEIGHT, 1.0)
+  bar = int(36 * scale)
+  color = SEVERITY_COLORS.get(issue["severity"], (80, 80, 80))
+  overlay = image[:bar].copy()
+  cv2.rectangle(overlay, (0, 0), (width, bar), color, -1)
+  cv2.addWeighted(overlay, 0.75, image[:bar], 0.25, 0, dst=image[:bar])
+  cv2.putText(
+    image, f"{issue['issue_type']} ({issue['severity']})", (int(10 * scale), int(25 * scale)),
+    cv2.FONT_HERSHEY_SIMPLEX, 0.7 * scale, (255, 255, 255), max(int(2 * scale), 1), cv2.LINE_AA,
+  )
+
+
+def _output_size(width: int, height: int) -> Tuple[int, int]:
+  """Frame size no taller than CLIP_MAX_HEIGHT, with even sides for yuv420p."""
+  ratio = min(settings.clip_max_height / height, 1.0)
+  return max(int(width * ratio) // 2 * 2, 2), max(int(height * ratio) // 2 * 2, 2)
+
+
+def _encoder_command(dest: str, width: int, height: int, fps: float) -> list:
+  return [
+    settings.ffmpeg_binary, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+    "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", f"{fps:.3f}",
+    "-i", "-",
+    "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-pix_fmt", "yuv420p",
+    "-movflags", "+faststart",
+    "-f", "mp4", dest,
+  ]
+
+
+def _render(source: Dict[str, Any], track: _LandmarkTrack, style: ClipStyle, dest: str) -> int:
+  """Decode, annotate and encode the issue's segment into `dest`; returns frames written."""
+  cap = cv2.VideoCapture(local_video_path(source["video_url"]))
+  if not cap.isOpened():
+    raise VideoProcessingError(f"Failed to open video: {source['video_url']}")
+  encoder = None
+  written = 0
+  try:
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    pad = int(round(settings.clip_padding_seconds * fps))
+    start = max(int(source["frame_start"]) - pad, 0)
+    end = int(source["frame_end"]) + pad
+    if total > 0:
+      end = min(end, total - 1)
+    end = min(end, start + int(settings.clip_max_seconds * fps) - 1)
+
+    # Seek to the segment: the decoder starts at the preceding keyframe
+    # instead of reading the video from the beginning
+    if start > 0:
+      cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    size = None
+    for frame_no in range(start, end + 1):
+      ok, frame = cap.read()
+      if not ok:
+        break
+      if size is None:
+        size = _output_size(frame.shape[1], frame.shape[0])
+        encoder = subprocess.Popen(
+          _encoder_command(dest, size[0], size[1], fps),
+          stdin=subprocess.PIPE,
+          stdout=subprocess.DEVNULL,
+          stderr=subprocess.PIPE,
+        )
+      if (frame.shape[1], frame.shape[0]) != size:
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR)
+      points = track.at(frame_no)
+      if points is not None:
+        draw_skeleton(frame, points, style)
+      if style.caption and source["frame_start"] <= frame_no <= source["frame_end"]:
+        _draw_caption(frame, source)
+      encoder.stdin.write(frame.tobytes())
+      written += 1
+  except BrokenPipeError:
+    pass  # ffmpeg exited; its stderr is reported below
+  except BaseException:
+    if encoder is not None:
+      encoder.kill()
+      encoder.wait()
+      encoder = None
+    raise
+  finally:
+    cap.release()
+    if encoder is not None:
+      try:
+        encoder.stdin.close()
+      except BrokenPipeError:
+        pass
+
+  if encoder is None:
+    raise VideoProcessingError(f"No frames in range {source['frame_start']}-{source['frame_end']}")
+  try:
+    encoder.wait(timeout=settings.clip_render_timeout_seconds)
+  except subprocess.TimeoutExpired:
+    encoder.kill()
+    encoder.wait()
+    raise VideoProcessingError("Clip encoding timed out")
+  finally:
+    stderr = encoder.stderr.read()
+    encoder.stderr.close()
+  if encoder.returncode != 0:
+    raise VideoProcessingError(
+      f"Clip encoding failed: {stderr.decode('utf-8', 'replace').strip()[-500:] or encoder.returncode}"
+    )
+  return written
+
+
+def render_issue_clip(session_id: str, issue_id: str, style: str = DEFAULT_STYLE) -> str:
+  """
+  Render (or find) the annotated clip of one issue.
+
+  Returns:
+    Path of the cached clip
+
+  Raises:
+    ValidationError: Unknown style
+    SessionNotFoundError: No such issue in the session's results
+    VideoProcessingError: No stored landmarks, or decoding/encoding failed
+    ConfigurationError: ffmpeg is not installed
+  """
+  clip_style = STYLES.get(style)
+  if clip_style is None:
+    raise ValidationError(f"Unknown clip style '{style}'; expected one of {', '.join(sorted(STYLES))}")
+  dest = clip_path(session_id, issue_id, style)
+  if os.path.isfile(dest):
+    mark_used(dest)
+    return dest
+  if not ffmpeg_available():
+    raise ConfigurationError(f"Rendering clips requires '{settings.ffmpeg_binary}'")
+
+  try:
+    with get_db_connection() as conn:
+      source = queries.get_issue_clip_source(conn, session_id, issue_id)
+  except Exception as db_err:
+    raise DatabaseError(f"Failed to fetch issue: {db_err}") from db_err
+  if not source:
+    raise SessionNotFoundError(f"Issue {issue_id} not found in session {session_id}")
+
+  series = pose_store.load_pose_series(source["analyzed_session_id"])
+  if series is None or series.frame_count == 0:
+    raise VideoProcessingError("No stored landmarks for this session")
+
+  tmp = f"{dest}.{uuid.uuid4().hex}.part"
+  try:
+    frames = _render(source, _LandmarkTrack(series), clip_style, tmp)
+    os.replace(tmp, dest)
+  finally:
+    if os.path.exists(tmp):
+      os.remove(tmp)
+  logger.info(
+    f"Rendered clip {os.path.basename(dest)}: frames {source['frame_start']}-{source['frame_end']}, "
+    f"{frames} frames, {os.path.getsize(dest)} bytes"
+  )
+  return dest
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_renders: Dict[str, Future] = {}
+# Reentrant: a render that already finished runs its done callback at once
+_renders_lock = threading.RLock()
+
+
+def get_issue_clip(session_id: str, issue_id: str, style: str = DEFAULT_STYLE) -> Future:
+  """Future of the clip's path; cached clips resolve at once, renders are shared."""
+  global _executor
+  dest = clip_path(session_id, issue_id, style)
+  if os.path.isfile(dest):
+    mark_used(dest)
+    done: Future = Future()
+    done.set_result(dest)
+    return done
+  with _renders_lock:
+    future = _renders.get(dest)
+    if future is None:
+      if _executor is None:
+        _executor = ThreadPoolExecutor(
+          max_workers=max(settings.clip_render_workers, 1), thread_name_prefix="clip"
+        )
+      future = _executor.submit(render_issue_clip, session_id, issue_id, style)
+      _renders[dest] = future
+      # Finished renders are on disk (or failed and may be retried)
+      future.add_done_callback(lambda _: _forget(dest))
+  return future
+
+
+def _forget(dest: str) -> None:
+  with _renders_lock:
+    _renders.pop(dest, None)
+
+
+def shutdown() -> None:
+  """Stop the render pool (pending renders are cancelled)."""
+  global _executor
+  with _renders_lock:
+    executor, _executor = _executor, None
+  if executor is not None:
+    executor.shutdown(wait=False, cancel_futures=True)
@@ -44,3 +44,22 @@ class ConfigurationError(BiomeError):
     """Application configuration error."""
     pass
 
+
+class StorageError(BiomeError):
+    """Video object storage operation failed."""
+    pass
+
+
+class UploadTooLargeError(ValidationError):
+    """Uploaded file exceeds the configured size limit."""
+    pass
+
+
+class UploadNotFoundError(BiomeError):
+    """Resumable upload does not exist or has expired."""
+    pass
+
+
+class LeaseLostError(BiomeError):
+    """A queue worker no longer holds the lease on the session it processed."""
+    pass
@@ -0,0 +1,81 @@
+"""
+HTTP byte-range helpers (RFC 9110 section 14) for serving stored media.
+
+Only single ranges are served: that is what video elements request when
+seeking, and a multi-range request may legitimately be answered with the
+whole representation instead.
+"""
+import os
+import re
+from typing import Iterator, Optional, Tuple
+
+STREAM_CHUNK_SIZE = 256 * 1024
+
+# first-byte-pos "-" last-byte-pos, either side may be empty ("500-", "-500")
+_BYTE_RANGE = re.compile(r"([0-9]*)-([0-9]*)")
+
+
+class RangeNotSatisfiable(ValueError):
+  """The Range header is valid but selects no bytes of the representation."""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+  """
+  Resolve a Range header against a representation of `size` bytes.
+
+  Returns:
+    (start, end) inclusive, or None to serve the whole representation
+    (no header, another unit, several ranges or a malformed value)
+
+  Raises:
+    RangeNotSatisfiable: The range starts past the end of the content
+  """
+  if not header:
+    return None
+  unit, _, spec = header.partition("=")
+  if unit.strip().lower() != "bytes" or "," in spec:
+    return None
+  match = _BYTE_RANGE.fullmatch(spec.strip())
+  if not match or match.group(0) == "-":
+    return None
+  first, last = match.groups()
+  start = int(first) if first else None
+  end = int(last) if last else None
+  if start is None:
+    # "-N": the last N bytes
+    if not end:
+      raise RangeNotSatisfiable(header)
+    start, end = max(size - end, 0), size - 1
+  elif end is None:
+    end = size - 1
+  elif end < start:
+    return None
+  if start >= size:
+    raise RangeNotSatisfiable(header)
+  return start, min(end, size - 1)
+
+
+def if_range_allows(if_range: Optional[str], etag: str) -> bool:
+  """
+  Whether a Range may be honoured given If-Range (strong comparison).
+
+  Dates are not accepted as validators: stored media carries a strong ETag.
+  """
+  if not if_range:
+    return True
+  return if_range.strip() == etag
+
+
+def iter_file(path: str, start: int, end: int, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+  """Yield bytes `start`..`end` (inclusive) of a file with positional reads."""
+  fd = os.open(path, os.O_RDONLY)
+  try:
+    offset = start
+    while offset <= end:
+      chunk = os.pread(fd, min(chunk_size, end - offset + 1), offset)
+      if not chunk:
+        return
+      offset += len(chunk)
+      yield chunk
+  finally:
+    os.close(fd)
@@ -0,0 +1,164 @@
+"""
+Streaming video ingest for Biome Coaching Agent.
+
+Reads an upload in fixed-size chunks, enforces the configured size limit as
+bytes arrive, hashes the content on the way through and writes it exactly
+once: to a temporary file inside the uploads directory that is atomically
+renamed to its content-addressed name (`<sha256><ext>`).
+"""
+import hashlib
+import os
+import re
+import uuid
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+from biome_coaching_agent.config import settings
+from biome_coaching_agent.logging_config import get_logger
+from biome_coaching_agent.exceptions import ValidationError, UploadTooLargeError
+
+# Initialize logger
+logger = get_logger(__name__)
+
+ALLOWED_EXTENSIONS = {".mp4", ".mov", ".avi", ".webm"}
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+_CONTENT_NAME = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]+$")
+
+
+@dataclass(frozen=True)
+class StoredVideo:
+  """A video written to the content-addressed uploads directory."""
+  path: str
+  content_hash: str
+  size_bytes: int
+  created: bool  # False when identical content was already stored
+
+
+def uploads_dir() -> str:
+  """Absolute uploads directory, created on first use."""
+  path = os.path.abspath(settings.uploads_dir)
+  os.makedirs(path, exist_ok=True)
+  return path
+
+
+def validate_extension(filename: str) -> str:
+  """Return the lower-cased extension of `filename` or raise ValidationError."""
+  ext = os.path.splitext(filename or "")[1].lower()
+  if ext not in ALLOWED_EXTENSIONS:
+    raise ValidationError(
+      f"Unsupported file type: {ext or '(none)'}. "
+      f"Allowed: {', '.join(sorted(ALLOWED_EXTENSIONS))}"
+    )
+  return ext
+
+
+def content_path(content_hash: str, ext: str) -> str:
+  """Final storage path for content with the given hash."""
+  return os.path.join(uploads_dir(), f"{content_hash}{ext}")
+
+
+def _touch(path: str) -> bool:
+  """
+  Refresh the mtime of stored content that is being reused; False if it is gone.
+
+  The janitor spares content younger than JANITOR_MIN_AGE_SECONDS, which
+  covers the time until the reusing session is inserted.
+  """
+  try:
+    os.utime(path)
+  except FileNotFoundError:
+    return False
+  return True
+
+
+def stored_video_for(path: str) -> Optional[StoredVideo]:
+  """Describe `path` if it already lives in the content store, else None."""
+  abs_path = os.path.abspath(path)
+  name = os.path.basename(abs_path)
+  if os.path.dirname(abs_path) != uploads_dir() or not _CONTENT_NAME.match(name):
+    return None
+  if not os.path.isfile(abs_path) or not _touch(abs_path):
+    return None
+  return StoredVideo(
+    path=abs_path,
+    content_hash=name.split(".", 1)[0],
+    size_bytes=os.path.getsize(abs_path),
+    created=False,
+  )
+
+
+def ingest_stream(
+  stream: BinaryIO,
+  ext: str,
+  max_bytes: Optional[int] = None,
+) -> StoredVideo:
+  """
+  Stream `stream` into the content store.
+
+  Args:
+    stream: Readable binary file object positioned at the start of the video.
+    ext: File extension (including the dot) to store the content under.
+    max_bytes: Size limit; defaults to settings.max_upload_size_bytes.
+
+  Returns:
+    StoredVideo describing the stored content.
+
+  Raises:
+    UploadTooLargeError: The stream exceeded `max_bytes` (nothing is kept).
+    ValidationError: The stream was empty.
+  """
+  if max_bytes is None:
+    max_bytes = settings.max_upload_size_bytes
+
+  directory = uploads_dir()
+  tmp_path = os.path.join(directory, f".ingest-{uuid.uuid4().hex}.part")
+  digest = hashlib.sha256()
+  size = 0
+
+  try:
+    with open(tmp_path, "xb") as out:
+      while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+          break
+        size += len(chunk)
+        if size > max_bytes:
+          raise UploadTooLargeError(
+            f"File exceeds {max_bytes // (1024 * 1024)}MB limit"
+          )
+        digest.update(chunk)
+        out.write(chunk)
+      out.flush()
+      os.fsync(out.fileno())
+
+    if size == 0:
+      raise ValidationError("Uploaded file is empty")
+
+    content_hash = digest.hexdigest()
+    final_path = content_path(content_hash, ext)
+    if _touch(final_path):
+      os.remove(tmp_path)
+      logger.info(f"Content already stored: {final_path} ({size} bytes)")
+      return StoredVideo(final_path, content_hash, size, created=False)
+
+    os.replace(tmp_path, final_path)
+    logger.info(f"Stored upload: {final_path} ({size} bytes)")
+    return StoredVideo(final_path, content_hash, size, created=True)
+
+  except BaseException:
+    if os.path.exists(tmp_path):
+      try:
+        os.remove(tmp_path)
+      except OSError as cleanup_err:
+        logger.warning(f"Failed to remove partial upload {tmp_path}: {cleanup_err}")
+    raise
+
+
+def ingest_file(path: str, max_bytes: Optional[int] = None) -> StoredVideo:
+  """Store a local file (single streaming read) unless it is already stored."""
+  existing = stored_video_for(path)
+  if existing:
+    return existing
+  ext = validate_extension(path)
+  with open(path, "rb") as src:
+    return ingest_stream(src, ext, max_bytes=max_bytes)
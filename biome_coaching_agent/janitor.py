@@ -0,0 +1,355 @@
+"""
+Disk janitor for the uploads directory.
+
+Everything an instance writes locally lives under UPLOADS_DIR: original
+videos, analysis proxies, partial resumable uploads and temporary files
+from interrupted ingests, transcodes and storage fetches. The janitor keeps
+that directory within JANITOR_DISK_BUDGET_MB and drops files nobody uses:
+
+  * temporary files older than JANITOR_TEMP_MAX_AGE_SECONDS and expired
+    resumable uploads are always removed;
+  * content files whose hash no session refers to any more and whose
+    video_objects reference count is 0 (retention releases references;
+    failed uploads never took one) are removed, along with that row;
+  * files that are only copies or derived data (everything cached from S3,
+    proxies, and the render caches in CACHE_SUBDIRS) are evicted
+    least-recently-used first once they have not been read for
+    JANITOR_MAX_AGE_HOURS or while the directory is over budget. With the
+    local backend the originals are the stored videos and are never
+    evicted for space.
+
+Content of sessions that are still pending, queued or processing is never
+touched, nor is anything younger than JANITOR_MIN_AGE_SECONDS (an upload may
+be between ingest and its session insert; ingest refreshes the mtime of
+content it reuses, so this covers duplicate uploads too). If the database cannot be
+reached only temporary files and render caches are cleaned. "Last use" is
+the newer of atime and mtime; storage.mark_used refreshes atime on every
+read, so this works on relatime/noatime mounts too.
+
+Runs as a daemon thread in the API and worker (JANITOR_ENABLED) or once via:
+  python -m biome_coaching_agent.janitor [--dry-run]
+"""
+import argparse
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from db.connection import get_db_connection  # type: ignore
+from db import queries  # type: ignore
+from biome_coaching_agent.config import settings
+from biome_coaching_agent.logging_config import get_logger
+from biome_coaching_agent.ingest import uploads_dir
+from biome_coaching_agent.resumable_upload import cleanup_expired_uploads
+
+# Initialize logger
+logger = get_logger(__name__)
+
+_ORIGINAL = re.compile(r"^([0-9a-f]{64})\.[a-z0-9]+$")
+_PROXY = re.compile(r"^([0-9a-f]{64})\.p\d+f\d+\.mp4$")
+# Subdirectories holding re-creatable renders (clips.CLIPS_SUBDIR,
+# thumbnails.THUMBNAILS_SUBDIR)
+CACHE_SUBDIRS = ("clips", "thumbnails")
+
+_TEMP = re.compile(r"^\.(ingest|proxy)-[0-9a-f]+\.(part|mp4)$|\.[0-9a-f]{32}\.part$")
+
+
+@dataclass
+class JanitorReport:
+  """Outcome of one sweep."""
+  started_at: float
+  dry_run: bool = False
+  scanned_files: int = 0
+  scanned_bytes: int = 0
+  reclaimed_bytes: int = 0
+  remaining_bytes: int = 0
+  budget_bytes: int = 0
+  protected_files: int = 0
+  evicted: Dict[str, int] = field(default_factory=dict)  # reason -> files
+  database_ok: bool = True
+  duration_seconds: float = 0.0
+
+  def to_dict(self) -> Dict[str, object]:
+    return asdict(self)
+
+
+@dataclass
+class _File:
+  path: str
+  name: str
+  size: int
+  last_used: float
+  modified: float
+  content_hash: Optional[str] = None
+  is_proxy: bool = False
+  derived: bool = False  # In a render cache: evictable without a database check
+
+
+def _scan(directory: str, derived: bool = False) -> List[_File]:
+  files: List[_File] = []
+  with os.scandir(directory) as entries:
+    for entry in entries:
+      if not entry.is_file(follow_symlinks=False):
+        continue
+      try:
+        st = entry.stat(follow_symlinks=False)
+      except FileNotFoundError:
+        continue
+      f = _File(
+        path=entry.path,
+        name=entry.name,
+        size=st.st_size,
+        last_used=max(st.st_atime, st.st_mtime),
+        modified=st.st_mtime,
+        derived=derived,
+      )
+      if derived:
+        files.append(f)
+        continue
+      proxy = _PROXY.match(entry.name)
+      original = None if proxy else _ORIGINAL.match(entry.name)
+      if proxy or original:
+        f.content_hash = (proxy or original).group(1)
+        f.is_proxy = bool(proxy)
+      files.append(f)
+  return files
+
+
+def _touched_since_scan(f: _File) -> bool:
+  try:
+    return os.stat(f.path).st_mtime > f.modified
+  except FileNotFoundError:
+    return False
+
+
+def _dir_size(directory: str) -> int:
+  total = 0
+  for root, _, names in os.walk(directory):
+    for name in names:
+      try:
+        total += os.path.getsize(os.path.join(root, name))
+      except OSError:
+        pass
+  return total
+
+
+class Janitor:
+  """One configured cleaner; `sweep()` is safe to call from any thread."""
+
+  def __init__(
+    self,
+    directory: Optional[str] = None,
+    budget_bytes: Optional[int] = None,
+    max_age_seconds: Optional[float] = None,
+    temp_max_age_seconds: Optional[float] = None,
+    min_age_seconds: Optional[float] = None,
+  ):
+    self.directory = directory or uploads_dir()
+    self.budget_bytes = budget_bytes if budget_bytes is not None else settings.janitor_disk_budget_mb * 1024 * 1024
+    self.max_age_seconds = max_age_seconds if max_age_seconds is not None else settings.janitor_max_age_hours * 3600
+    self.temp_max_age_seconds = (
+      temp_max_age_seconds if temp_max_age_seconds is not None else settings.janitor_temp_max_age_seconds
+    )
+    self.min_age_seconds = min_age_seconds if min_age_seconds is not None else settings.janitor_min_age_seconds
+    # Originals are disposable copies only when the bucket holds the real object
+    self.originals_are_cache = settings.storage_backend != "local"
+    self.last_report: Optional[JanitorReport] = None
+    self._lock = threading.Lock()
+
+  def sweep(self, dry_run: bool = False, now: Optional[float] = None) -> JanitorReport:
+    with self._lock:
+      report = self._sweep(dry_run, now or time.time())
+      self.last_report = report
+    return report
+
+  def _sweep(self, dry_run: bool, now: float) -> JanitorReport:
+    started = time.monotonic()
+    report = JanitorReport(started_at=now, dry_run=dry_run, budget_bytes=self.budget_bytes)
+
+    partial_dir = os.path.join(self.directory, ".partial")
+    if os.path.isdir(partial_dir) and not dry_run:
+      before = _dir_size(partial_dir)
+      removed = cleanup_expired_uploads(now)
+      if removed:
+        report.evicted["expired_upload"] = removed
+        report.reclaimed_bytes += max(before - _dir_size(partial_dir), 0)
+
+    files = _scan(self.directory)
+    for sub in CACHE_SUBDIRS:
+      cache_dir = os.path.join(self.directory, sub)
+      if os.path.isdir(cache_dir):
+        files.extend(_scan(cache_dir, derived=True))
+    report.scanned_files = len(files)
+    report.scanned_bytes = sum(f.size for f in files)
+    remaining = report.scanned_bytes + (_dir_size(partial_dir) if os.path.isdir(partial_dir) else 0)
+
+    def evict(f: _File, reason: str) -> None:
+      nonlocal remaining
+      if not dry_run:
+        try:
+          os.remove(f.path)
+        except FileNotFoundError:
+          pass
+        except OSError as e:
+          logger.warning(f"Could not remove {f.path}: {e}")
+          return
+      remaining -= f.size
+      report.reclaimed_bytes += f.size
+      report.evicted[reason] = report.evicted.get(reason, 0) + 1
+
+    evictable: List[_File] = []
+    for f in files:
+      if _TEMP.search(f.name):
+        if now - f.modified > self.temp_max_age_seconds:
+          evict(f, "temp")
+      elif f.derived and now - f.modified > self.min_age_seconds:
+        evictable.append(f)
+
+    content = [
+      f for f in files
+      if f.content_hash and now - f.modified > self.min_age_seconds
+    ]
+    usage: Dict[str, bool] = {}
+    if content:
+      try:
+        with get_db_connection() as conn:
+          usage = queries.get_content_usage(conn, sorted({f.content_hash for f in content}))
+      except Exception as e:
+        logger.warning(f"Janitor skipped content files, database unavailable: {e}")
+        report.database_ok = False
+        content = []
+
+    unreferenced: List[_File] = []
+    for f in content:
+      if f.content_hash not in usage:
+        unreferenced.append(f)
+      elif usage[f.content_hash]:
+        report.protected_files += 1
+      elif f.is_proxy or self.originals_are_cache:
+        evictable.append(f)
+
+    # An ingest that reuses the content touches it (ingest._touch); one that
+    # ran since the scan may be about to insert its session
+    reused = [f for f in unreferenced if _touched_since_scan(f)]
+    report.protected_files += len(reused)
+    unreferenced = [f for f in unreferenced if f not in reused]
+    for f in unreferenced:
+      evict(f, "unreferenced")
+    self._forget(unreferenced, evictable=[], dry_run=dry_run)
+
+    # Least recently used first: stale files, then whatever the budget needs
+    evictable.sort(key=lambda f: f.last_used)
+    evicted_lru: List[_File] = []
+    for f in evictable:
+      if now - f.last_used > self.max_age_seconds:
+        evict(f, "expired")
+      elif self.budget_bytes > 0 and remaining > self.budget_bytes:
+        evict(f, "lru")
+      else:
+        continue
+      evicted_lru.append(f)
+    self._forget([], evictable=evicted_lru, dry_run=dry_run)
+
+    report.remaining_bytes = remaining
+    report.duration_seconds = round(time.monotonic() - started, 3)
+    if self.budget_bytes > 0 and remaining > self.budget_bytes:
+      logger.warning(
+        f"Uploads directory still over budget after sweep: {remaining} > {self.budget_bytes} bytes "
+        f"({report.protected_files} files protected by in-flight sessions)"
+      )
+    if report.evicted:
+      logger.info(
+        f"Janitor {'would reclaim' if dry_run else 'reclaimed'} {report.reclaimed_bytes} bytes "
+        f"({', '.join(f'{k}: {v}' for k, v in sorted(report.evicted.items()))}), "
+        f"{remaining} bytes remain"
+      )
+    return report
+
+  def _forget(self, unreferenced: List[_File], evictable: List[_File], dry_run: bool) -> None:
+    """Keep the database consistent with files that are gone for good."""
+    if dry_run:
+      return
+    # Unreferenced originals: nothing points at the video any more
+    dropped = sorted({f.content_hash for f in unreferenced if not f.is_proxy})
+    # Local proxies are the only copy; the extractor must not look for them
+    cleared: List[Tuple[str, str]] = []
+    if not self.originals_are_cache:
+      cleared = [(f.content_hash, f.path) for f in unreferenced + evictable if f.is_proxy]
+    if not dropped and not cleared:
+      return
+    try:
+      with get_db_connection() as conn:
+        for content_hash in dropped:
+          queries.delete_video_object(conn, content_hash)
+        for content_hash, path in cleared:
+          queries.clear_video_proxy(conn, content_hash, path)
+    except Exception as e:
+      logger.warning(f"Janitor could not update video_objects: {e}")
+
+
+_janitor: Optional[Janitor] = None
+_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+_janitor_lock = threading.Lock()
+
+
+def get_janitor() -> Janitor:
+  """Process-wide janitor configured from settings."""
+  global _janitor
+  if _janitor is None:
+    with _janitor_lock:
+      if _janitor is None:
+        _janitor = Janitor()
+  return _janitor
+
+
+def last_report() -> Optional[Dict[str, object]]:
+  report = _janitor.last_report if _janitor is not None else None
+  return report.to_dict() if report else None
+
+
+def _run() -> None:
+  janitor = get_janitor()
+  logger.info(
+    f"Janitor started - dir: {janitor.directory}, budget: {janitor.budget_bytes} bytes, "
+    f"interval: {settings.janitor_interval_seconds}s"
+  )
+  while not _stop.is_set():
+    try:
+      janitor.sweep()
+    except Exception as e:
+      logger.error(f"Janitor sweep failed: {e}", exc_info=True)
+    _stop.wait(settings.janitor_interval_seconds)
+
+
+def start_background() -> None:
+  """Start the sweep thread if JANITOR_ENABLED (idempotent)."""
+  global _thread
+  if not settings.janitor_enabled or _thread is not None:
+    return
+  _stop.clear()
+  _thread = threading.Thread(target=_run, name="janitor", daemon=True)
+  _thread.start()
+
+
+def stop_background() -> None:
+  global _thread
+  _stop.set()
+  _thread = None
+
+
+def main(argv: Optional[list] = None) -> None:
+  parser = argparse.ArgumentParser(description="Clean up the uploads directory")
+  parser.add_argument("--dry-run", action="store_true", help="Report what would be removed")
+  parser.add_argument("--budget-mb", type=int, default=None, help="Override JANITOR_DISK_BUDGET_MB")
+  args = parser.parse_args(argv)
+
+  budget = args.budget_mb * 1024 * 1024 if args.budget_mb is not None else None
+  report = Janitor(budget_bytes=budget).sweep(dry_run=args.dry_run)
+  print(report.to_dict())
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,422 @@
+"""
+Real-time rep counting and form feedback over WebSocket (`/ws/live`).
+
+Each connection gets its own persistent MediaPipe pose tracker and exercise
+state machine (ported from `vision_test/pushup_tracker.py`). Clients send
+either compressed frames or already-extracted landmarks:
+
+  * binary message: 12-byte header `<I d` (seq, client timestamp in ms)
+    followed by JPEG/PNG/WebP bytes
+  * text message:   {"type": "landmarks", "seq", "ts", "landmarks": [[x, y, z, visibility], ...]}
+                    {"type": "reset"}   (applied before the next frame)
+
+The server replies per processed frame with
+  {"type": "update", "seq", "client_ts", "reps", "state", "feedback", "angles",
+   "latency_ms": {...}, "dropped"}
+
+Only the newest unprocessed frame is kept: if inference falls behind, older
+frames are dropped instead of queueing, and frames that waited longer than
+LIVE_MAX_FRAME_AGE_MS are discarded as stale. An unknown `exercise` is
+refused: the connection is closed with code 1008 (policy violation).
+"""
+import asyncio
+import json
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np  # type: ignore
+
+from biome_coaching_agent.config import settings
+from biome_coaching_agent.exceptions import ValidationError
+from biome_coaching_agent.logging_config import get_logger
+
+# Initialize logger
+logger = get_logger(__name__)
+
+FRAME_HEADER = struct.Struct("<Id")
+
+# Push-up thresholds (from vision_test/pushup_tracker.py)
+ELBOW_EXTENDED_ANGLE = 155
+BACK_STRAIGHT_ANGLE = 145
+ELBOW_TUCK_THRESHOLD = 65
+VISIBILITY_THRESHOLD = 0.8
+
+# Squat thresholds (aligned with the agent's squat standards)
+KNEE_STANDING_ANGLE = 160
+KNEE_BOTTOM_ANGLE = 100
+SQUAT_GOOD_DEPTH_ANGLE = 90
+
+# MediaPipe landmark indices
+L_SHOULDER, R_SHOULDER = 11, 12
+L_ELBOW, R_ELBOW = 13, 14
+L_WRIST, R_WRIST = 15, 16
+L_HIP, R_HIP = 23, 24
+L_KNEE, R_KNEE = 25, 26
+L_ANKLE, R_ANKLE = 27, 28
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+# Idle pose models kept warm between connections: building a MediaPipe graph
+# costs far more than the 100 ms budget, so connections reuse them.
+_idle_poses: List[Any] = []
+_idle_poses_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+  """Shared inference pool; one frame per connection is in flight at a time."""
+  global _executor
+  if _executor is None:
+    _executor = ThreadPoolExecutor(
+      max_workers=settings.live_max_workers,
+      thread_name_prefix="live-pose",
+    )
+  return _executor
+
+
+def calculate_angle(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> float:
+  """Angle at b formed by a-b-c in degrees (0-180)."""
+  radians = np.arctan2(c[1] - b[1], c[0] - b[0]) - np.arctan2(a[1] - b[1], a[0] - b[0])
+  angle = abs(float(radians) * 180.0 / np.pi)
+  return 360 - angle if angle > 180.0 else angle
+
+
+class PushupStateMachine:
+  """get_ready -> ready -> down -> ready (rep counted)."""
+
+  def __init__(self):
+    self.reset()
+
+  def reset(self) -> None:
+    self.reps = 0
+    self.state = "get_ready"
+    self.feedback = ""
+
+  def update(self, lm: np.ndarray) -> Dict[str, float]:
+    xy = lm[:, :2]
+    visible = all(lm[i, 3] > VISIBILITY_THRESHOLD for i in (L_SHOULDER, L_ELBOW, L_HIP, R_SHOULDER, R_ELBOW, R_HIP))
+    elbow = (
+      calculate_angle(xy[L_SHOULDER], xy[L_ELBOW], xy[L_WRIST])
+      + calculate_angle(xy[R_SHOULDER], xy[R_ELBOW], xy[R_WRIST])
+    ) / 2
+    back = (
+      calculate_angle(xy[L_SHOULDER], xy[L_HIP], xy[L_ANKLE])
+      + calculate_angle(xy[R_SHOULDER], xy[R_HIP], xy[R_ANKLE])
+    ) / 2
+    form_feedback = "GOOD FORM"
+    if (calculate_angle(xy[L_HIP], xy[L_SHOULDER], xy[L_ELBOW]) > ELBOW_TUCK_THRESHOLD
+        or calculate_angle(xy[R_HIP], xy[R_SHOULDER], xy[R_ELBOW]) > ELBOW_TUCK_THRESHOLD):
+      form_feedback = "TUCK ELBOWS"
+
+    if self.state == "get_ready":
+      if visible and back > BACK_STRAIGHT_ANGLE and elbow > ELBOW_EXTENDED_ANGLE:
+        self.state = "ready"
+        self.feedback = form_feedback
+      else:
+        self.feedback = "GET INTO PLANK POSITION"
+    elif self.state == "ready":
+      self.feedback = form_feedback
+      if elbow < ELBOW_EXTENDED_ANGLE:
+        self.state = "down"
+    elif self.state == "down":
+      self.feedback = form_feedback
+      if elbow > ELBOW_EXTENDED_ANGLE:
+        self.reps += 1
+        self.state = "ready"
+        self.feedback = "REP COUNTED!"
+    return {"elbow": elbow, "back": back}
+
+
+class SquatStateMachine:
+  """standing -> descending -> bottom -> standing (rep counted)."""
+
+  def __init__(self):
+    self.reset()
+
+  def reset(self) -> None:
+    self.reps = 0
+    self.state = "get_ready"
+    self.feedback = ""
+    self._min_knee = 180.0
+
+  def update(self, lm: np.ndarray) -> Dict[str, float]:
+    xy = lm[:, :2]
+    left_knee = calculate_angle(xy[L_HIP], xy[L_KNEE], xy[L_ANKLE])
+    right_knee = calculate_angle(xy[R_HIP], xy[R_KNEE], xy[R_ANKLE])
+    knee = (left_knee + right_knee) / 2
+    hip = (
+      calculate_angle(xy[L_SHOULDER], xy[L_HIP], xy[L_KNEE])
+      + calculate_angle(xy[R_SHOULDER], xy[R_HIP], xy[R_KNEE])
+    ) / 2
+
+    if abs(left_knee - right_knee) > 15:
+      self.feedback = "KEEP KNEES EVEN"
+    elif hip < 145 and self.state != "get_ready":
+      self.feedback = "CHEST UP"
+    else:
+      self.feedback = "GOOD FORM"
+
+    if self.state == "get_ready":
+      if knee > KNEE_STANDING_ANGLE:
+        self.state = "standing"
+      else:
+        self.feedback = "STAND TALL TO START"
+    elif self.state == "standing":
+      if knee < KNEE_STANDING_ANGLE - 10:
+        self.state = "descending"
+        self._min_knee = knee
+    elif self.state in ("descending", "bottom"):
+      self._min_knee = min(self._min_knee, knee)
+      if knee < KNEE_BOTTOM_ANGLE:
+        self.state = "bottom"
+      if knee > KNEE_STANDING_ANGLE:
+        if self.state == "bottom":
+          self.reps += 1
+          self.feedback = "REP COUNTED!" if self._min_knee <= SQUAT_GOOD_DEPTH_ANGLE else "REP COUNTED - GO DEEPER"
+        else:
+          self.feedback = "GO DEEPER"
+        self.state = "standing"
+    return {"knee": knee, "hip": hip, "knee_asymmetry": abs(left_knee - right_knee)}
+
+
+STATE_MACHINES = {
+  "pushup": PushupStateMachine,
+  "push-up": PushupStateMachine,
+  "squat": SquatStateMachine,
+}
+
+
+class LiveSession:
+  """Per-connection tracker: persistent pose model plus exercise state machine."""
+
+  def __init__(self, exercise: str):
+    machine_cls = STATE_MACHINES.get(exercise.lower().rstrip("s"))
+    if machine_cls is None:
+      raise ValidationError(
+        f"Unknown exercise: {exercise} (supported: {', '.join(sorted(STATE_MACHINES))})"
+      )
+    self.exercise = exercise
+    self.machine = machine_cls()
+    self._pose = None
+
+  def _pose_model(self):
+    if self._pose is None:
+      self._pose = _acquire_pose()
+    return self._pose
+
+  def warm_up(self) -> None:
+    """Acquire the pose model before the first frame arrives (runs in the pool)."""
+    self._pose_model()
+
+  def process_image(self, data: bytes) -> Dict[str, Any]:
+    """Decode and run pose tracking on one compressed frame (runs in the pool)."""
+    import cv2  # type: ignore
+
+    t0 = time.perf_counter()
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+      raise ValueError("Could not decode frame")
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    t1 = time.perf_counter()
+    res = self._pose_model().process(rgb)
+    t2 = time.perf_counter()
+    landmarks = None
+    if res.pose_landmarks:
+      landmarks = np.array(
+        [[lm.x, lm.y, lm.z, lm.visibility] for lm in res.pose_landmarks.landmark],
+        dtype=np.float32,
+      )
+    update = self.apply_landmarks(landmarks)
+    update["timings"] = {"decode": (t1 - t0) * 1000, "inference": (t2 - t1) * 1000}
+    return update
+
+  def apply_landmarks(self, landmarks: Optional[np.ndarray]) -> Dict[str, Any]:
+    """Advance the state machine with one frame of landmarks (or none)."""
+    if landmarks is None or landmarks.shape[0] < 33:
+      self.machine.state = "get_ready"
+      self.machine.feedback = "NO BODY DETECTED"
+      angles: Dict[str, float] = {}
+    else:
+      angles = self.machine.update(landmarks)
+    return {
+      "reps": self.machine.reps,
+      "state": self.machine.state,
+      "feedback": self.machine.feedback,
+      "angles": {k: round(v, 1) for k, v in angles.items()},
+    }
+
+  def close(self) -> None:
+    if self._pose is not None:
+      _release_pose(self._pose)
+      self._pose = None
+
+
+def _acquire_pose():
+  """Take a warm pose model from the idle pool, or build a new one."""
+  with _idle_poses_lock:
+    if _idle_poses:
+      return _idle_poses.pop()
+  import mediapipe as mp  # type: ignore
+  # Video mode keeps tracking state between frames (much cheaper than
+  # re-detecting every frame).
+  return mp.solutions.pose.Pose(
+    static_image_mode=False,
+    model_complexity=settings.live_model_complexity,
+    min_detection_confidence=0.5,
+    min_tracking_confidence=0.5,
+  )
+
+
+def _release_pose(pose) -> None:
+  """Reset tracking state and return a model to the idle pool."""
+  try:
+    pose.reset()
+  except Exception:
+    pose.close()
+    return
+  with _idle_poses_lock:
+    if len(_idle_poses) < settings.live_max_workers * 2:
+      _idle_poses.append(pose)
+      return
+  pose.close()
+
+
+def _parse_landmarks(raw: List[List[float]]) -> np.ndarray:
+  arr = np.asarray(raw, dtype=np.float32)
+  if arr.ndim != 2 or arr.shape[1] < 2:
+    raise ValueError("landmarks must be a list of [x, y, z?, visibility?]")
+  if arr.shape[1] < 4:
+    # Missing z/visibility: treat points as fully visible
+    pad = np.ones((arr.shape[0], 4 - arr.shape[1]), dtype=np.float32)
+    arr = np.hstack([arr, pad])
+  return arr[:, :4]
+
+
+async def serve(websocket, exercise: str = "squat") -> None:
+  """Run one live-coaching connection until the client disconnects."""
+  from starlette import status
+  from starlette.websockets import WebSocketDisconnect
+
+  await websocket.accept()
+  try:
+    session = LiveSession(exercise)
+  except ValidationError as e:
+    logger.info(f"Live session refused: {e}")
+    await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e))
+    return
+  loop = asyncio.get_running_loop()
+  max_age = settings.live_max_frame_age_ms / 1000.0
+
+  latest: Dict[str, Any] = {}
+  # Resets are applied by process_loop, never while a frame is in the executor
+  control = {"reset": False}
+  frame_ready = asyncio.Event()
+  stats = {"received": 0, "processed": 0, "dropped": 0, "stale": 0}
+  closed = asyncio.Event()
+
+  async def receive_loop() -> None:
+    try:
+      while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+          break
+        received_at = time.perf_counter()
+        if message.get("bytes") is not None:
+          data = message["bytes"]
+          if len(data) < FRAME_HEADER.size:
+            continue
+          seq, client_ts = FRAME_HEADER.unpack_from(data)
+          item = {"kind": "image", "seq": seq, "client_ts": client_ts,
+                  "payload": data[FRAME_HEADER.size:], "received_at": received_at}
+        else:
+          try:
+            msg = json.loads(message.get("text") or "{}")
+          except ValueError:
+            continue
+          if msg.get("type") == "reset":
+            if latest:
+              stats["dropped"] += 1  # Counted against the state being reset
+            latest.clear()
+            control["reset"] = True
+            frame_ready.set()
+            continue
+          if msg.get("type") != "landmarks":
+            continue
+          item = {"kind": "landmarks", "seq": msg.get("seq", 0), "client_ts": msg.get("ts"),
+                  "payload": msg.get("landmarks"), "received_at": received_at}
+        stats["received"] += 1
+        if latest:
+          stats["dropped"] += 1  # Superseded before it was processed
+        latest.clear()
+        latest.update(item)
+        frame_ready.set()
+    except WebSocketDisconnect:
+      pass
+    finally:
+      closed.set()
+      frame_ready.set()
+
+  async def process_loop() -> None:
+    while True:
+      await frame_ready.wait()
+      frame_ready.clear()
+      if closed.is_set():
+        return
+      if control["reset"]:
+        control["reset"] = False
+        session.machine.reset()
+      if not latest:
+        continue
+      item = dict(latest)
+      latest.clear()
+
+      started = time.perf_counter()
+      queued = started - item["received_at"]
+      if queued > max_age:
+        stats["stale"] += 1
+        continue
+
+      try:
+        if item["kind"] == "image":
+          update = await loop.run_in_executor(_get_executor(), session.process_image, item["payload"])
+        else:
+          update = session.apply_landmarks(_parse_landmarks(item["payload"]))
+      except Exception as e:
+        await websocket.send_json({"type": "error", "seq": item["seq"], "message": str(e)})
+        continue
+
+      stats["processed"] += 1
+      timings = update.pop("timings", {})
+      latency = {
+        "queue": round(queued * 1000, 2),
+        **{k: round(v, 2) for k, v in timings.items()},
+        "server": round((time.perf_counter() - item["received_at"]) * 1000, 2),
+      }
+      await websocket.send_json({
+        "type": "update",
+        "seq": item["seq"],
+        "client_ts": item["client_ts"],
+        **update,
+        "latency_ms": latency,
+        "dropped": stats["dropped"] + stats["stale"],
+      })
+
+  logger.info(f"Live session started - exercise: {exercise}")
+  warm_up = loop.run_in_executor(_get_executor(), session.warm_up)
+  receiver = asyncio.ensure_future(receive_loop())
+  try:
+    await warm_up
+    await process_loop()
+  except Exception as e:
+    logger.warning(f"Live session ended with error: {e}")
+  finally:
+    receiver.cancel()
+    # Release the tracker on the pool thread so an in-flight frame finishes first
+    await loop.run_in_executor(_get_executor(), session.close)
+    logger.info(
+      f"Live session closed - exercise: {exercise}, reps: {session.machine.reps}, "
+      f"received: {stats['received']}, processed: {stats['processed']}, "
+      f"dropped: {stats['dropped']}, stale: {stats['stale']}"
+    )
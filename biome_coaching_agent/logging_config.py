@@ -7,7 +7,27 @@ import json
 import logging
 import sys
 import os
-from typing import Optional
+from contextvars import ContextVar
+from typing import Any, Optional
+
+# Request context, set by biome_coaching_agent.tracing and read by ContextFilter
+current_session_id: ContextVar[Optional[str]] = ContextVar("biome_session_id", default=None)
+current_span: ContextVar[Optional[Any]] = ContextVar("biome_span", default=None)
+
+
+class ContextFilter(logging.Filter):
+    """Add the bound session_id and the current trace/span ids to log records."""
+    
+    def filter(self, record):
+        if not hasattr(record, 'session_id'):
+            session_id = current_session_id.get()
+            if session_id:
+                record.session_id = session_id
+        span = current_span.get()
+        if span is not None:
+            record.trace_id = span.trace_id
+            record.span_id = span.span_id
+        return True
 
 
 def setup_logger(
@@ -45,6 +65,7 @@ def setup_logger(
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     handler.setFormatter(formatter)
+    handler.addFilter(ContextFilter())
     
     logger.addHandler(handler)
     
@@ -98,10 +119,14 @@ def setup_cloud_logger(name: str, level: str = "INFO") -> logging.Logger:
                 log_obj['user_id'] = record.user_id
             if hasattr(record, 'exercise_name'):
                 log_obj['exercise_name'] = record.exercise_name
+            if hasattr(record, 'trace_id'):
+                log_obj['trace_id'] = record.trace_id
+                log_obj['span_id'] = record.span_id
             
             return json.dumps(log_obj)
     
     handler.setFormatter(JsonFormatter())
+    handler.addFilter(ContextFilter())
     logger.addHandler(handler)
     
     return logger
@@ -0,0 +1,415 @@
+"""
+Prometheus metrics for the API and workers.
+
+A small in-process registry rendered in the Prometheus text exposition
+format (0.0.4): the API serves it at /metrics, workers on METRICS_PORT.
+The metric classes mirror prometheus_client's (labels(), inc(), set(),
+observe()), so swapping in that library later is mechanical.
+
+Recorded where the work happens:
+  * biome_stage_duration_seconds{stage}: upload and the three pipeline
+    stages (pose_extraction, analysis, save_results);
+  * biome_extractor_{decode,inference}_seconds and biome_frames_total: the
+    extractor times every frame into local lists and hands them over in
+    one batch per video, so the per-frame cost is two perf_counter() calls
+    and a list append - no locks or registry lookups in the loop;
+  * biome_db_query_duration_seconds{pool}: every execute() on a pooled
+    connection, through the pools' cursor_factory (which also opens the
+    per-query trace span, see tracing.query_span).
+
+Computed when scraped: pool saturation, queue depth, result cache hit
+ratio and the janitor's last sweep.
+"""
+import bisect
+import contextlib
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import psycopg
+
+from biome_coaching_agent import tracing
+from biome_coaching_agent.logging_config import get_logger
+
+# Initialize logger
+logger = get_logger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (suffix, labels, value) samples of one metric family
+_Sample = Tuple[str, Dict[str, str], float]
+
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+FRAME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0)
+
+
+def _format_value(value: float) -> str:
+  if math.isinf(value):
+    return "+Inf" if value > 0 else "-Inf"
+  return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+  if not labels:
+    return ""
+  escaped = (
+    f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(10), chr(92) + "n").replace(chr(34), chr(92) + chr(34))}"'
+    for k, v in labels.items()
+  )
+  return "{" + ",".join(escaped) + "}"
+
+
+class _Metric:
+  kind = "untyped"
+
+  def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=None):
+    self.name = name
+    self.documentation = documentation
+    self.labelnames = tuple(labelnames)
+    self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+    self._lock = threading.Lock()
+    (registry if registry is not None else REGISTRY).register(self)
+
+  def labels(self, *values: str):
+    if len(values) != len(self.labelnames):
+      raise ValueError(f"{self.name} expects labels {self.labelnames}")
+    key = tuple(str(v) for v in values)
+    child = self._children.get(key)
+    if child is None:
+      with self._lock:
+        child = self._children.setdefault(key, self._new_child())
+    return child
+
+  def _new_child(self):
+    raise NotImplementedError
+
+  def _default(self):
+    # Unlabelled metrics are their own single child
+    return self.labels()
+
+  def samples(self) -> Iterator[_Sample]:
+    for key, child in list(self._children.items()):
+      labels = dict(zip(self.labelnames, key))
+      for suffix, extra, value in child._samples():
+        yield suffix, {**labels, **extra}, value
+
+
+class _CounterChild:
+  def __init__(self):
+    self._value = 0.0
+    self._lock = threading.Lock()
+
+  def inc(self, amount: float = 1.0) -> None:
+    with self._lock:
+      self._value += amount
+
+  def _samples(self) -> Iterable[_Sample]:
+    yield "_total", {}, self._value
+
+
+class Counter(_Metric):
+  """Monotonic total; `name` is given without the _total suffix."""
+  kind = "counter"
+  _new_child = _CounterChild
+
+  def inc(self, amount: float = 1.0) -> None:
+    self._default().inc(amount)
+
+
+class _GaugeChild:
+  def __init__(self):
+    self._value = 0.0
+
+  def set(self, value: float) -> None:
+    self._value = float(value)  # A single store: no lock needed
+
+  def _samples(self) -> Iterable[_Sample]:
+    yield "", {}, self._value
+
+
+class Gauge(_Metric):
+  kind = "gauge"
+  _new_child = _GaugeChild
+
+  def set(self, value: float) -> None:
+    self._default().set(value)
+
+
+class _HistogramChild:
+  def __init__(self, buckets: Sequence[float]):
+    self._bounds = list(buckets)
+    self._counts = [0] * (len(self._bounds) + 1)
+    self._sum = 0.0
+    self._lock = threading.Lock()
+
+  def observe(self, value: float) -> None:
+    i = bisect.bisect_left(self._bounds, value)
+    with self._lock:
+      self._counts[i] += 1
+      self._sum += value
+
+  def observe_many(self, values: Sequence[float]) -> None:
+    """Record a batch under one lock acquisition (hot loops collect, then flush)."""
+    if not values:
+      return
+    counts = [0] * len(self._counts)
+    for value in values:
+      counts[bisect.bisect_left(self._bounds, value)] += 1
+    total = float(sum(values))
+    with self._lock:
+      for i, n in enumerate(counts):
+        self._counts[i] += n
+      self._sum += total
+
+  @contextlib.contextmanager
+  def time(self) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.observe(time.perf_counter() - start)
+
+  def _samples(self) -> Iterable[_Sample]:
+    with self._lock:
+      counts, total = list(self._counts), self._sum
+    cumulative = 0
+    for bound, n in zip(self._bounds + [math.inf], counts):
+      cumulative += n
+      yield "_bucket", {"le": _format_value(bound)}, cumulative
+    yield "_sum", {}, total
+    yield "_count", {}, cumulative
+
+
+class Histogram(_Metric):
+  kind = "histogram"
+
+  def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+               buckets: Sequence[float] = STAGE_BUCKETS, registry=None):
+    self.buckets = tuple(sorted(buckets))
+    super().__init__(name, documentation, labelnames, registry)
+
+  def _new_child(self):
+    return _HistogramChild(self.buckets)
+
+  def observe(self, value: float) -> None:
+    self._default().observe(value)
+
+  def observe_many(self, values: Sequence[float]) -> None:
+    self._default().observe_many(values)
+
+  def time(self):
+    return self._default().time()
+
+
+# A collector returns (name, kind, help, samples) families at scrape time
+_Family = Tuple[str, str, str, List[_Sample]]
+
+
+class Registry:
+  def __init__(self):
+    self._metrics: List[_Metric] = []
+    self._collectors: List[Callable[[], Iterable[_Family]]] = []
+    self._lock = threading.Lock()
+
+  def register(self, metric: _Metric) -> None:
+    with self._lock:
+      self._metrics.append(metric)
+
+  def register_collector(self, collector: Callable[[], Iterable[_Family]]) -> None:
+    with self._lock:
+      self._collectors.append(collector)
+
+  def render(self) -> str:
+    families: List[_Family] = [
+      (m.name, m.kind, m.documentation, list(m.samples())) for m in self._metrics
+    ]
+    for collector in self._collectors:
+      try:
+        families.extend(collector())
+      except Exception as e:
+        logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+    lines: List[str] = []
+    for name, kind, documentation, samples in families:
+      lines.append(f"# HELP {name} {documentation}")
+      lines.append(f"# TYPE {name} {kind}")
+      for suffix, labels, value in samples:
+        lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram(
+  "biome_stage_duration_seconds", "Duration of each analysis stage", ["stage"], STAGE_BUCKETS
+)
+ANALYSES = Counter(
+  "biome_analyses", "Finished pipeline runs by outcome and failing step", ["outcome", "step"]
+)
+DECODE_SECONDS = Histogram(
+  "biome_extractor_decode_seconds", "Time to decode one video frame", buckets=FRAME_BUCKETS
+)
+INFERENCE_SECONDS = Histogram(
+  "biome_extractor_inference_seconds", "Time of one pose detection call", buckets=FRAME_BUCKETS
+)
+FRAMES = Counter(
+  "biome_frames", "Video frames by what the extractor did with them (decoded, inferred, detected)", ["kind"]
+)
+DB_QUERY_SECONDS = Histogram(
+  "biome_db_query_duration_seconds", "Database round trip of one execute()", ["pool"], DB_BUCKETS
+)
+
+
+def observe_extraction(
+  decode_times: Sequence[float],
+  inference_times: Sequence[float],
+  detected: int,
+) -> None:
+  """Flush one video's per-frame timings (collected in the extractor loop)."""
+  DECODE_SECONDS.observe_many(decode_times)
+  INFERENCE_SECONDS.observe_many(inference_times)
+  FRAMES.labels("decoded").inc(len(decode_times))
+  FRAMES.labels("inferred").inc(len(inference_times))
+  FRAMES.labels("detected").inc(detected)
+
+
+class TimedCursor(psycopg.Cursor):
+  """Cursor that records the round trip of every execute() (and traces it)."""
+
+  def execute(self, query, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+      with tracing.query_span(query):
+        return super().execute(query, *args, **kwargs)
+    finally:
+      DB_QUERY_SECONDS.labels("sync").observe(time.perf_counter() - start)
+
+  def executemany(self, query, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+      with tracing.query_span(query):
+        return super().executemany(query, *args, **kwargs)
+    finally:
+      DB_QUERY_SECONDS.labels("sync").observe(time.perf_counter() - start)
+
+
+class AsyncTimedCursor(psycopg.AsyncCursor):
+  """Async counterpart of TimedCursor."""
+
+  async def execute(self, query, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+      with tracing.query_span(query):
+        return await super().execute(query, *args, **kwargs)
+    finally:
+      DB_QUERY_SECONDS.labels("async").observe(time.perf_counter() - start)
+
+  async def executemany(self, query, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+      with tracing.query_span(query):
+        return await super().executemany(query, *args, **kwargs)
+    finally:
+      DB_QUERY_SECONDS.labels("async").observe(time.perf_counter() - start)
+
+
+def _collect_pools() -> Iterable[_Family]:
+  from db.connection import get_pool_stats  # type: ignore
+  from db.async_connection import get_async_pool_stats  # type: ignore
+
+  size, available, waiting, saturation = [], [], [], []
+  for pool, stats in (("sync", get_pool_stats()), ("async", get_async_pool_stats())):
+    if not stats:
+      continue
+    labels = {"pool": pool}
+    size.append(("", labels, stats.get("pool_size", 0)))
+    available.append(("", labels, stats.get("pool_available", 0)))
+    waiting.append(("", labels, stats.get("requests_waiting", 0)))
+    in_use = stats.get("pool_size", 0) - stats.get("pool_available", 0)
+    saturation.append(("", labels, in_use / stats["pool_max"] if stats.get("pool_max") else 0.0))
+  yield "biome_db_pool_connections", "gauge", "Open connections in the pool", size
+  yield "biome_db_pool_available", "gauge", "Idle connections in the pool", available
+  yield "biome_db_pool_waiting", "gauge", "Callers waiting for a connection", waiting
+  yield "biome_db_pool_saturation", "gauge", "Connections in use / pool max size", saturation
+
+
+def _collect_queue() -> Iterable[_Family]:
+  from db.connection import get_db_connection  # type: ignore
+  from db import queries  # type: ignore
+
+  with get_db_connection() as conn:
+    depth = queries.count_queued_jobs(conn)
+  yield "biome_queue_depth", "gauge", "Sessions waiting for a worker", [("", {}, depth)]
+
+
+def _collect_result_cache() -> Iterable[_Family]:
+  from biome_coaching_agent import result_cache
+
+  stats = result_cache.get_result_cache().stats()
+  lookups = stats["hits"] + stats["misses"]
+  yield "biome_result_cache_hits", "counter", "Result cache hits", [("_total", {}, stats["hits"])]
+  yield "biome_result_cache_misses", "counter", "Result cache misses", [("_total", {}, stats["misses"])]
+  yield "biome_result_cache_entries", "gauge", "Entries in the result cache", [("", {}, stats["entries"])]
+  yield (
+    "biome_result_cache_hit_ratio", "gauge", "Hits / lookups since start",
+    [("", {}, stats["hits"] / lookups if lookups else 0.0)],
+  )
+
+
+def _collect_janitor() -> Iterable[_Family]:
+  from biome_coaching_agent import janitor
+
+  report = janitor.last_report()
+  if not report:
+    return
+  yield (
+    "biome_janitor_reclaimed_bytes", "gauge", "Bytes freed by the last janitor sweep",
+    [("", {}, report["reclaimed_bytes"])],
+  )
+  yield (
+    "biome_janitor_remaining_bytes", "gauge", "Bytes left in UPLOADS_DIR after the last sweep",
+    [("", {}, report["remaining_bytes"])],
+  )
+  yield (
+    "biome_janitor_budget_bytes", "gauge", "JANITOR_DISK_BUDGET_MB in bytes",
+    [("", {}, report["budget_bytes"])],
+  )
+
+
+for _collector in (_collect_pools, _collect_queue, _collect_result_cache, _collect_janitor):
+  REGISTRY.register_collector(_collector)
+
+
+def render() -> str:
+  return REGISTRY.render()
+
+
+class _Handler(BaseHTTPRequestHandler):
+  def do_GET(self) -> None:
+    if self.path.split("?")[0] != "/metrics":
+      self.send_error(404)
+      return
+    body = render().encode("utf-8")
+    self.send_response(200)
+    self.send_header("Content-Type", CONTENT_TYPE)
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *_args) -> None:
+    pass  # Scrapes every few seconds would flood the log
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_http_server(port: int, addr: str = "0.0.0.0") -> None:
+  """Serve /metrics from a daemon thread (processes without the API, e.g. workers)."""
+  global _server
+  if _server is not None or port <= 0:
+    return
+  _server = ThreadingHTTPServer((addr, port), _Handler)
+  threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+  logger.info(f"Metrics served on http://{addr}:{port}/metrics")
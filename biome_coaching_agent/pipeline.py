@@ -0,0 +1,224 @@
+"""
+Analysis pipeline for Biome Coaching Agent.
+
+Runs steps 2-4 of the workflow (pose extraction, form analysis, result
+persistence) for a session that `upload_video` has already created.
+Shared by the API server's inline path and the queue worker.
+"""
+import contextlib
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from db.connection import get_db_connection  # type: ignore
+from db import queries  # type: ignore
+from biome_coaching_agent.config import settings
+from biome_coaching_agent.logging_config import get_logger
+from biome_coaching_agent import metrics
+from biome_coaching_agent import profiling
+from biome_coaching_agent import progress
+from biome_coaching_agent import result_cache
+from biome_coaching_agent import thumbnails
+from biome_coaching_agent import tracing
+from biome_coaching_agent.tools.extract_pose_landmarks import extract_pose_landmarks
+from biome_coaching_agent.tools.analyze_workout_form import analyze_workout_form
+from biome_coaching_agent.tools.save_analysis_results import save_analysis_results
+
+# Initialize logger
+logger = get_logger(__name__)
+
+TOTAL_STEPS = 4
+
+
+# Failures worth retrying on another attempt; everything else is permanent
+# (bad video, no person detected, ...) and fails the session immediately.
+RETRYABLE_ERROR_TYPES = {"database", "storage", "unknown"}
+
+
+def fail_session(session_id: str, step: str, error_type: str, message: str) -> None:
+  """Mark a session failed for good and announce the terminal `failed` event."""
+  try:
+    with get_db_connection() as conn:
+      queries.update_session_status(conn, session_id, "failed", f"{step}: {message}")
+  except Exception as e:
+    logger.error(f"Could not mark session {session_id} failed: {e}")
+  announce_failure(session_id, step, error_type, message)
+
+
+def announce_failure(session_id: str, step: str, error_type: str, message: str) -> None:
+  """Publish the terminal `failed` event of a session already marked failed."""
+  result_cache.invalidate(session_id)
+  progress.publish(session_id, "failed", {
+    "step": step,
+    "error_type": error_type,
+    "message": message,
+  })
+
+
+def _step_error(
+  step: str,
+  session_id: str,
+  result: Dict[str, Any],
+  default: str,
+  settle: bool,
+) -> Dict[str, Any]:
+  """Build the error dict returned when a pipeline step fails (failing the session if `settle`)."""
+  error = {
+    "status": "error",
+    "step": step,
+    "session_id": session_id,
+    "error_type": result.get("error_type", "unknown"),
+    "message": result.get("message", default),
+  }
+  metrics.ANALYSES.labels("error", step).inc()
+  if settle:
+    fail_session(session_id, step, error["error_type"], error["message"])
+  return error
+
+
+def _announce_stage(session_id: str, step: int, stage: str) -> None:
+  progress.publish(session_id, "stage", {
+    "stage": stage,
+    "step": step,
+    "total_steps": TOTAL_STEPS,
+  })
+
+
+@contextlib.contextmanager
+def _stage(stage: str, profile: Optional[profiling.RunProfile]) -> Iterator[None]:
+  """Time a pipeline stage into the stage histogram and a trace span (and the profile)."""
+  if profile is not None:
+    profile.stage(stage)
+  with tracing.span(f"pipeline.{stage}"), metrics.STAGE_SECONDS.labels(stage).time():
+    yield
+
+
+def run_analysis(
+  session_id: str,
+  exercise_name: str,
+  fps: Optional[int] = None,
+  profile: Optional[str] = None,
+  settle_failures: bool = True,
+  lease_owner: Optional[str] = None,
+) -> Dict[str, Any]:
+  """
+  Extract, analyze and persist results for an uploaded session.
+
+  Args:
+    session_id: Session created by `upload_video`.
+    exercise_name: Name of the exercise being performed.
+    fps: Pose sampling rate (defaults to settings.pose_detection_fps).
+    profile: Profile this run and store the result (trigger name, see profiling).
+    settle_failures: Mark the session failed and publish `failed` when a step
+      fails. The queue worker passes False: it decides between a retry and a
+      terminal failure itself.
+    lease_owner: Queue worker holding the session's lease; results are
+      discarded (error_type "lease_lost") if it no longer holds it.
+
+  Returns:
+    dict: {status: "success", session_id, result_id, pose, analysis} or
+      {status: "error", step, session_id, error_type, message} on failure
+  """
+  # A root span in workers; under the request span for inline analysis
+  with tracing.span("pipeline.run_analysis", root=True, exercise=exercise_name) as span, \
+      tracing.bind_session(session_id):
+    run_profile = profiling.start(session_id, profile) if profile else None
+    result = {"status": "error"}
+    try:
+      result = _run_analysis(
+        session_id, exercise_name, fps, run_profile, settle_failures, lease_owner
+      )
+    finally:
+      if run_profile is not None:
+        run_profile.finish(result["status"])
+    span.set_attribute("outcome", result["status"])
+    if result["status"] != "success":
+      span.set_attribute("error.step", result.get("step"))
+    return result
+
+
+def _run_analysis(
+  session_id: str,
+  exercise_name: str,
+  fps: Optional[int],
+  run_profile: Optional[profiling.RunProfile],
+  settle: bool,
+  lease_owner: Optional[str],
+) -> Dict[str, Any]:
+  fps = fps or settings.pose_detection_fps
+  started = time.perf_counter()
+
+  # Step 2: Extract pose landmarks
+  logger.info(f"Step 2/4: Extracting pose landmarks for session {session_id}")
+  _announce_stage(session_id, 2, "pose_extraction")
+  with _stage("pose_extraction", run_profile):
+    pose_result = extract_pose_landmarks(session_id=session_id, fps=fps)
+  if pose_result.get("status") != "success":
+    logger.error(f"Pose extraction failed: {pose_result.get('message')}")
+    return _step_error("pose_extraction", session_id, pose_result, "Pose extraction failed", settle)
+
+  logger.info(
+    f"Pose extraction complete: {pose_result.get('total_frames', 0)} frames processed"
+  )
+
+  # Step 3: Analyze form
+  logger.info(f"Step 3/4: Analyzing form for session {session_id}")
+  _announce_stage(session_id, 3, "analysis")
+  with _stage("analysis", run_profile):
+    analysis_result = analyze_workout_form(
+      pose_data=pose_result,
+      exercise_name=exercise_name,
+    )
+  if analysis_result.get("status") != "success":
+    logger.error(f"Form analysis failed: {analysis_result.get('message')}")
+    return _step_error("analysis", session_id, analysis_result, "Analysis failed", settle)
+
+  logger.info(
+    f"Form analysis complete: score {analysis_result.get('overall_score')}/10, "
+    f"{len(analysis_result.get('issues', []))} issues found"
+  )
+
+  # Partial metrics are useful to clients before persistence finishes
+  progress.publish(session_id, "metrics", {
+    "overall_score": analysis_result.get("overall_score"),
+    "total_frames": analysis_result.get("total_frames"),
+    "issue_count": len(analysis_result.get("issues", [])),
+    "metrics": analysis_result.get("metrics", []),
+  })
+
+  # Extraction + analysis wall time, recorded with the result
+  analysis_result["processing_time"] = round(time.perf_counter() - started, 3)
+  tracing.get_current_span().set_attribute("processing_time", analysis_result["processing_time"])
+
+  # Step 4: Save results to database
+  logger.info(f"Step 4/4: Saving results for session {session_id}")
+  _announce_stage(session_id, 4, "save_results")
+  with _stage("save_results", run_profile):
+    save_result = save_analysis_results(
+      session_id=session_id,
+      analysis_data=analysis_result,
+      lease_owner=lease_owner,
+    )
+  if save_result.get("status") != "success":
+    logger.error(f"Save results failed: {save_result.get('message')}")
+    return _step_error("save_results", session_id, save_result, "Failed to save results", settle)
+
+  # Preview sheet from the frames the extractor kept; served lazily otherwise
+  try:
+    thumbnails.finalize(
+      session_id,
+      save_result.get("result_id"),
+      pose_result.get("frames", []),
+      analysis_result.get("issues", []),
+    )
+  except Exception as thumb_err:
+    logger.warning(f"Could not write thumbnails for session {session_id}: {thumb_err}")
+
+  metrics.ANALYSES.labels("success", "").inc()
+  progress.publish(session_id, "completed", {"result_id": save_result.get("result_id")})
+  return {
+    "status": "success",
+    "session_id": session_id,
+    "result_id": save_result.get("result_id"),
+    "pose": pose_result,
+    "analysis": analysis_result,
+  }
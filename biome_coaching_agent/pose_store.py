@@ -0,0 +1,212 @@
+"""
+Compact storage for extracted pose series.
+
+The extractor's per-frame output (33 landmarks x/y/z, joint angles, source
+frame index) is kept after analysis so sessions can be re-scored without
+decoding the video and running MediaPipe again.
+
+Encoding (one blob per session, roughly 75 KB for a minute of video at 10 fps,
+about 1/20 of the same frames as JSON):
+  * landmarks are quantized to int16 fixed point (1e-4 of the normalized
+    image size), delta-encoded over time and byte-plane shuffled, which
+    makes slowly moving joints compress to almost nothing;
+  * angles are float32, frame indices uint32;
+  * the whole payload is compressed with zstd when `zstandard` is
+    installed, zlib otherwise. The codec is recorded in the blob, so
+    readers only need the library that wrote it.
+"""
+import json
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np  # type: ignore
+
+from db.connection import get_db_connection  # type: ignore
+from db import queries  # type: ignore
+from biome_coaching_agent.logging_config import get_logger
+
+try:
+  import zstandard  # type: ignore
+except ImportError:  # Optional: fall back to zlib
+  zstandard = None
+
+# Initialize logger
+logger = get_logger(__name__)
+
+MAGIC = b"BPS1"
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_NAMES = {CODEC_ZLIB: "zlib", CODEC_ZSTD: "zstd"}
+
+NUM_LANDMARKS = 33
+LANDMARK_AXES = ("x", "y", "z")
+# Fixed-point scale for normalized landmark coordinates
+LANDMARK_SCALE = 10000.0
+
+_BLOB_HEADER = struct.Struct("<4sB3x")
+_META_LEN = struct.Struct("<I")
+
+
+@dataclass
+class PoseSeries:
+  """Decoded pose series for one session."""
+  frame_indices: np.ndarray  # (n,) uint32, frame numbers in the source video
+  landmarks: np.ndarray  # (n, 33, 3) float32, normalized x/y/z
+  angles: np.ndarray  # (n, len(angle_keys)) float32, degrees
+  angle_keys: List[str]
+
+  @property
+  def frame_count(self) -> int:
+    return int(self.frame_indices.shape[0])
+
+  def angle_series(self) -> List[Dict[str, float]]:
+    return [
+      {key: float(value) for key, value in zip(self.angle_keys, row)}
+      for row in self.angles.tolist()
+    ]
+
+  def metrics(self) -> Dict[str, Any]:
+    """Aggregate angle metrics in the extractor's format ({key}_avg/_min/_max)."""
+    agg: Dict[str, Any] = {"count": self.frame_count}
+    for col, key in enumerate(self.angle_keys):
+      values = self.angles[:, col]
+      agg[f"{key}_avg"] = float(np.mean(values))
+      agg[f"{key}_min"] = float(np.min(values))
+      agg[f"{key}_max"] = float(np.max(values))
+    return agg
+
+  def to_pose_data(self, include_landmarks: bool = False) -> Dict[str, Any]:
+    """
+    Rebuild the `extract_pose_landmarks` result for `analyze_workout_form`.
+
+    Landmarks are omitted by default: the analyzer only reads angles, and
+    skipping 99 floats per frame keeps re-scoring cheap.
+    """
+    frames = []
+    angle_rows = self.angle_series()
+    landmark_rows = self.landmarks.tolist() if include_landmarks else None
+    for i, frame_idx in enumerate(self.frame_indices.tolist()):
+      frame: Dict[str, Any] = {"frame": frame_idx, "angles": angle_rows[i]}
+      if landmark_rows is not None:
+        frame["landmarks"] = [
+          {"x": x, "y": y, "z": z} for x, y, z in landmark_rows[i]
+        ]
+      frames.append(frame)
+    return {
+      "status": "success",
+      "detected_exercise": "Squat",  # matches the extractor's simplification
+      "total_frames": self.frame_count,
+      "metrics": self.metrics(),
+      "frames": frames,
+    }
+
+
+def _compress(payload: bytes) -> Tuple[int, bytes]:
+  if zstandard is not None:
+    return CODEC_ZSTD, zstandard.ZstdCompressor(level=10).compress(payload)
+  return CODEC_ZLIB, zlib.compress(payload, 9)
+
+
+def _decompress(codec: int, data: bytes) -> bytes:
+  if codec == CODEC_ZSTD:
+    if zstandard is None:
+      raise RuntimeError("Pose series was written with zstd; install the 'zstandard' package to read it")
+    return zstandard.ZstdDecompressor().decompress(data)
+  if codec == CODEC_ZLIB:
+    return zlib.decompress(data)
+  raise ValueError(f"Unknown pose series codec: {codec}")
+
+
+def encode_frames(frames: Sequence[Dict[str, Any]]) -> bytes:
+  """Encode extractor frames ({frame, landmarks, angles}) into a blob."""
+  if not frames:
+    raise ValueError("No frames to encode")
+  angle_keys = list(frames[0]["angles"].keys())
+  n = len(frames)
+
+  frame_indices = np.fromiter((f["frame"] for f in frames), dtype=np.uint32, count=n)
+  angles = np.array(
+    [[f["angles"][key] for key in angle_keys] for f in frames], dtype=np.float32
+  )
+  coords = np.array(
+    [[[lm[axis] for axis in LANDMARK_AXES] for lm in f["landmarks"]] for f in frames],
+    dtype=np.float64,
+  )
+  quantized = np.clip(np.rint(coords * LANDMARK_SCALE), -32768, 32767).astype(np.int16)
+  # (landmark, axis, time): each coordinate's trajectory is contiguous
+  series = np.ascontiguousarray(quantized.transpose(1, 2, 0))
+  # Delta over time in wrapping int16 arithmetic (exactly reversible)
+  deltas = np.diff(series, axis=2, prepend=np.zeros(series.shape[:2] + (1,), dtype=np.int16))
+  # Byte planes: low bytes together, then high bytes
+  shuffled = deltas.reshape(-1).view(np.uint8).reshape(-1, 2).T.tobytes()
+
+  meta = json.dumps({
+    "frames": n,
+    "landmarks": NUM_LANDMARKS,
+    "axes": len(LANDMARK_AXES),
+    "scale": LANDMARK_SCALE,
+    "angle_keys": angle_keys,
+  }).encode("utf-8")
+  payload = b"".join((
+    _META_LEN.pack(len(meta)),
+    meta,
+    frame_indices.tobytes(),
+    angles.tobytes(),
+    shuffled,
+  ))
+  codec, compressed = _compress(payload)
+  return _BLOB_HEADER.pack(MAGIC, codec) + compressed
+
+
+def decode_blob(blob: bytes) -> PoseSeries:
+  """Decode a blob written by `encode_frames`."""
+  magic, codec = _BLOB_HEADER.unpack_from(blob, 0)
+  if magic != MAGIC:
+    raise ValueError("Not a pose series blob")
+  payload = _decompress(codec, bytes(blob[_BLOB_HEADER.size:]))
+
+  (meta_len,) = _META_LEN.unpack_from(payload, 0)
+  offset = _META_LEN.size
+  meta = json.loads(payload[offset:offset + meta_len])
+  offset += meta_len
+  n, num_landmarks, num_axes = meta["frames"], meta["landmarks"], meta["axes"]
+  angle_keys = meta["angle_keys"]
+
+  frame_indices = np.frombuffer(payload, dtype=np.uint32, count=n, offset=offset)
+  offset += frame_indices.nbytes
+  angles = np.frombuffer(payload, dtype=np.float32, count=n * len(angle_keys), offset=offset)
+  offset += angles.nbytes
+  planes = np.frombuffer(payload, dtype=np.uint8, count=2 * n * num_landmarks * num_axes, offset=offset)
+
+  deltas = np.ascontiguousarray(planes.reshape(2, -1).T).view(np.int16)
+  series = np.cumsum(deltas.reshape(num_landmarks, num_axes, n), axis=2, dtype=np.int16)
+  landmarks = series.transpose(2, 0, 1).astype(np.float32) / np.float32(meta["scale"])
+
+  return PoseSeries(
+    frame_indices=frame_indices,
+    landmarks=landmarks,
+    angles=angles.reshape(n, len(angle_keys)),
+    angle_keys=angle_keys,
+  )
+
+
+def save_pose_series(session_id: str, frames: Sequence[Dict[str, Any]]) -> int:
+  """Encode and store a session's pose series; returns the stored size in bytes."""
+  blob = encode_frames(frames)
+  codec = CODEC_NAMES[blob[len(MAGIC)]]
+  with get_db_connection() as conn:
+    queries.upsert_pose_series(conn, session_id, len(frames), codec, blob)
+  logger.info(
+    f"Stored pose series for session {session_id}: {len(frames)} frames, "
+    f"{len(blob)} bytes ({codec})"
+  )
+  return len(blob)
+
+
+def load_pose_series(session_id: str) -> Optional[PoseSeries]:
+  """Load a session's pose series, or None if it was never stored."""
+  with get_db_connection() as conn:
+    blob = queries.get_pose_series(conn, session_id)
+  return decode_blob(blob) if blob is not None else None
@@ -0,0 +1,275 @@
+"""
+Opt-in profiling of single analysis runs.
+
+For the rare run that is 10x slower or balloons in memory in production,
+a run can be profiled when it is requested with an `X-Profile: 1` header
+(admin token required) or picked by the sample rate, which admins change
+at runtime through PUT /api/admin/profiling. The choice is made when the
+session is created and stored with it, so a worker that claims the job
+profiles it the same way.
+
+A profiled run gets:
+  * a sampling profiler: a thread that reads the pipeline thread's stack
+    every PROFILING_INTERVAL_MS via sys._current_frames(), aggregated as
+    folded stacks (`stage;module:func;... count`) for flamegraph.pl,
+    speedscope or inferno;
+  * tracemalloc snapshots at stage boundaries: per stage, the traced
+    memory at the end, its peak and the top allocation sites by growth,
+    plus the process's peak RSS (native MediaPipe memory is not traced).
+
+The result is stored per session (session_profiles) and served by the
+admin endpoints. Runs that are not profiled only pay a None check per
+stage. tracemalloc is process-wide, so at most PROFILING_MAX_CONCURRENT
+runs are profiled at once; extra requests run unprofiled.
+"""
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+from db.connection import get_db_connection  # type: ignore
+from db import queries  # type: ignore
+from biome_coaching_agent.config import settings
+from biome_coaching_agent.exceptions import ValidationError
+from biome_coaching_agent.logging_config import get_logger
+
+try:
+  import resource
+except ImportError:  # Not available on Windows
+  resource = None
+
+# Initialize logger
+logger = get_logger(__name__)
+
+TRIGGER_HEADER = "header"
+TRIGGER_SAMPLED = "sampled"
+MAX_STACK_DEPTH = 128
+
+# Allocation sites that are noise in the report (the profiler's own, imports).
+# Dropped from the top list rather than with Snapshot.filter_traces(), which
+# runs fnmatch over every traced block.
+_IGNORED_SITES = (tracemalloc.__file__, "<frozen importlib", "<unknown>")
+
+_sample_rate = settings.profiling_sample_rate
+_slots = threading.BoundedSemaphore(max(settings.profiling_max_concurrent, 1))
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+
+
+def get_sample_rate() -> float:
+  return _sample_rate
+
+
+def set_sample_rate(rate: float) -> None:
+  """Change the share of new sessions profiled (this process only)."""
+  global _sample_rate
+  if not 0.0 <= rate <= 1.0:
+    raise ValidationError("sample_rate must be between 0 and 1")
+  _sample_rate = rate
+  logger.info(f"Profiling sample rate set to {rate}")
+
+
+def choose_trigger(requested: bool) -> Optional[str]:
+  """Whether a new session should be profiled, and why (None: not profiled)."""
+  if requested:
+    return TRIGGER_HEADER
+  if _sample_rate > 0 and random.random() < _sample_rate:
+    return TRIGGER_SAMPLED
+  return None
+
+
+def _max_rss_bytes() -> Optional[int]:
+  if resource is None:
+    return None
+  # ru_maxrss is KiB on Linux, bytes on macOS
+  rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _acquire_tracemalloc() -> None:
+  global _tracemalloc_users, _tracemalloc_owned
+  with _tracemalloc_lock:
+    if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+      tracemalloc.start(settings.profiling_tracemalloc_frames)
+      _tracemalloc_owned = True
+    _tracemalloc_users += 1
+
+
+def _release_tracemalloc() -> None:
+  global _tracemalloc_users, _tracemalloc_owned
+  with _tracemalloc_lock:
+    _tracemalloc_users -= 1
+    if _tracemalloc_users == 0 and _tracemalloc_owned:
+      tracemalloc.stop()  # Tracing costs on every allocation: stop as soon as possible
+      _tracemalloc_owned = False
+
+
+class StackSampler:
+  """Samples one thread's Python stack on a timer into folded-stack counts."""
+
+  def __init__(self, thread_id: int, root_frame, interval: float):
+    self.thread_id = thread_id
+    self.root_frame = root_frame  # Frames above this one (server, worker loop) are dropped
+    self.interval = interval
+    self.stage = "start"
+    self.counts: Dict[str, int] = {}
+    self.samples = 0
+    self._stop = threading.Event()
+    self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+  def start(self) -> None:
+    self._thread.start()
+
+  def stop(self) -> None:
+    self._stop.set()
+    self._thread.join()
+
+  def _run(self) -> None:
+    while not self._stop.wait(self.interval):
+      frame = sys._current_frames().get(self.thread_id)
+      stack: List[str] = []
+      while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        stack.append(f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}")
+        if frame is self.root_frame:
+          break
+        frame = frame.f_back
+      if not stack:
+        continue
+      stack.append(self.stage)
+      key = ";".join(reversed(stack))
+      self.counts[key] = self.counts.get(key, 0) + 1
+      self.samples += 1
+
+  def folded(self) -> str:
+    return "\n".join(f"{stack} {count}" for stack, count in sorted(self.counts.items()))
+
+
+class RunProfile:
+  """Profile of one pipeline run; see start()."""
+
+  def __init__(self, session_id: str, trigger: str, root_frame):
+    self.session_id = session_id
+    self.trigger = trigger
+    self.started_at = time.time()
+    self.stages: List[Dict[str, Any]] = []
+    self._stage: Optional[str] = None
+    self._stage_wall = time.perf_counter()
+    self._stage_cpu = time.thread_time()
+    self._wall = self._stage_wall
+    self._cpu = self._stage_cpu
+    self._peak_traced = 0
+    self._top = settings.profiling_top_allocations
+    _acquire_tracemalloc()
+    tracemalloc.reset_peak()
+    self._snapshot = tracemalloc.take_snapshot()
+    self.sampler = StackSampler(
+      threading.get_ident(), root_frame, settings.profiling_interval_ms / 1000.0
+    )
+    self.sampler.start()
+
+  def stage(self, name: Optional[str]) -> None:
+    """Stage boundary: close the current stage's measurements and start `name`."""
+    wall, cpu = time.perf_counter(), time.thread_time()
+    self.sampler.stage = "profiler"  # Snapshots show up apart from the stages
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    if self._stage is not None:
+      self._peak_traced = max(self._peak_traced, peak)
+      self.stages.append({
+        "stage": self._stage,
+        "wall_seconds": round(wall - self._stage_wall, 4),
+        "cpu_seconds": round(cpu - self._stage_cpu, 4),
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "max_rss_bytes": _max_rss_bytes(),
+        "top_allocations": [
+          {
+            "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_diff_bytes": stat.size_diff,
+            "count_diff": stat.count_diff,
+            "size_bytes": stat.size,
+          }
+          for stat in self._top_growth(snapshot)
+        ],
+      })
+    self._stage, self._snapshot = name, snapshot
+    self._stage_wall, self._stage_cpu = time.perf_counter(), time.thread_time()
+    self.sampler.stage = name or "finish"
+
+  def _top_growth(self, snapshot: tracemalloc.Snapshot) -> List[tracemalloc.StatisticDiff]:
+    top = []
+    for stat in snapshot.compare_to(self._snapshot, "lineno"):
+      if not stat.traceback[0].filename.startswith(_IGNORED_SITES):
+        top.append(stat)
+        if len(top) >= self._top:
+          break
+    return top
+
+  def finish(self, outcome: str) -> None:
+    """Close the last stage, stop sampling and store the profile."""
+    try:
+      self.stage(None)
+    finally:
+      self.sampler.stop()
+      self._snapshot = None
+      _release_tracemalloc()
+      _slots.release()
+    wall = time.perf_counter() - self._wall
+    cpu = time.thread_time() - self._cpu
+    report = {
+      "session_id": self.session_id,
+      "trigger": self.trigger,
+      "outcome": outcome,
+      "started_at": self.started_at,
+      "wall_seconds": round(wall, 4),
+      "cpu_seconds": round(cpu, 4),
+      "sample_interval_ms": settings.profiling_interval_ms,
+      "sample_count": self.sampler.samples,
+      "peak_traced_bytes": self._peak_traced,
+      "max_rss_bytes": _max_rss_bytes(),
+      "stages": self.stages,
+    }
+    logger.info(
+      f"Profiled session {self.session_id} ({self.trigger}) - wall: {wall:.2f}s, "
+      f"cpu: {cpu:.2f}s, samples: {self.sampler.samples}, peak traced: {self._peak_traced} bytes"
+    )
+    try:
+      with get_db_connection() as conn:
+        queries.save_session_profile(
+          conn, self.session_id, self.trigger, wall, cpu, self.sampler.samples,
+          self._peak_traced, self.sampler.folded(), report,
+        )
+    except Exception as e:
+      logger.warning(f"Could not store profile of session {self.session_id}: {e}")
+
+
+def start(session_id: str, trigger: str) -> Optional[RunProfile]:
+  """
+  Start profiling the calling thread's run, or None if too many are running.
+
+  The caller's frame is the root of the sampled stacks; call
+  RunProfile.stage() at stage boundaries and RunProfile.finish() at the end.
+  """
+  if not _slots.acquire(blocking=False):
+    logger.warning(f"Not profiling session {session_id}: PROFILING_MAX_CONCURRENT runs in progress")
+    return None
+  try:
+    return RunProfile(session_id, trigger, sys._getframe(1))
+  except BaseException:
+    _slots.release()
+    raise
+
+
+def status() -> Dict[str, Any]:
+  return {
+    "sample_rate": _sample_rate,
+    "interval_ms": settings.profiling_interval_ms,
+    "max_concurrent": settings.profiling_max_concurrent,
+    "tracemalloc_frames": settings.profiling_tracemalloc_frames,
+    "tracemalloc_active": tracemalloc.is_tracing(),
+  }
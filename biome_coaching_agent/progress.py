@@ -0,0 +1,232 @@
+"""
+Progress events for analysis sessions.
+
+The pipeline, extractor and worker publish events (stage transitions, frame
+progress, partial metrics, completion); `/api/sessions/{id}/events` streams
+them to clients as Server-Sent Events.
+
+Delivery is in-process by default. With PROGRESS_BACKEND=postgres, events
+are also sent through `pg_notify` so API instances receive progress from
+queue workers running elsewhere; each API instance runs a LISTEN thread
+that feeds its local broker.
+"""
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from biome_coaching_agent.config import settings
+from biome_coaching_agent.logging_config import get_logger
+
+# Initialize logger
+logger = get_logger(__name__)
+
+NOTIFY_CHANNEL = "biome_progress"
+TERMINAL_EVENTS = {"completed", "failed"}
+HISTORY_PER_SESSION = 100
+MAX_TRACKED_SESSIONS = 1000
+SUBSCRIBER_QUEUE_SIZE = 256
+# pg_notify payloads must stay under 8000 bytes
+MAX_NOTIFY_BYTES = 7900
+
+# A subscriber: the event loop it consumes on and its queue
+_Subscriber = Tuple[asyncio.AbstractEventLoop, asyncio.Queue]
+
+
+def _offer(queue: "asyncio.Queue[Dict[str, Any]]", event: Dict[str, Any]) -> None:
+  """Put without blocking; drop the oldest queued event for slow consumers."""
+  if queue.full():
+    try:
+      queue.get_nowait()
+    except asyncio.QueueEmpty:
+      pass
+  queue.put_nowait(event)
+
+
+class ProgressBroker:
+  """Thread-safe in-process pub/sub keyed by session ID."""
+
+  def __init__(self, backend: str = "memory"):
+    self.backend = backend
+    self.origin = uuid.uuid4().hex
+    self._lock = threading.Lock()
+    self._history: "OrderedDict[str, Deque[Dict[str, Any]]]" = OrderedDict()
+    self._seq: Dict[str, int] = {}
+    self._subscribers: Dict[str, Set[_Subscriber]] = {}
+    self._listener: Optional[threading.Thread] = None
+    self._stop_listener = threading.Event()
+
+  # Publishing -------------------------------------------------------------
+
+  def publish(self, session_id: str, event: str, data: Optional[Dict[str, Any]] = None) -> None:
+    """Publish an event for a session. Never raises into the caller."""
+    payload = {
+      "session_id": session_id,
+      "event": event,
+      "data": data or {},
+      "ts": time.time(),
+      "origin": self.origin,
+    }
+    try:
+      self._deliver(payload)
+      if self.backend == "postgres":
+        self._notify(payload)
+    except Exception as e:
+      logger.warning(f"Failed to publish {event} for session {session_id}: {e}")
+
+  def _deliver(self, payload: Dict[str, Any]) -> None:
+    session_id = payload["session_id"]
+    with self._lock:
+      seq = self._seq.get(session_id, 0) + 1
+      self._seq[session_id] = seq
+      event = {**payload, "id": seq}
+      history = self._history.get(session_id)
+      if history is None:
+        history = deque(maxlen=HISTORY_PER_SESSION)
+        self._history[session_id] = history
+      history.append(event)
+      self._history.move_to_end(session_id)
+      while len(self._history) > MAX_TRACKED_SESSIONS:
+        evicted, _ = self._history.popitem(last=False)
+        self._seq.pop(evicted, None)
+      subscribers = list(self._subscribers.get(session_id, ()))
+
+    for loop, queue in subscribers:
+      try:
+        loop.call_soon_threadsafe(_offer, queue, event)
+      except RuntimeError:
+        # Subscriber's loop already closed
+        pass
+
+  def _notify(self, payload: Dict[str, Any]) -> None:
+    from db.connection import get_db_connection  # type: ignore
+
+    message = json.dumps(payload, default=str)
+    if len(message.encode("utf-8")) > MAX_NOTIFY_BYTES:
+      message = json.dumps({**payload, "data": {"truncated": True}}, default=str)
+    with get_db_connection() as conn:
+      conn.execute("SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, message))
+
+  # Subscribing ------------------------------------------------------------
+
+  def history(self, session_id: str, after_id: int = 0) -> List[Dict[str, Any]]:
+    """Buffered events for a session newer than `after_id`."""
+    with self._lock:
+      return [e for e in self._history.get(session_id, ()) if e["id"] > after_id]
+
+  def subscribe(self, session_id: str, after_id: int = 0) -> "Subscription":
+    """Register a subscriber; must be called from the consuming event loop."""
+    return Subscription(self, session_id, after_id)
+
+  def _add_subscriber(self, session_id: str, entry: _Subscriber, after_id: int) -> List[Dict[str, Any]]:
+    with self._lock:
+      self._subscribers.setdefault(session_id, set()).add(entry)
+      return [e for e in self._history.get(session_id, ()) if e["id"] > after_id]
+
+  def _remove_subscriber(self, session_id: str, entry: _Subscriber) -> None:
+    with self._lock:
+      subscribers = self._subscribers.get(session_id)
+      if subscribers is not None:
+        subscribers.discard(entry)
+        if not subscribers:
+          del self._subscribers[session_id]
+
+  # Postgres LISTEN --------------------------------------------------------
+
+  def start_listener(self) -> None:
+    """Start the LISTEN thread (postgres backend only; idempotent)."""
+    if self.backend != "postgres" or self._listener is not None:
+      return
+    self._stop_listener.clear()
+    self._listener = threading.Thread(target=self._listen, name="progress-listener", daemon=True)
+    self._listener.start()
+
+  def stop_listener(self) -> None:
+    self._stop_listener.set()
+    self._listener = None
+
+  def _listen(self) -> None:
+    import psycopg  # type: ignore
+
+    while not self._stop_listener.is_set():
+      try:
+        with psycopg.connect(settings.database_url, autocommit=True) as conn:
+          conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+          logger.info(f"Listening for progress events on '{NOTIFY_CHANNEL}'")
+          while not self._stop_listener.is_set():
+            for notify in conn.notifies(timeout=1.0):
+              self._handle_notify(notify.payload)
+      except Exception as e:
+        logger.warning(f"Progress listener disconnected: {e}; reconnecting")
+        self._stop_listener.wait(2.0)
+
+  def _handle_notify(self, raw: str) -> None:
+    try:
+      payload = json.loads(raw)
+    except ValueError:
+      return
+    if payload.get("origin") == self.origin:
+      return  # Already delivered locally
+    self._deliver(payload)
+
+
+class Subscription:
+  """A consumer's view of one session's events: buffered backlog, then live."""
+
+  def __init__(self, broker: ProgressBroker, session_id: str, after_id: int = 0):
+    self._broker = broker
+    self._session_id = session_id
+    self._last_id = after_id
+    self._queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    self._entry = (asyncio.get_running_loop(), self._queue)
+    for event in broker._add_subscriber(session_id, self._entry, after_id):
+      _offer(self._queue, event)
+
+  async def next(self, timeout: float) -> Optional[Dict[str, Any]]:
+    """Next unseen event, or None if nothing arrived within `timeout` seconds."""
+    deadline = time.monotonic() + timeout
+    while True:
+      remaining = deadline - time.monotonic()
+      if remaining <= 0:
+        return None
+      try:
+        event = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+      except asyncio.TimeoutError:
+        return None
+      if event["id"] > self._last_id:
+        self._last_id = event["id"]
+        return event
+
+  def close(self) -> None:
+    self._broker._remove_subscriber(self._session_id, self._entry)
+
+
+_broker: Optional[ProgressBroker] = None
+_broker_lock = threading.Lock()
+
+
+def get_broker() -> ProgressBroker:
+  """Process-wide broker configured from settings.progress_backend."""
+  global _broker
+  if _broker is None:
+    with _broker_lock:
+      if _broker is None:
+        _broker = ProgressBroker(backend=settings.progress_backend)
+  return _broker
+
+
+def publish(session_id: str, event: str, data: Optional[Dict[str, Any]] = None) -> None:
+  """Shortcut for get_broker().publish(...)."""
+  get_broker().publish(session_id, event, data)
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+  """Encode an event in text/event-stream framing."""
+  body = json.dumps(
+    {"session_id": event["session_id"], "ts": event["ts"], **event["data"]},
+    default=str,
+  )
+  return f"id: {event['id']}\nevent: {event['event']}\ndata: {body}\n\n"
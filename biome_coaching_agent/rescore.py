@@ -0,0 +1,272 @@
+"""
+Bulk re-scoring of stored sessions after the scoring rules change.
+
+Reads the pose series kept by the extractor (see pose_store) in keyset
+batches, each in its own short transaction so a long run never pins the
+database's xmin, re-runs `analyze_workout_form` on them in a process pool, and writes the new results with COPY, tagged with RULES_VERSION. The
+newest result of a session is the one the API serves, so clients see the
+new scores without re-uploading; older results are kept for comparison.
+
+Sessions are visited in session_id order and a checkpoint is committed with
+every batch of results, so an interrupted run resumes where it stopped.
+Sessions whose latest result already carries the target rules version are
+skipped, which makes re-running the job harmless. User progress aggregates
+are left alone: they keep describing the scores users were shown.
+
+Run with:
+  python -m biome_coaching_agent.rescore [--workers N] [--max-rate N] [--restart]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import chain, islice
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from db.connection import get_db_connection  # type: ignore
+from db import queries  # type: ignore
+from biome_coaching_agent.config import RULES_VERSION
+from biome_coaching_agent.logging_config import get_logger
+from biome_coaching_agent import pose_store
+
+# Initialize logger
+logger = get_logger(__name__)
+
+# (session_id, exercise_name, pose blob)
+_Candidate = Tuple[str, str, bytes]
+
+# Scheduling priority of pool processes, so scoring yields the CPU to the API
+WORKER_NICENESS = 10
+LOG_EVERY_SECONDS = 10.0
+
+
+def _init_worker() -> None:
+  try:
+    os.nice(WORKER_NICENESS)
+  except (AttributeError, OSError):
+    pass
+  signal.signal(signal.SIGINT, signal.SIG_IGN)  # The parent handles shutdown
+  # The analyzer logs every session at INFO; keep a 1M-session run readable
+  logging.getLogger("biome_coaching_agent.tools.analyze_workout_form").setLevel(logging.WARNING)
+
+
+def score_chunk(chunk: List[_Candidate]) -> Tuple[List[Dict[str, Any]], int]:
+  """Decode and re-score a chunk of sessions; returns (results, failures)."""
+  from biome_coaching_agent.tools.analyze_workout_form import analyze_workout_form
+
+  results: List[Dict[str, Any]] = []
+  failures = 0
+  for session_id, exercise_name, blob in chunk:
+    try:
+      series = pose_store.decode_blob(blob)
+      analysis = analyze_workout_form(series.to_pose_data(), exercise_name or "Squat")
+    except Exception as e:
+      logger.warning(f"Could not re-score session {session_id}: {e}")
+      failures += 1
+      continue
+    if analysis.get("status") != "success":
+      logger.warning(f"Re-scoring session {session_id} failed: {analysis.get('message')}")
+      failures += 1
+      continue
+    results.append({**analysis, "session_id": session_id})
+  return results, failures
+
+
+def _candidate_batches(
+  rules_version: str,
+  after: Optional[str],
+  batch_size: int,
+) -> Iterator[List[_Candidate]]:
+  """Candidates after `after`, one short read transaction per batch."""
+  while True:
+    with get_db_connection() as conn:
+      batch = queries.get_rescore_candidates(conn, rules_version, after, batch_size)
+    if not batch:
+      return
+    yield batch
+    after = batch[-1][0]
+
+
+def _chunked(items: Iterable[_Candidate], size: int) -> Iterator[List[_Candidate]]:
+  iterator = iter(items)
+  while True:
+    chunk = list(islice(iterator, size))
+    if not chunk:
+      return
+    yield chunk
+
+
+class _Throttle:
+  """Sleeps so that the average rate stays at or below `max_rate` sessions/s."""
+
+  def __init__(self, max_rate: float, pause: float, stop: threading.Event):
+    self.max_rate = max_rate
+    self.pause = pause
+    self.stop = stop
+    self.started = time.monotonic()
+    self.count = 0
+
+  def __call__(self, sessions: int) -> None:
+    self.count += sessions
+    delay = self.pause
+    if self.max_rate > 0:
+      delay = max(delay, self.count / self.max_rate - (time.monotonic() - self.started))
+    if delay > 0:
+      self.stop.wait(delay)
+
+
+def run_rescore(
+  rules_version: str = RULES_VERSION,
+  workers: Optional[int] = None,
+  chunk_size: int = 200,
+  max_rate: float = 0.0,
+  pause: float = 0.0,
+  restart: bool = False,
+  limit: Optional[int] = None,
+  stop: Optional[threading.Event] = None,
+) -> Dict[str, Any]:
+  """
+  Re-score stored sessions with the current rules.
+
+  Args:
+    rules_version: Tag written on the new results (and checkpoint key).
+    workers: Scoring processes; 0 scores in this process. Defaults to CPUs - 1.
+    chunk_size: Sessions per scoring task and per COPY batch.
+    max_rate: Upper bound on sessions per second (0: unthrottled).
+    pause: Seconds to sleep after each written batch.
+    restart: Discard the checkpoint and start from the first session.
+    limit: Stop after this many sessions (useful for trial runs).
+    stop: Event that ends the run after the current batch.
+
+  Returns:
+    dict: {rules_version, scored, failed, processed_total, elapsed_seconds, completed}
+  """
+  stop = stop or threading.Event()
+  if workers is None:
+    workers = max((os.cpu_count() or 2) - 1, 1)
+
+  with get_db_connection() as conn:
+    if restart:
+      queries.reset_rescore_checkpoint(conn, rules_version)
+    checkpoint = queries.get_rescore_checkpoint(conn, rules_version)
+  after = checkpoint["last_session_id"] if checkpoint else None
+  processed_total = checkpoint["processed"] if checkpoint else 0
+  logger.info(
+    f"Re-scoring with rules {rules_version} - workers: {workers}, chunk: {chunk_size}, "
+    f"max rate: {max_rate or 'unlimited'}/s, resuming after: {after or 'start'}"
+  )
+
+  executor = None
+  if workers > 0:
+    # Spawned, not forked: children must not inherit this process's pooled connections
+    executor = ProcessPoolExecutor(
+      max_workers=workers,
+      mp_context=multiprocessing.get_context("spawn"),
+      initializer=_init_worker,
+    )
+  # Bounded read-ahead: each in-flight chunk holds its blobs in memory
+  max_in_flight = max(workers, 1) * 2
+  pending: Deque[Tuple[str, int, Future]] = deque()
+  throttle = _Throttle(max_rate, pause, stop)
+  started = time.monotonic()
+  last_log = started
+  scored = failed = read = 0
+
+  def write_oldest() -> None:
+    # Chunks are written in submission order so the checkpoint only moves forward
+    nonlocal scored, failed, processed_total, last_log
+    last_id, size, future = pending.popleft()
+    results, failures = future.result()
+    with get_db_connection() as conn:
+      if results:
+        queries.copy_analysis_results(conn, results, rules_version)
+      processed_total += size
+      queries.save_rescore_checkpoint(conn, rules_version, last_id, processed_total)
+    scored += len(results)
+    failed += failures
+    now = time.monotonic()
+    if now - last_log >= LOG_EVERY_SECONDS:
+      logger.info(f"Re-scored {scored} sessions ({scored / (now - started):.0f}/s), failed: {failed}")
+      last_log = now
+    throttle(size)
+
+  completed = False
+  try:
+    candidates: Iterable[_Candidate] = chain.from_iterable(
+      _candidate_batches(rules_version, after, chunk_size)
+    )
+    if limit is not None:
+      candidates = islice(candidates, limit)
+    for chunk in _chunked(candidates, chunk_size):
+      if stop.is_set():
+        break
+      read += len(chunk)
+      if executor is not None:
+        future = executor.submit(score_chunk, chunk)
+      else:
+        future = Future()
+        future.set_result(score_chunk(chunk))
+      pending.append((chunk[-1][0], len(chunk), future))
+      while len(pending) >= max_in_flight:
+        write_oldest()
+    else:
+      completed = limit is None or read < limit
+    while pending:
+      write_oldest()
+    if completed:
+      with get_db_connection() as conn:
+        queries.save_rescore_checkpoint(conn, rules_version, None, processed_total, completed=True)
+  finally:
+    if executor is not None:
+      executor.shutdown(cancel_futures=True)
+
+  elapsed = time.monotonic() - started
+  logger.info(
+    f"Re-scoring {'complete' if completed else 'stopped'} - scored: {scored}, failed: {failed}, "
+    f"elapsed: {elapsed:.1f}s"
+  )
+  return {
+    "rules_version": rules_version,
+    "scored": scored,
+    "failed": failed,
+    "processed_total": processed_total,
+    "elapsed_seconds": round(elapsed, 2),
+    "completed": completed,
+  }
+
+
+def main(argv: Optional[list] = None) -> None:
+  parser = argparse.ArgumentParser(description="Re-score stored sessions with the current rules")
+  parser.add_argument("--rules-version", default=RULES_VERSION, help="Tag for the new results")
+  parser.add_argument("--workers", type=int, default=None, help="Scoring processes (0: in-process)")
+  parser.add_argument("--chunk-size", type=int, default=200, help="Sessions per task and write batch")
+  parser.add_argument("--max-rate", type=float, default=0.0, help="Max sessions per second (0: unlimited)")
+  parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep after each batch")
+  parser.add_argument("--limit", type=int, default=None, help="Stop after N sessions")
+  parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+  args = parser.parse_args(argv)
+
+  stop = threading.Event()
+  signal.signal(signal.SIGTERM, lambda *_: stop.set())
+  signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+  summary = run_rescore(
+    rules_version=args.rules_version,
+    workers=args.workers,
+    chunk_size=args.chunk_size,
+    max_rate=args.max_rate,
+    pause=args.pause,
+    restart=args.restart,
+    limit=args.limit,
+    stop=stop,
+  )
+  print(summary)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,155 @@
+"""
+In-process cache for /api/results and /api/sessions responses.
+
+Completed results rarely change, so they are kept until evicted (LRU,
+bounded by RESULT_CACHE_MAX_ENTRIES) or until RESULT_CACHE_FINAL_TTL_SECONDS
+pass, which bounds how long a re-scored result (see rescore.py) can be
+served stale. Responses for sessions that are not
+finished yet, including "no results yet", expire after
+RESULT_CACHE_PENDING_TTL_SECONDS so polling clients see progress promptly;
+with 0 they are not cached at all.
+Each entry carries a strong ETag over its body for conditional GETs.
+
+The cache is per process. `save_analysis_results` and the pipeline
+invalidate a session's entries in-process; sessions finished by a worker in
+another process become visible once their pending entry expires.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from biome_coaching_agent.config import settings
+from biome_coaching_agent.logging_config import get_logger
+
+# Initialize logger
+logger = get_logger(__name__)
+
+# Entry kinds, one entry per (kind, session_id)
+RESULTS = "results"
+SESSION = "session"
+KINDS = (RESULTS, SESSION)
+
+_Key = Tuple[str, str]
+
+
+def make_etag(body: bytes) -> str:
+  """Strong validator: a quoted hash of the exact response bytes."""
+  return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+  """If-None-Match comparison (weak comparison, as RFC 9110 requires for GET)."""
+  if not if_none_match:
+    return False
+  if if_none_match.strip() == "*":
+    return True
+  for candidate in if_none_match.split(","):
+    candidate = candidate.strip()
+    if candidate.startswith("W/"):
+      candidate = candidate[2:]
+    if candidate == etag:
+      return True
+  return False
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+  """A cached response body; `final` entries use the long TTL, if any."""
+  status_code: int
+  body: bytes
+  etag: str
+  final: bool
+  expires_at: Optional[float]
+
+
+class ResultCache:
+  """Thread-safe bounded LRU with per-entry expiry."""
+
+  def __init__(self, max_entries: int = 1024, pending_ttl: float = 2.0, final_ttl: Optional[float] = None):
+    # final_ttl None: final entries never expire. A TTL <= 0 disables caching
+    # for that kind; pending entries always expire.
+    self.max_entries = max_entries
+    self.pending_ttl = pending_ttl
+    self.final_ttl = final_ttl
+    self._lock = threading.Lock()
+    self._entries: "OrderedDict[_Key, CacheEntry]" = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, kind: str, session_id: str) -> Optional[CacheEntry]:
+    key = (kind, session_id)
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is not None and entry.expires_at is not None and entry.expires_at <= time.monotonic():
+        del self._entries[key]
+        entry = None
+      if entry is None:
+        self.misses += 1
+        return None
+      self._entries.move_to_end(key)
+      self.hits += 1
+      return entry
+
+  def put(self, kind: str, session_id: str, body: bytes, final: bool, status_code: int = 200) -> CacheEntry:
+    """Store a response body; entries expire after `final_ttl` or `pending_ttl`."""
+    ttl = self.final_ttl if final else self.pending_ttl
+    entry = CacheEntry(
+      status_code=status_code,
+      body=body,
+      etag=make_etag(body),
+      final=final,
+      expires_at=None if ttl is None else time.monotonic() + ttl,
+    )
+    if self.max_entries <= 0 or (ttl is not None and ttl <= 0):
+      return entry
+    key = (kind, session_id)
+    with self._lock:
+      self._entries[key] = entry
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+    return entry
+
+  def invalidate(self, session_id: str) -> None:
+    """Drop every cached response for a session."""
+    with self._lock:
+      for kind in KINDS:
+        self._entries.pop((kind, session_id), None)
+    logger.debug(f"Invalidated cached responses for session {session_id}")
+
+  def clear(self) -> None:
+    with self._lock:
+      self._entries.clear()
+
+  def stats(self) -> Dict[str, int]:
+    with self._lock:
+      return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+  """Process-wide cache configured from settings."""
+  global _cache
+  if _cache is None:
+    with _cache_lock:
+      if _cache is None:
+        _cache = ResultCache(
+          max_entries=settings.result_cache_max_entries,
+          pending_ttl=settings.result_cache_pending_ttl_seconds,
+          final_ttl=settings.result_cache_final_ttl_seconds or None,
+        )
+  return _cache
+
+
+def invalidate(session_id: str) -> None:
+  """Shortcut for get_result_cache().invalidate(...); never raises."""
+  try:
+    get_result_cache().invalidate(session_id)
+  except Exception as e:
+    logger.warning(f"Failed to invalidate cache for session {session_id}: {e}")
@@ -0,0 +1,442 @@
+"""
+Resumable chunked uploads for Biome Coaching Agent.
+
+Protocol (driven by the /api/uploads endpoints):
+  1. initiate_upload   -> preallocates `<uploads>/.partial/<upload_id>.part`
+  2. open_chunk        -> streams a checksummed chunk into place at a byte
+                          offset (ChunkWriter.write, then .commit)
+  3. get_upload        -> reports which byte ranges have been received
+  4. finalize_upload   -> verifies coverage and every chunk's checksum, then
+                          moves the file into the content-addressed store
+                          used by `upload_video`
+
+Upload state lives in a JSON manifest next to the partial file, so a client
+can resume after a dropped connection by asking which ranges are missing.
+A chunk whose bytes no longer match its checksum at finalize (torn write,
+corrupt retry) is dropped from the received ranges so the client re-sends it.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from biome_coaching_agent.config import settings
+from biome_coaching_agent.logging_config import get_logger
+from biome_coaching_agent.exceptions import (
+    ValidationError,
+    UploadTooLargeError,
+    UploadNotFoundError,
+)
+from biome_coaching_agent.ingest import (
+    CHUNK_SIZE,
+    StoredVideo,
+    content_path,
+    uploads_dir,
+    validate_extension,
+)
+
+# Initialize logger
+logger = get_logger(__name__)
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+@dataclass
+class UploadManifest:
+  """Server-side state of one resumable upload."""
+  upload_id: str
+  filename: str
+  ext: str
+  exercise_name: str
+  user_id: Optional[str]
+  total_size: int
+  chunk_size: int
+  created_at: float
+  expires_at: float
+  received: List[List[int]] = field(default_factory=list)  # merged [start, end) ranges
+  chunk_checksums: Dict[str, str] = field(default_factory=dict)  # offset -> sha256
+  chunk_lengths: Dict[str, int] = field(default_factory=dict)  # offset -> bytes
+
+  @property
+  def bytes_received(self) -> int:
+    return sum(end - start for start, end in self.received)
+
+  @property
+  def is_complete(self) -> bool:
+    return self.received == [[0, self.total_size]]
+
+  @property
+  def missing(self) -> List[List[int]]:
+    """[start, end) ranges not received yet."""
+    missing = [[0, self.total_size]]
+    for start, end in self.received:
+      missing = _subtract_range(missing, start, end)
+    return missing
+
+  def to_status(self) -> dict:
+    """Public view returned to clients."""
+    return {
+      "upload_id": self.upload_id,
+      "filename": self.filename,
+      "total_size": self.total_size,
+      "chunk_size": self.chunk_size,
+      "bytes_received": self.bytes_received,
+      "received_ranges": self.received,
+      "missing_ranges": self.missing,
+      "complete": self.is_complete,
+      "expires_at": self.expires_at,
+    }
+
+
+def _partial_dir() -> str:
+  path = os.path.join(uploads_dir(), ".partial")
+  os.makedirs(path, exist_ok=True)
+  return path
+
+
+def _part_path(upload_id: str) -> str:
+  return os.path.join(_partial_dir(), f"{upload_id}.part")
+
+
+def _manifest_path(upload_id: str) -> str:
+  return os.path.join(_partial_dir(), f"{upload_id}.json")
+
+
+def _lock_for(upload_id: str) -> threading.Lock:
+  with _locks_guard:
+    return _locks.setdefault(upload_id, threading.Lock())
+
+
+def _ttl_seconds() -> float:
+  return settings.resumable_upload_ttl_hours * 3600
+
+
+def _save_manifest(manifest: UploadManifest) -> None:
+  """Write the manifest atomically so a crash never leaves it half-written."""
+  path = _manifest_path(manifest.upload_id)
+  tmp_path = f"{path}.tmp"
+  with open(tmp_path, "w") as f:
+    json.dump(asdict(manifest), f)
+  os.replace(tmp_path, path)
+
+
+def _load_manifest(upload_id: str) -> UploadManifest:
+  try:
+    uuid.UUID(upload_id)
+  except ValueError:
+    raise UploadNotFoundError(f"Upload not found: {upload_id}")
+  try:
+    with open(_manifest_path(upload_id)) as f:
+      manifest = UploadManifest(**json.load(f))
+  except FileNotFoundError:
+    raise UploadNotFoundError(f"Upload not found: {upload_id}")
+  if manifest.expires_at < time.time():
+    _discard(upload_id)
+    raise UploadNotFoundError(f"Upload expired: {upload_id}")
+  return manifest
+
+
+def _merge_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+  """Insert [start, end) into sorted, non-overlapping ranges and coalesce."""
+  merged: List[List[int]] = []
+  for r_start, r_end in sorted(ranges + [[start, end]]):
+    if merged and r_start <= merged[-1][1]:
+      merged[-1][1] = max(merged[-1][1], r_end)
+    else:
+      merged.append([r_start, r_end])
+  return merged
+
+
+def _subtract_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+  """Remove [start, end) from sorted, non-overlapping ranges."""
+  remaining: List[List[int]] = []
+  for r_start, r_end in ranges:
+    if r_start < start:
+      remaining.append([r_start, min(r_end, start)])
+    if r_end > end:
+      remaining.append([max(r_start, end), r_end])
+  return remaining
+
+
+def _forget_range(manifest: UploadManifest, start: int, end: int) -> None:
+  """Mark [start, end) as missing again, with every chunk that overlaps it."""
+  for key in list(manifest.chunk_checksums):
+    chunk_start = int(key)
+    chunk_end = chunk_start + manifest.chunk_lengths.get(key, manifest.chunk_size)
+    if chunk_start < end and chunk_end > start:
+      start, end = min(start, chunk_start), max(end, chunk_end)
+      del manifest.chunk_checksums[key]
+      manifest.chunk_lengths.pop(key, None)
+  manifest.received = _subtract_range(manifest.received, start, end)
+
+
+def _discard(upload_id: str) -> None:
+  for path in (_part_path(upload_id), _manifest_path(upload_id)):
+    try:
+      os.remove(path)
+    except FileNotFoundError:
+      pass
+  with _locks_guard:
+    _locks.pop(upload_id, None)
+
+
+def initiate_upload(
+  filename: str,
+  total_size: int,
+  exercise_name: str,
+  user_id: Optional[str] = None,
+) -> UploadManifest:
+  """
+  Start a resumable upload and preallocate its partial file.
+
+  Raises:
+    ValidationError: Unsupported extension or non-positive size.
+    UploadTooLargeError: `total_size` exceeds the upload limit.
+  """
+  ext = validate_extension(filename)
+  if total_size <= 0:
+    raise ValidationError("total_size must be positive")
+  if total_size > settings.max_upload_size_bytes:
+    raise UploadTooLargeError(f"File exceeds {settings.max_upload_size_mb}MB limit")
+
+  cleanup_expired_uploads()
+
+  now = time.time()
+  manifest = UploadManifest(
+    upload_id=str(uuid.uuid4()),
+    filename=os.path.basename(filename),
+    ext=ext,
+    exercise_name=exercise_name,
+    user_id=user_id,
+    total_size=total_size,
+    chunk_size=settings.resumable_chunk_size_mb * 1024 * 1024,
+    created_at=now,
+    expires_at=now + _ttl_seconds(),
+  )
+
+  fd = os.open(_part_path(manifest.upload_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+  try:
+    if hasattr(os, "posix_fallocate"):
+      os.posix_fallocate(fd, 0, total_size)
+    else:
+      os.ftruncate(fd, total_size)
+  finally:
+    os.close(fd)
+
+  _save_manifest(manifest)
+  logger.info(
+    f"Resumable upload initiated - upload_id: {manifest.upload_id}, "
+    f"size: {total_size} bytes, exercise: {exercise_name}"
+  )
+  return manifest
+
+
+def get_upload(upload_id: str) -> UploadManifest:
+  """Return the manifest for an upload (raises UploadNotFoundError)."""
+  return _load_manifest(upload_id)
+
+
+class ChunkWriter:
+  """
+  Streams one chunk of an upload into the partial file at its offset.
+
+  Pieces are written in place as they arrive, so a chunk is never held in
+  memory; commit() verifies the SHA-256 and records the range. Always
+  close() the writer.
+  """
+
+  def __init__(self, manifest: UploadManifest, offset: int, length: Optional[int]):
+    self.upload_id = manifest.upload_id
+    self.offset = offset
+    self.length = length
+    self.max_length = manifest.chunk_size
+    self.available = manifest.total_size - offset
+    self.written = 0
+    self._digest = hashlib.sha256()
+    try:
+      self._fd: Optional[int] = os.open(_part_path(self.upload_id), os.O_WRONLY)
+    except FileNotFoundError:
+      raise UploadNotFoundError(f"Upload not found: {self.upload_id}")
+
+  def write(self, data: bytes) -> None:
+    """Write the next piece of the chunk (raises once it outgrows the limits)."""
+    size = self.written + len(data)
+    if size > self.max_length:
+      raise UploadTooLargeError("Chunk exceeds the negotiated chunk size")
+    if size > self.available:
+      raise ValidationError(
+        f"Chunk [{self.offset}, {self.offset + size}) is outside 0-{self.offset + self.available}"
+      )
+    view = memoryview(data)
+    done = 0
+    while done < len(view):
+      done += os.pwrite(self._fd, view[done:], self.offset + self.written + done)
+    self._digest.update(data)
+    self.written = size
+
+  def commit(self, checksum: str) -> UploadManifest:
+    """
+    Verify the chunk against `checksum` and record it in the manifest.
+
+    The bytes are already in place, so a mismatch also forgets whatever was
+    received there before: the client has to re-send that range.
+    """
+    if not self.written:
+      raise ValidationError("Chunk is empty")
+    if self.length is not None and self.written != self.length:
+      raise ValidationError(f"Chunk has {self.written} bytes, Content-Length said {self.length}")
+    os.fsync(self._fd)
+    end = self.offset + self.written
+    with _lock_for(self.upload_id):
+      manifest = _load_manifest(self.upload_id)
+      if self._digest.hexdigest() != (checksum or "").lower():
+        _forget_range(manifest, self.offset, end)
+        _save_manifest(manifest)
+        raise ValidationError(f"Checksum mismatch for chunk at offset {self.offset}")
+      manifest.received = _merge_range(manifest.received, self.offset, end)
+      manifest.chunk_checksums[str(self.offset)] = checksum.lower()
+      manifest.chunk_lengths[str(self.offset)] = self.written
+      manifest.expires_at = time.time() + _ttl_seconds()
+      _save_manifest(manifest)
+
+    logger.debug(
+      f"Chunk stored - upload_id: {self.upload_id}, offset: {self.offset}, "
+      f"size: {self.written}, received: {manifest.bytes_received}/{manifest.total_size}"
+    )
+    return manifest
+
+  def close(self) -> None:
+    if self._fd is not None:
+      os.close(self._fd)
+      self._fd = None
+
+
+def open_chunk(upload_id: str, offset: int, length: Optional[int] = None) -> ChunkWriter:
+  """
+  Start writing one chunk at `offset`; `length` is its size when known up front.
+
+  Re-sending a chunk that was already received is allowed (idempotent retry).
+
+  Raises:
+    UploadNotFoundError: Unknown or expired upload.
+    UploadTooLargeError: `length` exceeds the negotiated chunk size.
+    ValidationError: Empty chunk or offset outside the upload.
+  """
+  if length is not None:
+    if length > settings.resumable_chunk_size_mb * 1024 * 1024:
+      raise UploadTooLargeError("Chunk exceeds the negotiated chunk size")
+    if length == 0:
+      raise ValidationError("Chunk is empty")
+  manifest = _load_manifest(upload_id)
+  if offset < 0 or offset + (length or 1) > manifest.total_size:
+    raise ValidationError(
+      f"Chunk [{offset}, {offset + (length or 0)}) is outside 0-{manifest.total_size}"
+    )
+  return ChunkWriter(manifest, offset, length)
+
+
+def _verify_chunks(manifest: UploadManifest) -> Tuple[str, List[int]]:
+  """
+  Hash the partial file and re-check every recorded chunk in one pass.
+
+  Returns (whole-file sha256, offsets of chunks whose bytes do not match).
+  Chunks that tile the file are read once for both hashes; anything not
+  covered that way is hashed by a sequential read afterwards.
+  """
+  digest = hashlib.sha256()
+  position = 0
+  bad: List[int] = []
+  chunks = sorted(
+    (int(key), manifest.chunk_lengths[key], checksum)
+    for key, checksum in manifest.chunk_checksums.items()
+    if key in manifest.chunk_lengths  # Manifests written before lengths were recorded
+  )
+  with open(_part_path(manifest.upload_id), "rb") as f:
+    for start, length, checksum in chunks:
+      f.seek(start)
+      data = f.read(length)
+      if hashlib.sha256(data).hexdigest() != checksum:
+        bad.append(start)
+      if start == position:
+        digest.update(data)
+        position += len(data)
+    f.seek(position)
+    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+      digest.update(chunk)
+  return digest.hexdigest(), bad
+
+
+def finalize_upload(
+  upload_id: str,
+  expected_sha256: Optional[str] = None,
+) -> Tuple[UploadManifest, StoredVideo]:
+  """
+  Verify a complete upload and move it into the content store.
+
+  Returns:
+    (manifest, StoredVideo) - the manifest carries exercise_name/user_id
+    for creating the analysis session.
+
+  Raises:
+    UploadNotFoundError: Unknown or expired upload.
+    ValidationError: Missing ranges (listed), a chunk that no longer matches its
+      checksum (its range is marked missing) or whole-file hash mismatch.
+  """
+  with _lock_for(upload_id):
+    manifest = _load_manifest(upload_id)
+    if not manifest.is_complete:
+      missing = ", ".join(f"{start}-{end - 1}" for start, end in manifest.missing)
+      raise ValidationError(
+        f"Upload incomplete: {manifest.bytes_received}/{manifest.total_size} bytes received, "
+        f"missing bytes {missing}"
+      )
+
+    part_path = _part_path(upload_id)
+    content_hash, bad = _verify_chunks(manifest)
+    if bad:
+      for offset in bad:
+        key = str(offset)
+        if key in manifest.chunk_checksums:  # Already dropped with an overlapping chunk
+          _forget_range(manifest, offset, offset + manifest.chunk_lengths[key])
+      _save_manifest(manifest)
+      raise ValidationError(
+        f"Chunks at offsets {', '.join(map(str, bad))} failed verification; re-send them"
+      )
+    if expected_sha256 and expected_sha256.lower() != content_hash:
+      raise ValidationError("Whole-file checksum mismatch")
+
+    final_path = content_path(content_hash, manifest.ext)
+    created = not os.path.exists(final_path)
+    if created:
+      os.replace(part_path, final_path)
+    _discard(upload_id)
+
+  logger.info(f"Resumable upload finalized - upload_id: {upload_id}, path: {final_path}")
+  return manifest, StoredVideo(final_path, content_hash, manifest.total_size, created=created)
+
+
+def cleanup_expired_uploads(now: Optional[float] = None) -> int:
+  """Delete partial uploads whose manifest expired. Returns the number removed."""
+  now = now or time.time()
+  removed = 0
+  directory = _partial_dir()
+  for name in os.listdir(directory):
+    if not name.endswith(".json"):
+      continue
+    upload_id = name[:-len(".json")]
+    try:
+      with open(os.path.join(directory, name)) as f:
+        expires_at = json.load(f).get("expires_at", 0)
+    except (OSError, ValueError):
+      expires_at = 0
+    if expires_at < now:
+      _discard(upload_id)
+      removed += 1
+  if removed:
+    logger.info(f"Removed {removed} expired partial uploads")
+  return removed
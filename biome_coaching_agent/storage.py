@@ -0,0 +1,357 @@
+"""
+Object storage for uploaded videos.
+
+Uploads are content-addressed (`<sha256><ext>`, see ingest) and never
+modified, so a backend only has to store, read and delete whole objects:
+
+  * "local" (default): the uploads directory itself. Sessions reference the
+    absolute file path, as before.
+  * "s3": any S3-compatible service (AWS S3, GCS interoperability, MinIO)
+    through boto3. Sessions reference `s3://<bucket>/<key>`. Objects are
+    sent with multipart uploads streamed from the spooled ingest file.
+
+Decoders need a seekable local file, so every backend resolves an object to
+a path in the uploads directory, which doubles as the local cache. A worker
+that ingested the video, or decoded it before, opens its cached copy; other
+workers fetch it once with ranged GETs (each range retried on its own),
+verify the content hash and cache it under the same name.
+"""
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, Iterator, Optional, Tuple
+
+from biome_coaching_agent.config import settings
+from biome_coaching_agent.logging_config import get_logger
+from biome_coaching_agent.exceptions import ConfigurationError, StorageError
+from biome_coaching_agent.ingest import StoredVideo, uploads_dir
+
+try:
+  import boto3  # type: ignore
+  from boto3.s3.transfer import TransferConfig  # type: ignore
+  from botocore.config import Config as BotoConfig  # type: ignore
+  from botocore.exceptions import BotoCoreError, ClientError  # type: ignore
+except ImportError:  # Optional: only needed for STORAGE_BACKEND=s3
+  boto3 = None
+
+# Initialize logger
+logger = get_logger(__name__)
+
+TRANSFER_CHUNK_SIZE = 8 * 1024 * 1024
+RANGE_RETRIES = 3
+_CONTENT_KEY = re.compile(r"^([0-9a-f]{64})\.[a-z0-9]+$")
+
+MIME_TYPES = {
+  ".mp4": "video/mp4",
+  ".mov": "video/quicktime",
+  ".avi": "video/x-msvideo",
+  ".webm": "video/webm",
+  ".webp": "image/webp",
+  ".jpg": "image/jpeg",
+}
+
+
+def content_type(key: str) -> str:
+  return MIME_TYPES.get(os.path.splitext(key)[1].lower(), "application/octet-stream")
+
+
+class LocalStorage:
+  """Objects are files in the uploads directory."""
+
+  name = "local"
+
+  def __init__(self, root: Optional[str] = None):
+    self.root = os.path.abspath(root) if root else uploads_dir()
+    os.makedirs(self.root, exist_ok=True)
+
+  def _path(self, key: str) -> str:
+    path = os.path.join(self.root, key)
+    if os.path.dirname(path) != self.root:
+      raise StorageError(f"Invalid object key: {key}")
+    return path
+
+  def uri(self, key: str) -> str:
+    return self._path(key)
+
+  def key_for(self, uri: str) -> Optional[str]:
+    path = os.path.abspath(uri)
+    return os.path.basename(path) if os.path.dirname(path) == self.root else None
+
+  def put_file(self, key: str, path: str) -> bool:
+    """Store a local file under `key`; returns False if it was already stored."""
+    dest = self._path(key)
+    if os.path.exists(dest):
+      return False
+    tmp = f"{dest}.{uuid.uuid4().hex}.part"
+    shutil.copyfile(path, tmp)
+    os.replace(tmp, dest)
+    return True
+
+  def size(self, key: str) -> Optional[int]:
+    try:
+      return os.path.getsize(self._path(key))
+    except FileNotFoundError:
+      return None
+
+  def iter_range(self, key: str, start: int = 0, end: Optional[int] = None,
+                 chunk_size: int = TRANSFER_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield bytes `start`..`end` (inclusive; None: to the end of the object)."""
+    with open(self._path(key), "rb") as f:
+      f.seek(start)
+      remaining = None if end is None else end - start + 1
+      while remaining is None or remaining > 0:
+        chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+        if not chunk:
+          return
+        if remaining is not None:
+          remaining -= len(chunk)
+        yield chunk
+
+  def delete(self, key: str) -> None:
+    try:
+      os.remove(self._path(key))
+    except FileNotFoundError:
+      pass
+
+  def local_path(self, key: str) -> str:
+    path = self._path(key)
+    if not os.path.isfile(path):
+      raise StorageError(f"Video not found in storage: {key}")
+    return path
+
+  def signed_url(self, key: str, expires_in: int = 900) -> Optional[str]:
+    """Local objects have no external URL; the API streams them itself."""
+    return None
+
+
+class S3Storage:
+  """Objects live in an S3-compatible bucket; the uploads directory caches them."""
+
+  name = "s3"
+
+  def __init__(
+    self,
+    bucket: str,
+    prefix: str = "",
+    region: Optional[str] = None,
+    endpoint_url: Optional[str] = None,
+    cache_dir: Optional[str] = None,
+  ):
+    if boto3 is None:
+      raise ConfigurationError("STORAGE_BACKEND=s3 requires the 'boto3' package")
+    if not bucket:
+      raise ConfigurationError("STORAGE_BACKEND=s3 requires S3_BUCKET_NAME")
+    self.bucket = bucket
+    self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+    self.cache = LocalStorage(cache_dir)
+    self.client = boto3.client(
+      "s3",
+      region_name=region,
+      endpoint_url=endpoint_url,
+      config=BotoConfig(retries={"max_attempts": 5, "mode": "standard"}),
+    )
+    self._transfer = TransferConfig(
+      multipart_threshold=TRANSFER_CHUNK_SIZE,
+      multipart_chunksize=TRANSFER_CHUNK_SIZE,
+    )
+    self._fetch_locks: Dict[str, threading.Lock] = {}
+    self._locks_guard = threading.Lock()
+
+  def _object_key(self, key: str) -> str:
+    return self.prefix + key
+
+  def uri(self, key: str) -> str:
+    return f"s3://{self.bucket}/{self._object_key(key)}"
+
+  def key_for(self, uri: str) -> Optional[str]:
+    head = f"s3://{self.bucket}/{self.prefix}"
+    return uri[len(head):] if uri.startswith(head) else None
+
+  def put_file(self, key: str, path: str) -> bool:
+    """Multipart-upload a local file; returns False if the object already exists."""
+    if self.size(key) is not None:
+      return False
+    try:
+      self.client.upload_file(
+        path, self.bucket, self._object_key(key),
+        ExtraArgs={"ContentType": content_type(key)},
+        Config=self._transfer,
+      )
+    except (BotoCoreError, ClientError) as e:
+      raise StorageError(f"Failed to upload {key}: {e}") from e
+    logger.info(f"Uploaded {key} to {self.uri(key)}")
+    return True
+
+  def size(self, key: str) -> Optional[int]:
+    try:
+      head = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+    except ClientError as e:
+      if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+        return None
+      raise StorageError(f"Failed to stat {key}: {e}") from e
+    except BotoCoreError as e:
+      raise StorageError(f"Failed to stat {key}: {e}") from e
+    return int(head["ContentLength"])
+
+  def _get_range(self, key: str, start: int, end: int) -> bytes:
+    last_err: Optional[Exception] = None
+    for attempt in range(RANGE_RETRIES):
+      try:
+        response = self.client.get_object(
+          Bucket=self.bucket, Key=self._object_key(key), Range=f"bytes={start}-{end}"
+        )
+        return response["Body"].read()
+      except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+          raise StorageError(f"Video not found in storage: {key}") from e
+        last_err = e
+      except BotoCoreError as e:
+        last_err = e
+      logger.warning(f"Ranged read of {key} ({start}-{end}) failed, attempt {attempt + 1}: {last_err}")
+    raise StorageError(f"Failed to read {key}: {last_err}") from last_err
+
+  def iter_range(self, key: str, start: int = 0, end: Optional[int] = None,
+                 chunk_size: int = TRANSFER_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield bytes `start`..`end` (inclusive) with one ranged GET per chunk."""
+    if end is None:
+      size = self.size(key)
+      if size is None:
+        raise StorageError(f"Video not found in storage: {key}")
+      end = size - 1
+    offset = start
+    while offset <= end:
+      last = min(offset + chunk_size, end + 1) - 1
+      yield self._get_range(key, offset, last)
+      offset = last + 1
+
+  def delete(self, key: str) -> None:
+    try:
+      self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+    except (BotoCoreError, ClientError) as e:
+      raise StorageError(f"Failed to delete {key}: {e}") from e
+    self.cache.delete(key)
+
+  def local_path(self, key: str) -> str:
+    """Path of a cached copy, fetching the object first if it is not cached."""
+    cached = self.cache._path(key)
+    if os.path.isfile(cached):
+      return cached
+    with self._locks_guard:
+      lock = self._fetch_locks.setdefault(key, threading.Lock())
+    with lock:
+      if not os.path.isfile(cached):
+        self._fetch(key, cached)
+    with self._locks_guard:
+      self._fetch_locks.pop(key, None)
+    return cached
+
+  def _fetch(self, key: str, dest: str) -> None:
+    tmp = f"{dest}.{uuid.uuid4().hex}.part"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+      with open(tmp, "xb") as out:
+        for chunk in self.iter_range(key):
+          digest.update(chunk)
+          out.write(chunk)
+          size += len(chunk)
+        out.flush()
+        os.fsync(out.fileno())
+      match = _CONTENT_KEY.match(key)
+      if match and digest.hexdigest() != match.group(1):
+        raise StorageError(f"Content hash mismatch for {key}")
+      # Concurrent fetchers in other processes write identical bytes
+      os.replace(tmp, dest)
+    except BaseException:
+      try:
+        os.remove(tmp)
+      except OSError:
+        pass
+      raise
+    logger.info(f"Cached {key} from {self.uri(key)} ({size} bytes)")
+
+  def signed_url(self, key: str, expires_in: int = 900) -> Optional[str]:
+    try:
+      return self.client.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": self.bucket, "Key": self._object_key(key)},
+        ExpiresIn=expires_in,
+      )
+    except (BotoCoreError, ClientError) as e:
+      raise StorageError(f"Failed to sign URL for {key}: {e}") from e
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+  """Process-wide backend selected by STORAGE_BACKEND."""
+  global _storage
+  if _storage is None:
+    with _storage_lock:
+      if _storage is None:
+        backend = settings.storage_backend
+        if backend == "s3":
+          _storage = S3Storage(
+            bucket=settings.s3_bucket_name or "",
+            prefix=settings.s3_prefix,
+            region=settings.aws_region,
+            endpoint_url=settings.s3_endpoint_url,
+          )
+        elif backend == "local":
+          _storage = LocalStorage()
+        else:
+          raise ConfigurationError(f"Unknown STORAGE_BACKEND: {backend}")
+        logger.info(f"Video storage backend: {_storage.name}")
+  return _storage
+
+
+def store_video(stored: StoredVideo) -> Tuple[str, bool]:
+  """
+  Publish an ingested video to the configured backend.
+
+  Returns:
+    (video_url to record on the session, whether a new object was written)
+  """
+  storage = get_storage()
+  key = os.path.basename(stored.path)
+  created = storage.put_file(key, stored.path)
+  return storage.uri(key), created
+
+
+def resolve_key(video_url: str) -> str:
+  """Object key of a session's video_url, which must belong to the configured backend."""
+  key = get_storage().key_for(video_url)
+  if key is None:
+    raise StorageError(f"Video is not in the configured {settings.storage_backend} storage: {video_url}")
+  return key
+
+
+def mark_used(path: str) -> None:
+  """Refresh atime so the janitor's LRU sees a read (mounts often use relatime)."""
+  try:
+    os.utime(path, (time.time(), os.stat(path).st_mtime))
+  except OSError:
+    pass
+
+
+def local_video_path(video_url: str) -> str:
+  """Local file to decode for a session's video_url (fetched into the cache if needed)."""
+  if not video_url.startswith("s3://") and os.path.isfile(video_url):
+    path = video_url  # Local file, including paths recorded before the storage layer
+  else:
+    path = get_storage().local_path(resolve_key(video_url))
+  mark_used(path)
+  return path
+
+
+def signed_video_url(video_url: str, expires_in: int = 900) -> Optional[str]:
+  """Time-limited direct URL for a session's video, or None if it must be streamed locally."""
+  if not video_url.startswith("s3://"):
+    return None
+  return get_storage().signed_url(resolve_key(video_url), expires_in)
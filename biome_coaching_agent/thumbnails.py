@@ -0,0 +1,375 @@
+"""
+Preview thumbnails for the results page.
+
+Each analyzed session gets one sprite sheet: small frames at the start and
+end of every issue and at the top and bottom of every rep, tiled in a grid,
+plus a JSON index of where each frame sits in the sheet. A results page
+shows any of them with one image request (CSS background-position), which
+keeps it fast on mobile instead of seeking the full video in the browser.
+
+The frames come from the extractor, which already has them decoded: it
+keeps a downscaled JPEG of every frame with a detection in a
+`ThumbnailBuffer` (a few KB each, decimated past BUFFER_MAX_FRAMES). Issues
+are only known after analysis, so the pipeline picks the frames and writes
+the sheet once results are saved. Sheets are cached in UPLOADS_DIR/thumbnails
+(a janitor render cache). When one is missing or was built for an older
+result (re-scoring), `ensure_sheet` rebuilds it by seeking to just the
+selected frames of the original video.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2  # type: ignore
+import numpy as np  # type: ignore
+
+from db.connection import get_db_connection  # type: ignore
+from db import queries  # type: ignore
+from biome_coaching_agent.config import settings
+from biome_coaching_agent.logging_config import get_logger
+from biome_coaching_agent.ingest import uploads_dir
+from biome_coaching_agent import pose_store
+from biome_coaching_agent.storage import local_video_path, mark_used
+from biome_coaching_agent.exceptions import VideoProcessingError
+
+# Initialize logger
+logger = get_logger(__name__)
+
+# Subdirectory of UPLOADS_DIR (the janitor evicts it as derived data)
+THUMBNAILS_SUBDIR = "thumbnails"
+
+BUFFER_MAX_FRAMES = 1200
+SHEET_COLUMNS = 8
+# An angle must swing this far between a rep's top and bottom
+REP_MIN_SWING_DEGREES = 20.0
+# Buffers of finished extractions waiting for the pipeline to pick frames
+MAX_PENDING_BUFFERS = 8
+
+FORMATS = {"webp": (".webp", [cv2.IMWRITE_WEBP_QUALITY, 80]), "jpeg": (".jpg", [cv2.IMWRITE_JPEG_QUALITY, 80])}
+SHEET_NAME = re.compile(r"^[0-9a-f-]{36}\.[0-9a-f]{12}\.(webp|jpg)$")
+
+
+def thumbnails_dir() -> str:
+  path = os.path.join(uploads_dir(), THUMBNAILS_SUBDIR)
+  os.makedirs(path, exist_ok=True)
+  return path
+
+
+def _index_path(session_id: str) -> str:
+  return os.path.join(thumbnails_dir(), f"{session_id}.json")
+
+
+def sheet_path(name: str) -> Optional[str]:
+  """Path of a sheet file by its published name, or None for foreign names."""
+  return os.path.join(thumbnails_dir(), name) if SHEET_NAME.match(name) else None
+
+
+def downscale(image: np.ndarray, height: int) -> np.ndarray:
+  """Resize to `height` pixels high; a linear pre-pass keeps INTER_AREA cheap on large frames."""
+  h, w = image.shape[:2]
+  if h <= height:
+    return image
+  size = (max(int(round(w * height / h)), 1), height)
+  if h > height * 2:
+    image = cv2.resize(image, (size[0] * 2, height * 2), interpolation=cv2.INTER_LINEAR)
+  return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+class ThumbnailBuffer:
+  """Downscaled JPEGs of decoded frames, by source frame number."""
+
+  def __init__(self, height: Optional[int] = None, max_frames: int = BUFFER_MAX_FRAMES):
+    self.height = height or settings.thumbnail_height
+    self.max_frames = max_frames
+    self.fps: Optional[float] = None  # Source frame rate, for timestamps
+    self.tiles: "OrderedDict[int, bytes]" = OrderedDict()
+    self._stride = 1
+    self._offered = 0
+
+  def add(self, frame_no: int, image: np.ndarray) -> None:
+    self._offered += 1
+    if (self._offered - 1) % self._stride:
+      return
+    ok, encoded = cv2.imencode(".jpg", downscale(image, self.height), [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if ok:
+      self.tiles[frame_no] = encoded.tobytes()
+    if len(self.tiles) > self.max_frames:
+      # Long video: keep every other frame from here on
+      for drop in list(self.tiles)[1::2]:
+        del self.tiles[drop]
+      self._stride *= 2
+
+  def tile(self, frame_no: int) -> Optional[np.ndarray]:
+    data = self.tiles.get(frame_no)
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) if data else None
+
+
+_pending: "OrderedDict[str, ThumbnailBuffer]" = OrderedDict()
+_pending_lock = threading.Lock()
+
+
+def stash(session_id: str, buffer: ThumbnailBuffer) -> None:
+  """Keep an extraction's buffer until the pipeline knows the issues."""
+  with _pending_lock:
+    _pending[session_id] = buffer
+    while len(_pending) > MAX_PENDING_BUFFERS:
+      _pending.popitem(last=False)
+
+
+def take(session_id: str) -> Optional[ThumbnailBuffer]:
+  with _pending_lock:
+    return _pending.pop(session_id, None)
+
+
+def _primary_angle(angle_rows: Sequence[Dict[str, float]]) -> Optional[np.ndarray]:
+  """Series of the joint that moves most (left/right averaged): knees in a squat."""
+  if not angle_rows:
+    return None
+  joints: Dict[str, List[str]] = {}
+  for key in angle_rows[0]:
+    joints.setdefault(re.sub(r"^(left|right)_", "", key), []).append(key)
+  best, best_range = None, 0.0
+  for keys in joints.values():
+    series = np.array([[row[k] for k in keys] for row in angle_rows], dtype=np.float64).mean(axis=1)
+    swing = float(series.max() - series.min())
+    if swing > best_range:
+      best, best_range = series, swing
+  return best
+
+
+def rep_extremes(angle_rows: Sequence[Dict[str, float]], min_swing: float = REP_MIN_SWING_DEGREES) -> List[Tuple[int, str]]:
+  """(row index, "rep_top" | "rep_bottom") turning points, with hysteresis against noise."""
+  series = _primary_angle(angle_rows)
+  if series is None or len(series) < 3:
+    return []
+  smoothed = np.convolve(np.pad(series, 1, mode="edge"), np.ones(3) / 3, mode="valid")
+  extremes: List[Tuple[int, str]] = []
+  hi = lo = 0
+  direction = 0  # 1 rising, -1 falling, 0 unknown
+  for i in range(1, len(smoothed)):
+    if smoothed[i] > smoothed[hi]:
+      hi = i
+    if smoothed[i] < smoothed[lo]:
+      lo = i
+    if direction >= 0 and smoothed[hi] - smoothed[i] >= min_swing:
+      extremes.append((hi, "rep_top"))
+      direction, lo = -1, i
+    elif direction <= 0 and smoothed[i] - smoothed[lo] >= min_swing:
+      extremes.append((lo, "rep_bottom"))
+      direction, hi = 1, i
+  return extremes
+
+
+def select_frames(
+  frame_numbers: Sequence[int],
+  angle_rows: Sequence[Dict[str, float]],
+  issues: Sequence[Dict[str, Any]],
+  limit: Optional[int] = None,
+) -> List[Tuple[int, List[Dict[str, Any]]]]:
+  """
+  Frames worth a thumbnail, with why: [(frame, [{kind, ...}]), ...] in frame order.
+
+  Issue boundaries snap to the nearest frame with a detection. Past `limit`,
+  issue frames are kept and rep extremes thinned out evenly.
+  """
+  limit = limit or settings.thumbnail_max_count
+  available = np.asarray(frame_numbers, dtype=np.int64)
+  if available.size == 0:
+    return []
+  issue_marks: Dict[int, List[Dict[str, Any]]] = {}
+  for issue in issues:
+    for kind, key in (("issue_start", "frame_start"), ("issue_end", "frame_end")):
+      frame = int(available[np.abs(available - int(issue[key])).argmin()])
+      issue_marks.setdefault(frame, []).append({
+        "kind": kind,
+        "issue_type": issue.get("issue_type"),
+        "severity": issue.get("severity"),
+      })
+  rep_marks: Dict[int, List[Dict[str, Any]]] = {}
+  for idx, kind in rep_extremes(angle_rows):
+    rep_marks.setdefault(int(available[idx]), []).append({"kind": kind})
+
+  reps_only = [f for f in rep_marks if f not in issue_marks]
+  room = max(limit - len(issue_marks), 0)
+  if len(reps_only) > room:
+    keep = set(np.linspace(0, len(reps_only) - 1, room).round().astype(int).tolist()) if room else set()
+    reps_only = [f for i, f in enumerate(reps_only) if i in keep]
+  frames = sorted(set(list(issue_marks)[:limit]) | set(reps_only))
+  return [(f, issue_marks.get(f, []) + rep_marks.get(f, [])) for f in frames]
+
+
+def _write_sheet(
+  session_id: str,
+  result_id: Optional[str],
+  selected: Sequence[Tuple[int, List[Dict[str, Any]]]],
+  tiles: Sequence[np.ndarray],
+  fps: Optional[float],
+) -> Dict[str, Any]:
+  fmt = settings.thumbnail_format if settings.thumbnail_format in FORMATS else "jpeg"
+  ext, params = FORMATS[fmt]
+  tile_h, tile_w = tiles[0].shape[:2]
+  columns = min(len(tiles), SHEET_COLUMNS)
+  rows = (len(tiles) + columns - 1) // columns
+  sheet = np.zeros((rows * tile_h, columns * tile_w, 3), dtype=np.uint8)
+  entries = []
+  for i, ((frame, marks), tile) in enumerate(zip(selected, tiles)):
+    if tile.shape[:2] != (tile_h, tile_w):
+      tile = cv2.resize(tile, (tile_w, tile_h), interpolation=cv2.INTER_AREA)
+    x, y = (i % columns) * tile_w, (i // columns) * tile_h
+    sheet[y:y + tile_h, x:x + tile_w] = tile
+    entries.append({
+      "frame": frame,
+      "time": round(frame / fps, 3) if fps else None,
+      "x": x,
+      "y": y,
+      "marks": marks,
+    })
+  ok, encoded = cv2.imencode(ext, sheet, params)
+  if not ok:
+    raise VideoProcessingError(f"Failed to encode thumbnail sheet as {fmt}")
+  data = encoded.tobytes()
+  name = f"{session_id}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+  index = {
+    "session_id": session_id,
+    "result_id": result_id,
+    "sheet": name,
+    "format": fmt,
+    "tile_width": tile_w,
+    "tile_height": tile_h,
+    "columns": columns,
+    "rows": rows,
+    "thumbnails": entries,
+  }
+
+  directory = thumbnails_dir()
+  suffix = f".{uuid.uuid4().hex}.part"
+  for path, payload in ((os.path.join(directory, name), data), (_index_path(session_id), json.dumps(index).encode("utf-8"))):
+    with open(path + suffix, "wb") as f:
+      f.write(payload)
+    os.replace(path + suffix, path)
+  # Sheets of earlier results of this session
+  for other in os.listdir(directory):
+    if other.startswith(f"{session_id}.") and other != name and SHEET_NAME.match(other):
+      try:
+        os.remove(os.path.join(directory, other))
+      except OSError:
+        pass
+  logger.info(f"Thumbnail sheet {name}: {len(entries)} frames, {len(data)} bytes")
+  return index
+
+
+def finalize(
+  session_id: str,
+  result_id: Optional[str],
+  frames: Sequence[Dict[str, Any]],
+  issues: Sequence[Dict[str, Any]],
+) -> Optional[Dict[str, Any]]:
+  """Write the sheet from the extractor's buffer; None if this process holds no buffer."""
+  buffer = take(session_id)
+  if buffer is None or not buffer.tiles:
+    return None
+  # Only buffered frames can be chosen (long videos are decimated)
+  usable = [f for f in frames if f["frame"] in buffer.tiles]
+  selected = select_frames(
+    [f["frame"] for f in usable], [f["angles"] for f in usable], issues
+  )
+  if not selected:
+    return None
+  tiles = [buffer.tile(frame) for frame, _ in selected]
+  return _write_sheet(session_id, result_id, selected, tiles, buffer.fps)
+
+
+def _read_frames(video_url: str, frame_numbers: Sequence[int], height: int) -> Tuple[List[np.ndarray], float]:
+  """Decode just the given frames (ascending), seeking between distant ones."""
+  cap = cv2.VideoCapture(local_video_path(video_url))
+  if not cap.isOpened():
+    raise VideoProcessingError(f"Failed to open video: {video_url}")
+  try:
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    # Reading on is cheaper than a seek (which decodes from a keyframe) for short hops
+    max_skip = int(fps)
+    tiles: List[np.ndarray] = []
+    position = 0
+    for frame_no in frame_numbers:
+      if frame_no < position or frame_no - position > max_skip:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_no)
+        position = frame_no
+      while position < frame_no and cap.grab():
+        position += 1
+      ok, image = cap.read()
+      if not ok:
+        raise VideoProcessingError(f"Failed to read frame {frame_no} of {video_url}")
+      position += 1
+      tiles.append(downscale(image, height))
+    return tiles, fps
+  finally:
+    cap.release()
+
+
+_rebuild_locks: Dict[str, threading.Lock] = {}
+
+
+def ensure_sheet(session_id: str) -> Optional[Dict[str, Any]]:
+  """
+  The sheet index for a session, rebuilding the sheet if needed.
+
+  Returns None when the session does not exist or has no results yet.
+
+  Raises:
+    VideoProcessingError: No stored landmarks, or the video could not be read
+  """
+  with get_db_connection() as conn:
+    source = queries.get_thumbnail_source(conn, session_id)
+  if not source or not source["result_id"]:
+    return None
+  analyzed_id = source["analyzed_session_id"]
+
+  with _pending_lock:
+    lock = _rebuild_locks.setdefault(analyzed_id, threading.Lock())
+  try:
+    with lock:
+      return _ensure_sheet(analyzed_id, source)
+  finally:
+    with _pending_lock:
+      _rebuild_locks.pop(analyzed_id, None)
+
+
+def _ensure_sheet(analyzed_id: str, source: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+  index = _load_index(analyzed_id)
+  if index and index.get("result_id") == source["result_id"]:
+    return index
+
+  series = pose_store.load_pose_series(analyzed_id)
+  if series is None or series.frame_count == 0:
+    raise VideoProcessingError("No stored landmarks for this session")
+  with get_db_connection() as conn:
+    document = queries.get_analysis_result_by_session(conn, analyzed_id)
+  issues = document["issues"] if document else []
+  selected = select_frames(series.frame_indices.tolist(), series.angle_series(), issues)
+  if not selected:
+    return None
+  tiles, fps = _read_frames(
+    source["video_url"], [frame for frame, _ in selected], settings.thumbnail_height
+  )
+  logger.info(f"Rebuilt thumbnails of session {analyzed_id} from the video")
+  return _write_sheet(analyzed_id, source["result_id"], selected, tiles, fps)
+
+
+def _load_index(session_id: str) -> Optional[Dict[str, Any]]:
+  """Cached index whose sheet is still on disk."""
+  try:
+    with open(_index_path(session_id), "rb") as f:
+      index = json.load(f)
+  except (FileNotFoundError, ValueError):
+    return None
+  sheet = sheet_path(index.get("sheet", ""))
+  if not sheet or not os.path.isfile(sheet):
+    return None
+  mark_used(sheet)
+  mark_used(_index_path(session_id))
+  return index
@@ -4,6 +4,7 @@ Pose extraction tool using MediaPipe.
 Processes the stored video at a reduced FPS to extract 33 pose landmarks
 and computes simple joint angle metrics for hackathon demo.
 """
+import time
 from typing import Any, Dict, List, Optional
 
 import cv2  # type: ignore
@@ -14,16 +15,25 @@ from google.adk.tools.tool_context import ToolContext
 from db.connection import get_db_connection  # type: ignore
 from db import queries  # type: ignore
 from biome_coaching_agent.logging_config import get_logger  # type: ignore
+from biome_coaching_agent import pose_store, progress, thumbnails, tracing  # type: ignore
+from biome_coaching_agent.metrics import observe_extraction  # type: ignore
+from biome_coaching_agent.storage import local_video_path  # type: ignore
+from biome_coaching_agent.transcode import wait_for_proxy  # type: ignore
+from biome_coaching_agent.config import settings  # type: ignore
 from biome_coaching_agent.exceptions import (  # type: ignore
     ValidationError,
     PoseExtractionError,
     DatabaseError,
     SessionNotFoundError,
+    StorageError,
 )
 
 # Initialize logger
 logger = get_logger(__name__)
 
+# Publish a progress event roughly every this many percent of the video
+PROGRESS_STEP_PERCENT = 5
+
 
 def _angle_between(p1: np.ndarray, p2: np.ndarray, p3: np.ndarray) -> float:
   """Compute angle at p2 formed by p1-p2-p3 in degrees."""
@@ -84,44 +94,51 @@ def extract_pose_landmarks(
   logger.info(f"Starting pose extraction - session_id: {session_id}, fps: {fps}")
   
   try:
-    # Get session from database
+    # Get session (and its stored video's proxy, if any) from database
     try:
       with get_db_connection() as conn:
-        row = queries.get_analysis_session(conn, session_id)
+        media = queries.get_session_media(conn, session_id)
     except Exception as db_err:
       logger.error(f"Database error fetching session {session_id}: {db_err}")
       raise DatabaseError(f"Failed to fetch session: {db_err}")
     
-    if not row:
+    if not media:
       logger.error(f"Session not found: {session_id}")
       raise SessionNotFoundError(f"Session not found: {session_id}")
 
-    # Extract video path from row
-    # Row layout depends on cursor factory; safest is to lookup by column order
-    video_url = None
-    for col in row:
-      if isinstance(col, str) and ("/" in col or "\\" in col) and (
-        col.endswith(".mp4") or col.endswith(".mov") or 
-        col.endswith(".avi") or col.endswith(".webm")
-      ):
-        video_url = col
-        break
-    
+    video_url = media["video_url"]
     if not video_url:
       logger.error(f"No video path in session {session_id}")
       raise ValidationError("Video path not found in session")
+
+    # Prefer the analysis proxy when it samples at least as densely as asked
+    proxy_url = media["proxy_url"] or wait_for_proxy(media["content_hash"])
+    proxy_fps = media["proxy_fps"] or settings.pose_detection_fps
+    use_proxy = bool(proxy_url) and proxy_fps >= fps
+    source_path = None
+    if use_proxy:
+      try:
+        source_path = local_video_path(proxy_url)
+      except StorageError as proxy_err:
+        # Proxies are disposable (see janitor); decode the original instead
+        logger.warning(f"Proxy unavailable for session {session_id}, using original: {proxy_err}")
+        use_proxy = False
+    source_url = proxy_url if use_proxy else video_url
     
-    logger.debug(f"Processing video: {video_url}")
+    logger.debug(f"Processing video: {source_url}")
 
-    # Open video
-    cap = cv2.VideoCapture(video_url)
+    # Open video (objects in remote storage are fetched into the local cache once)
+    cap = cv2.VideoCapture(source_path or local_video_path(source_url))
     if not cap.isOpened():
-      logger.error(f"Failed to open video file: {video_url}")
-      raise PoseExtractionError(f"Failed to open video: {video_url}")
+      logger.error(f"Failed to open video file: {source_url}")
+      raise PoseExtractionError(f"Failed to open video: {source_url}")
 
     native_fps = cap.get(cv2.CAP_PROP_FPS) or 30
     total_frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     frame_interval = max(int(round(native_fps / max(fps, 1))), 1)
+    # Frame numbers are reported in the original video's timeline
+    source_fps = media["source_fps"] if use_proxy else None
+    frame_scale = source_fps / native_fps if source_fps else 1.0
     logger.info(
       f"Video opened - native_fps: {native_fps}, total_frames: {total_frame_count}, "
       f"processing every {frame_interval} frames"
@@ -139,23 +156,56 @@ def extract_pose_landmarks(
     mp_pose = mp.solutions.pose
     pose = mp_pose.Pose(model_complexity=1)
 
+    # Downscaled copies of detected frames for preview thumbnails (see thumbnails)
+    thumbs = thumbnails.ThumbnailBuffer() if settings.thumbnails_enabled else None
+    if thumbs is not None:
+      thumbs.fps = source_fps or native_fps
+
     frames: List[Dict[str, Any]] = []
     angle_series: List[Dict[str, float]] = []
     idx = 0
     processed_count = 0
     no_detection_count = 0
+    next_progress_pct = PROGRESS_STEP_PERCENT
+    # Per-frame timings, flushed to the metrics registry once per video
+    decode_times: List[float] = []
+    inference_times: List[float] = []
+    angle_times: List[float] = []
+    # ...and rolled up into a trace span per batch of frames when tracing
+    batches = tracing.phase_batcher("extract.batch", {
+      "decode": decode_times,
+      "inference": inference_times,
+      "angles": angle_times,
+    })
     
     while True:
+      if batches is not None and idx and idx % tracing.TRACE_BATCH_FRAMES == 0:
+        batches.emit(tracing.TRACE_BATCH_FRAMES)
+      t0 = time.perf_counter()
       ret, frame = cap.read()
       if not ret:
         break
+      decode_times.append(time.perf_counter() - t0)
+      
+      if total_frame_count > 0 and idx * 100 >= next_progress_pct * total_frame_count:
+        pct = min(int(idx * 100 / total_frame_count), 100)
+        progress.publish(session_id, "progress", {
+          "stage": "pose_extraction",
+          "frames_read": idx,
+          "frames_total": total_frame_count,
+          "frames_detected": processed_count,
+          "percent": pct,
+        })
+        next_progress_pct = pct + PROGRESS_STEP_PERCENT
       
       if idx % frame_interval != 0:
         idx += 1
         continue
 
       rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+      t0 = time.perf_counter()
       res = pose.process(rgb)
+      inference_times.append(time.perf_counter() - t0)
       
       if not res.pose_landmarks:
         no_detection_count += 1
@@ -163,18 +213,26 @@ def extract_pose_landmarks(
         continue
 
       # Process landmarks
+      t0 = time.perf_counter()
       lm_list: List[Dict[str, float]] = []
       for lm in res.pose_landmarks.landmark:
         lm_list.append({"x": float(lm.x), "y": float(lm.y), "z": float(lm.z)})
 
       angles = _calc_joint_angles(lm_list)
+      angle_times.append(time.perf_counter() - t0)
       angle_series.append(angles)
-      frames.append({"frame": idx, "landmarks": lm_list, "angles": angles})
+      frame_no = int(round(idx * frame_scale))
+      frames.append({"frame": frame_no, "landmarks": lm_list, "angles": angles})
+      if thumbs is not None:
+        thumbs.add(frame_no, frame)
       processed_count += 1
       idx += 1
 
     cap.release()
     pose.close()
+    observe_extraction(decode_times, inference_times, processed_count)
+    if batches is not None and idx % tracing.TRACE_BATCH_FRAMES:
+      batches.emit(idx % tracing.TRACE_BATCH_FRAMES)
 
     if not frames:
       logger.warning(
@@ -187,6 +245,14 @@ def extract_pose_landmarks(
       )
 
     metrics = _aggregate_metrics(angle_series)
+
+    # Keep the series for re-scoring; analysis proceeds even if this fails
+    try:
+      pose_store.save_pose_series(session_id, frames)
+    except Exception as store_err:
+      logger.warning(f"Could not store pose series for session {session_id}: {store_err}")
+    if thumbs is not None:
+      thumbnails.stash(session_id, thumbs)
     
     logger.info(
       f"Pose extraction complete - session: {session_id}, "
@@ -226,6 +292,14 @@ def extract_pose_landmarks(
       "message": str(de)
     }
   
+  except StorageError as se:
+    logger.error(f"Storage error for {session_id}: {se}", exc_info=True)
+    return {
+      "status": "error",
+      "error_type": "storage",
+      "message": str(se)
+    }
+  
   except Exception as e:
     logger.critical(
       f"Unexpected error during pose extraction for {session_id}: {e}",
@@ -5,16 +5,19 @@ Persists complete analysis results to PostgreSQL database including
 form issues, metrics, strengths, and recommendations.
 """
 import time
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from google.adk.tools.tool_context import ToolContext
 
 from db.connection import get_db_connection  # type: ignore
 from db import queries  # type: ignore
 from biome_coaching_agent.logging_config import get_logger  # type: ignore
+from biome_coaching_agent import result_cache  # type: ignore
+from biome_coaching_agent.config import RULES_VERSION  # type: ignore
 from biome_coaching_agent.exceptions import (  # type: ignore
     ValidationError,
     DatabaseError,
+    LeaseLostError,
 )
 
 # Initialize logger
@@ -24,6 +27,7 @@ logger = get_logger(__name__)
 def save_analysis_results(
   session_id: str,
   analysis_data: dict,
+  lease_owner: Optional[str] = None,
   tool_context: ToolContext = None,
 ) -> dict:
   """
@@ -40,10 +44,14 @@ def save_analysis_results(
         "strengths": [str, ...],
         "recommendations": [{recommendation_text, priority}, ...],
       }
+    lease_owner: Queue worker processing the session; results are only
+      saved while it still holds the session's lease.
     tool_context: ADK tool context (unused).
 
   Returns:
-    dict: {status: "success" | "error", result_id: str, message: str} or {status, error_type, message} on error
+    dict: {status: "success" | "error", result_id: str, message: str} or {status, error_type, message} on error.
+      Failures leave the session status alone: the caller decides whether
+      the session failed or will be retried (see pipeline.run_analysis).
   """
   logger.info(f"Saving analysis results for session: {session_id}")
   
@@ -69,77 +77,35 @@ def save_analysis_results(
       f"strengths: {len(strengths)}, recommendations: {len(recommendations)}"
     )
 
-    # Record processing time if not provided
-    if processing_time is None:
-      processing_time = 0.0  # Default, could track start/end in future
-
     try:
       with get_db_connection() as conn:
-        # Create analysis result record
-        result_id = queries.create_analysis_result(
+        # Result, child rows and session completion go out as one pipelined batch
+        result_id = queries.save_analysis_bundle(
           conn=conn,
           session_id=session_id,
           overall_score=overall_score,
           total_frames=total_frames,
           processing_time=processing_time,
+          issues=issues,
+          metrics=metrics_list,
+          strengths=strengths,
+          recommendations=recommendations,
+          rules_version=RULES_VERSION,
+          lease_owner=lease_owner,
         )
-        logger.debug(f"Created analysis result record: {result_id}")
-
-        # Save form issues
-        for idx, issue in enumerate(issues):
-          queries.create_form_issue(
-            conn=conn,
-            result_id=result_id,
-            issue_type=issue.get("issue_type", "Unknown Issue"),
-            severity=issue.get("severity", "moderate"),
-            frame_start=issue.get("frame_start", 0),
-            frame_end=issue.get("frame_end", 0),
-            coaching_cue=issue.get("coaching_cue", ""),
-            confidence_score=issue.get("confidence_score"),
-          )
-        logger.debug(f"Saved {len(issues)} form issues")
-
-        # Save metrics
-        for metric in metrics_list:
-          queries.create_metric(
-            conn=conn,
-            result_id=result_id,
-            metric_name=metric.get("metric_name", "Unknown"),
-            actual_value=metric.get("actual_value", ""),
-            target_value=metric.get("target_value", ""),
-            status=metric.get("status", "warning"),
-          )
-        logger.debug(f"Saved {len(metrics_list)} metrics")
-
-        # Save strengths
-        for strength_text in strengths:
-          queries.create_strength(
-            conn=conn,
-            result_id=result_id,
-            strength_text=strength_text,
-          )
-        logger.debug(f"Saved {len(strengths)} strengths")
-
-        # Save recommendations
-        for rec in recommendations:
-          queries.create_recommendation(
-            conn=conn,
-            result_id=result_id,
-            recommendation_text=rec.get("recommendation_text", ""),
-            priority=rec.get("priority", 1),
-          )
-        logger.debug(f"Saved {len(recommendations)} recommendations")
-
-        # Update session status to completed
-        queries.update_session_status(conn, session_id, "completed", None)
+        if result_id is None:
+          raise LeaseLostError(f"Lease on session {session_id} was lost; results discarded")
         logger.info(f"Session {session_id} marked as completed")
 
-        # Commit transaction (handled by context manager)
-
+    except LeaseLostError:
+      raise
     except Exception as db_err:
       logger.error(f"Database error saving results for session {session_id}: {db_err}", exc_info=True)
       raise DatabaseError(f"Failed to save results to database: {db_err}")
 
+    # Drop cached "no results yet" / in-progress responses for this session
+    result_cache.invalidate(session_id)
+
     logger.info(
       f"Successfully saved analysis results - session: {session_id}, "
       f"result_id: {result_id}, issues: {len(issues)}, metrics: {len(metrics_list)}"
@@ -153,28 +119,22 @@ def save_analysis_results(
   
   except ValidationError as ve:
     logger.warning(f"Validation error saving results: {ve}")
-    # Try to mark session as failed
-    try:
-      with get_db_connection() as conn:
-        queries.update_session_status(conn, session_id, "failed", str(ve))
-    except Exception as update_err:
-      logger.error(f"Failed to update session status on validation error: {update_err}")
-    
     return {
       "status": "error",
       "error_type": "validation",
       "message": str(ve)
     }
   
+  except LeaseLostError as le:
+    logger.warning(str(le))
+    return {
+      "status": "error",
+      "error_type": "lease_lost",
+      "message": str(le)
+    }
+  
   except DatabaseError as de:
     logger.error(f"Database error: {de}", exc_info=True)
-    # Try to mark session as failed
-    try:
-      with get_db_connection() as conn:
-        queries.update_session_status(conn, session_id, "failed", str(de))
-    except Exception as update_err:
-      logger.error(f"Failed to update session status on database error: {update_err}")
-    
     return {
       "status": "error",
       "error_type": "database",
@@ -183,13 +143,6 @@ def save_analysis_results(
   
   except Exception as e:
     logger.critical(f"Unexpected error saving results for session {session_id}: {e}", exc_info=True)
-    # Try to mark session as failed
-    try:
-      with get_db_connection() as conn:
-        queries.update_session_status(conn, session_id, "failed", str(e))
-    except Exception as update_err:
-      logger.error(f"Failed to update session status on unexpected error: {update_err}")
-
     return {
       "status": "error",
       "error_type": "unknown",
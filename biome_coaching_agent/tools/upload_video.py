@@ -2,10 +2,13 @@
 Video upload tool for Biome Coaching Agent.
 
 Validates the file and creates an analysis session record.
-For hackathon/local dev, this copies to a local `uploads/` directory.
+Videos are stored content-addressed (by SHA-256): spooled into the local
+uploads directory, then published to the configured storage backend (see
+storage.py). Identical uploads share one object, and if the same content
+was already analyzed for the same exercise and pipeline version the new
+session reuses those results.
 """
 import os
-import shutil
 import uuid
 from typing import Optional
 
@@ -13,31 +16,27 @@ from google.adk.tools.tool_context import ToolContext
 
 from db.connection import get_db_connection  # type: ignore
 from db import queries  # type: ignore
+from biome_coaching_agent.config import PIPELINE_VERSION  # type: ignore
 from biome_coaching_agent.logging_config import get_logger  # type: ignore
+from biome_coaching_agent.ingest import validate_extension, ingest_file  # type: ignore
+from biome_coaching_agent.storage import content_type, get_storage, store_video  # type: ignore
+from biome_coaching_agent.transcode import probe_video, start_proxy  # type: ignore
 from biome_coaching_agent.exceptions import (  # type: ignore
     ValidationError,
     DatabaseError,
+    StorageError,
 )
 
 # Initialize logger
 logger = get_logger(__name__)
 
-ALLOWED_EXTENSIONS = {".mp4", ".mov", ".avi", ".webm"}
-MAX_MB = 100
-
-
-def _ensure_uploads_dir() -> str:
-  """Ensure uploads directory exists."""
-  uploads_dir = os.path.join(os.getcwd(), "uploads")
-  os.makedirs(uploads_dir, exist_ok=True)
-  logger.debug(f"Uploads directory ensured: {uploads_dir}")
-  return uploads_dir
-
 
 def upload_video(
   video_file_path: str,
   exercise_name: str,
   user_id: Optional[str] = None,
+  enqueue: bool = False,
+  profile: Optional[str] = None,
   tool_context: ToolContext = None,
 ) -> dict:
   """
@@ -47,15 +46,23 @@ def upload_video(
     video_file_path: Absolute or relative path to the source video file.
     exercise_name: Name of the exercise (e.g., "Squat").
     user_id: Optional user id (None for demo mode).
+    enqueue: Leave the session 'queued' for a background worker instead of
+      marking it 'processing' for inline analysis.
+    profile: Profile the analysis run (trigger name, see profiling); recorded
+      with the session so a worker that claims it does the same.
     tool_context: ADK tool context (unused).
 
   Returns:
-    dict: {status, session_id, video_url, file_size_mb} or {status, error_type, message} on error
+    dict: {status, session_id, video_url, content_hash, file_size_mb, reused_session_id}
+      or {status, error_type, message} on error. `reused_session_id` is set
+      when the session was completed from an earlier identical analysis and
+      needs no further processing.
   """
   logger.info(
     f"Video upload initiated - exercise: {exercise_name}, "
     f"user_id: {user_id}, path: {video_file_path}"
   )
+  proxy_job = None
   
   try:
     # Validation: File exists
@@ -64,74 +71,83 @@ def upload_video(
       raise ValidationError(f"Video file not found: {video_file_path}")
 
     # Validation: File extension
-    ext = os.path.splitext(video_file_path)[1].lower()
-    if ext not in ALLOWED_EXTENSIONS:
-      logger.error(f"Unsupported file type: {ext}")
-      raise ValidationError(
-        f"Unsupported file type: {ext}. "
-        f"Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
-      )
+    validate_extension(video_file_path)
 
-    # Validation: File size
-    file_size_bytes = os.path.getsize(video_file_path)
-    file_size_mb = file_size_bytes / (1024 * 1024)
-    logger.debug(f"File size: {file_size_mb:.2f} MB")
-    
-    if file_size_bytes > MAX_MB * 1024 * 1024:
-      logger.error(f"File too large: {file_size_mb:.2f} MB (max: {MAX_MB} MB)")
-      raise ValidationError(
-        f"File exceeds {MAX_MB}MB limit (size: {file_size_mb:.2f} MB)"
-      )
-
-    # Copy file to uploads directory
-    uploads_dir = _ensure_uploads_dir()
-    session_id = str(uuid.uuid4())
-    dest_filename = f"{session_id}{ext}"
-    dest_path = os.path.join(uploads_dir, dest_filename)
-    
-    logger.info(f"Copying video to: {dest_path}")
+    # Store content (streamed once, hashed, size-limited). Files the API
+    # already streamed into the content store are used in place.
     try:
-      shutil.copy2(video_file_path, dest_path)
-      logger.info(f"Video copied successfully - session_id: {session_id}")
+      stored = ingest_file(video_file_path)
     except (IOError, OSError) as copy_err:
-      logger.error(f"Failed to copy video file: {copy_err}")
-      raise ValidationError(f"Failed to copy video file: {copy_err}")
+      logger.error(f"Failed to store video file: {copy_err}")
+      raise ValidationError(f"Failed to store video file: {copy_err}")
+
+    # Analysis proxy transcodes in the background while we publish, probe
+    # and write the session (no-op unless ANALYSIS_PROXY_ENABLED)
+    proxy_job = start_proxy(stored)
+
+    # Publish to the storage backend; the spooled file stays as local cache
+    dest_path, object_created = store_video(stored)
+    file_size_bytes = stored.size_bytes
+    file_size_mb = file_size_bytes / (1024 * 1024)
+    session_id = str(uuid.uuid4())
+    logger.info(
+      f"Video stored at {dest_path} ({file_size_mb:.2f} MB) - session_id: {session_id}"
+    )
 
     # Determine MIME type
-    mime_type = {
-      ".mp4": "video/mp4",
-      ".mov": "video/quicktime",
-      ".avi": "video/x-msvideo",
-      ".webm": "video/webm",
-    }.get(ext, "application/octet-stream")
+    mime_type = content_type(stored.path)
+    probe = probe_video(stored.path)
 
     # Create database record
     try:
       with get_db_connection() as conn:
+        ref_count = queries.acquire_video_object(
+          conn, stored.content_hash, dest_path, file_size_bytes
+        )
+        if probe and ref_count == 1:
+          queries.record_video_probe(conn, stored.content_hash, probe.fps or None)
         queries.create_analysis_session(
           conn=conn,
           session_id=session_id,
           user_id=user_id,
           exercise_name=exercise_name,
           video_url=dest_path,
-          duration=None,
+          duration=probe.duration if probe else None,
           file_size=file_size_bytes,
+          content_hash=stored.content_hash,
+          pipeline_version=PIPELINE_VERSION,
         )
-        queries.update_session_status(conn, session_id, "processing")
+        reused_session_id = None
+        if ref_count > 1:
+          reused_session_id = queries.find_reusable_session(
+            conn, stored.content_hash, exercise_name, PIPELINE_VERSION
+          )
+        if reused_session_id:
+          queries.link_session(conn, session_id, reused_session_id)
+        else:
+          if profile:
+            queries.request_profile(conn, session_id, profile)
+          queries.update_session_status(
+            conn, session_id, "queued" if enqueue else "processing"
+          )
         
       logger.info(
         f"Database record created - session_id: {session_id}, "
-        f"exercise: {exercise_name}, size: {file_size_mb:.2f} MB"
+        f"exercise: {exercise_name}, size: {file_size_mb:.2f} MB, references: {ref_count}"
+        + (f", reusing results of {reused_session_id}" if reused_session_id else "")
       )
     except Exception as db_err:
       logger.error(
         f"Database error during session creation: {db_err}",
         exc_info=True
       )
-      # Clean up uploaded file since DB failed
-      if os.path.exists(dest_path):
+      # Clean up uploaded file since DB failed (unless other sessions share it)
+      if stored.created or object_created:
         try:
-          os.remove(dest_path)
+          if object_created:
+            get_storage().delete(os.path.basename(stored.path))
+          if os.path.exists(stored.path):
+            os.remove(stored.path)
           logger.debug(f"Cleaned up orphaned file: {dest_path}")
         except Exception as cleanup_err:
           logger.warning(f"Failed to cleanup orphaned file: {cleanup_err}")
@@ -141,7 +157,9 @@ def upload_video(
       "status": "success",
       "session_id": session_id,
       "video_url": dest_path,
+      "content_hash": stored.content_hash,
       "file_size_mb": round(file_size_mb, 2),
+      "reused_session_id": reused_session_id,
     }
 
   except ValidationError as ve:
@@ -152,6 +170,10 @@ def upload_video(
     logger.error(f"Database error: {de}", exc_info=True)
     return {"status": "error", "error_type": "database", "message": str(de)}
   
+  except StorageError as se:
+    logger.error(f"Storage error: {se}", exc_info=True)
+    return {"status": "error", "error_type": "storage", "message": str(se)}
+  
   except Exception as e:
     logger.critical(f"Unexpected error during video upload: {e}", exc_info=True)
     return {
@@ -159,5 +181,10 @@ def upload_video(
       "error_type": "unknown",
       "message": f"Unexpected error: {str(e)}"
     }
+  
+  finally:
+    # The transcode records the proxy once the video_objects row exists
+    if proxy_job is not None:
+      proxy_job.registered.set()
 
 
@@ -0,0 +1,551 @@
+"""
+Lightweight request tracing for the API, pipeline and workers.
+
+A root span is opened per API request (or per pipeline run in a worker)
+and children nest through contextvars, so they follow awaits and
+run_in_threadpool without being passed around:
+
+  GET/POST request
+    upload_video
+    pipeline.run_analysis
+      pipeline.pose_extraction
+        extract.batch (one per TRACE_BATCH_FRAMES decoded frames)
+          decode / inference / angles
+      pipeline.analysis
+      pipeline.save_results
+    db <query function>  (every execute() on a pooled connection)
+
+Per-frame work is far too fine-grained for a span per frame: the extractor
+sums its timings per batch and the decode/inference/angles children carry
+those sums (laid end to end from the batch start, `aggregate=true`).
+
+Finished spans go to the exporter selected by TRACING_EXPORTER:
+  * "otlp": OTLP/HTTP JSON to OTEL_EXPORTER_OTLP_ENDPOINT (Jaeger, Tempo,
+    an OpenTelemetry Collector...);
+  * "file": one JSON object per line in TRACING_FILE_PATH;
+  * "memory": kept in the process, for tests (see configure());
+  * "none" (default): spans are not recorded at all.
+
+The bound session id and the current trace/span ids are added to log
+records (logging_config.ContextFilter), so structured logs and traces join
+on session_id and trace_id.
+"""
+import contextlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence
+
+from biome_coaching_agent.config import settings
+from biome_coaching_agent.logging_config import current_session_id, current_span, get_logger
+
+# Initialize logger
+logger = get_logger(__name__)
+
+TRACE_BATCH_FRAMES = 64
+EXPORT_BATCH_SIZE = 512
+MAX_QUEUED_SPANS = 8192
+STATEMENT_MAX_CHARS = 300
+
+
+@dataclass
+class Span:
+  name: str
+  trace_id: str
+  span_id: str
+  parent_id: Optional[str] = None
+  kind: str = "internal"  # "server" for request roots
+  start_ns: int = 0
+  end_ns: int = 0
+  attributes: Dict[str, Any] = field(default_factory=dict)
+  status: str = "unset"  # "ok" | "error" | "unset"
+  status_message: Optional[str] = None
+
+  recording = True
+
+  def set_attribute(self, key: str, value: Any) -> None:
+    self.attributes[key] = value
+
+  def set_error(self, err: BaseException) -> None:
+    self.status = "error"
+    self.status_message = f"{type(err).__name__}: {err}"
+
+  @property
+  def duration_seconds(self) -> float:
+    return (self.end_ns - self.start_ns) / 1e9
+
+  @property
+  def traceparent(self) -> str:
+    return f"00-{self.trace_id}-{self.span_id}-01"
+
+  def to_dict(self) -> Dict[str, Any]:
+    return {
+      "name": self.name,
+      "trace_id": self.trace_id,
+      "span_id": self.span_id,
+      "parent_id": self.parent_id,
+      "kind": self.kind,
+      "start_ns": self.start_ns,
+      "end_ns": self.end_ns,
+      "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+      "attributes": self.attributes,
+      "status": self.status,
+      "status_message": self.status_message,
+    }
+
+
+class _NoopSpan:
+  """Stands in for a span when nothing is recorded."""
+  recording = False
+  trace_id = span_id = None
+
+  def set_attribute(self, key: str, value: Any) -> None:
+    pass
+
+  def set_error(self, err: BaseException) -> None:
+    pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _new_id(nbytes: int) -> str:
+  return f"{random.getrandbits(nbytes * 8):0{nbytes * 2}x}"
+
+
+def parse_traceparent(header: Optional[str]):
+  """(trace_id, parent span_id) from a W3C traceparent header, or None."""
+  if not header:
+    return None
+  parts = header.strip().split("-")
+  if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+    return None
+  try:
+    int(parts[1], 16), int(parts[2], 16)
+  except ValueError:
+    return None
+  if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+    return None
+  return parts[1], parts[2]
+
+
+# ---------------------------------------------------------------------------
+# Exporters
+# ---------------------------------------------------------------------------
+
+class InMemoryExporter:
+  """Keeps finished spans in a list (tests)."""
+
+  def __init__(self):
+    self.spans: List[Span] = []
+    self._lock = threading.Lock()
+
+  def export(self, spans: Sequence[Span]) -> None:
+    with self._lock:
+      self.spans.extend(spans)
+
+  def clear(self) -> None:
+    with self._lock:
+      self.spans.clear()
+
+  def shutdown(self) -> None:
+    pass
+
+
+class FileExporter:
+  """Appends spans to a JSON-lines file."""
+
+  def __init__(self, path: str):
+    self.path = path
+    self._lock = threading.Lock()
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+
+  def export(self, spans: Sequence[Span]) -> None:
+    lines = "".join(json.dumps(s.to_dict(), default=str) + "\n" for s in spans)
+    with self._lock, open(self.path, "a", encoding="utf-8") as f:
+      f.write(lines)
+
+  def shutdown(self) -> None:
+    pass
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+  if isinstance(value, bool):
+    return {"boolValue": value}
+  if isinstance(value, int):
+    return {"intValue": str(value)}
+  if isinstance(value, float):
+    return {"doubleValue": value}
+  return {"stringValue": str(value)}
+
+
+_OTLP_KINDS = {"internal": 1, "server": 2, "client": 3}
+_OTLP_STATUS = {"unset": 0, "ok": 1, "error": 2}
+
+
+class OTLPHttpExporter:
+  """OTLP/HTTP with the JSON encoding (POST <endpoint>/v1/traces)."""
+
+  def __init__(self, endpoint: str, service_name: str, headers: Optional[Dict[str, str]] = None,
+               timeout: float = 10.0):
+    endpoint = endpoint.rstrip("/")
+    self.url = endpoint if endpoint.endswith("/v1/traces") else endpoint + "/v1/traces"
+    self.service_name = service_name
+    self.headers = {"Content-Type": "application/json", **(headers or {})}
+    self.timeout = timeout
+
+  def _payload(self, spans: Sequence[Span]) -> Dict[str, Any]:
+    return {"resourceSpans": [{
+      "resource": {"attributes": [
+        {"key": "service.name", "value": {"stringValue": self.service_name}},
+      ]},
+      "scopeSpans": [{
+        "scope": {"name": "biome_coaching_agent.tracing"},
+        "spans": [{
+          "traceId": s.trace_id,
+          "spanId": s.span_id,
+          "parentSpanId": s.parent_id or "",
+          "name": s.name,
+          "kind": _OTLP_KINDS.get(s.kind, 1),
+          "startTimeUnixNano": str(s.start_ns),
+          "endTimeUnixNano": str(s.end_ns),
+          "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+          "status": {"code": _OTLP_STATUS[s.status], "message": s.status_message or ""},
+        } for s in spans],
+      }],
+    }]}
+
+  def export(self, spans: Sequence[Span]) -> None:
+    body = json.dumps(self._payload(spans)).encode("utf-8")
+    request = urllib.request.Request(self.url, data=body, headers=self.headers, method="POST")
+    with urllib.request.urlopen(request, timeout=self.timeout) as response:
+      response.read()
+
+  def shutdown(self) -> None:
+    pass
+
+
+def _otlp_headers(raw: str) -> Dict[str, str]:
+  """OTEL_EXPORTER_OTLP_HEADERS: "key1=value1,key2=value2"."""
+  headers = {}
+  for item in raw.split(","):
+    key, sep, value = item.partition("=")
+    if sep and key.strip():
+      headers[key.strip()] = value.strip()
+  return headers
+
+
+class _BatchProcessor:
+  """Queues finished spans and exports them from a background thread."""
+
+  def __init__(self, exporter, interval: float):
+    self.exporter = exporter
+    self.interval = interval
+    self._queue: Deque[Span] = deque(maxlen=MAX_QUEUED_SPANS)  # Oldest dropped when full
+    self._wake = threading.Event()
+    self._stopped = threading.Event()
+    self._export_lock = threading.Lock()
+    self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+    self._thread.start()
+
+  def on_end(self, span: Span) -> None:
+    self._queue.append(span)
+    if len(self._queue) >= EXPORT_BATCH_SIZE:
+      self._wake.set()
+
+  def _run(self) -> None:
+    while not self._stopped.is_set():
+      self._wake.wait(self.interval)
+      self._wake.clear()
+      self.flush()
+
+  def flush(self) -> None:
+    with self._export_lock:
+      while self._queue:
+        batch = []
+        while self._queue and len(batch) < EXPORT_BATCH_SIZE:
+          batch.append(self._queue.popleft())
+        try:
+          self.exporter.export(batch)
+        except Exception as e:
+          logger.warning(f"Dropped {len(batch)} spans: export failed: {e}")
+
+  def shutdown(self) -> None:
+    self._stopped.set()
+    self._wake.set()
+    self._thread.join(timeout=5)
+    self.flush()
+    self.exporter.shutdown()
+
+
+_processor: Optional[_BatchProcessor] = None
+_configured = False
+_processor_lock = threading.Lock()
+
+
+def _exporter_from_settings():
+  name = settings.tracing_exporter
+  if name == "otlp":
+    return OTLPHttpExporter(
+      settings.otlp_endpoint,
+      settings.tracing_service_name,
+      headers=_otlp_headers(os.getenv("OTEL_EXPORTER_OTLP_HEADERS", "")),
+    )
+  if name == "file":
+    return FileExporter(settings.tracing_file_path)
+  if name == "memory":
+    return InMemoryExporter()
+  if name not in ("none", ""):
+    logger.warning(f"Unknown TRACING_EXPORTER {name!r}: tracing disabled")
+  return None
+
+
+def configure(exporter=None, interval: Optional[float] = None):
+  """
+  Replace the exporter (None disables tracing). Returns the exporter.
+
+  Without a call, the exporter is built from settings on first use.
+  """
+  global _processor, _configured
+  with _processor_lock:
+    if _processor is not None:
+      _processor.shutdown()
+    _processor = _BatchProcessor(
+      exporter, interval if interval is not None else settings.tracing_export_interval_seconds
+    ) if exporter is not None else None
+    _configured = True
+  return exporter
+
+
+def _get_processor() -> Optional[_BatchProcessor]:
+  global _processor, _configured
+  if not _configured:
+    with _processor_lock:
+      if not _configured:
+        exporter = _exporter_from_settings()
+        if exporter is not None:
+          logger.info(f"Tracing enabled - exporter: {type(exporter).__name__}")
+          _processor = _BatchProcessor(exporter, settings.tracing_export_interval_seconds)
+        _configured = True
+  return _processor
+
+
+def flush() -> None:
+  """Export queued spans now (tests, shutdown)."""
+  if _processor is not None:
+    _processor.flush()
+
+
+def shutdown() -> None:
+  global _processor
+  with _processor_lock:
+    if _processor is not None:
+      _processor.shutdown()
+      _processor = None
+
+
+# ---------------------------------------------------------------------------
+# Spans
+# ---------------------------------------------------------------------------
+
+def get_current_span():
+  """The active span, or NOOP_SPAN outside a recorded trace."""
+  return current_span.get() or NOOP_SPAN
+
+
+def is_recording() -> bool:
+  return current_span.get() is not None
+
+
+class _SpanScope:
+  """Context manager that makes a span current and ends it on exit."""
+  __slots__ = ("span", "_token", "_processor")
+
+  def __init__(self, span: Span, processor: _BatchProcessor):
+    self.span = span
+    self._processor = processor
+    self._token = None
+
+  def __enter__(self) -> Span:
+    self._token = current_span.set(self.span)
+    return self.span
+
+  def __exit__(self, exc_type, exc, tb) -> None:
+    span = self.span
+    span.end_ns = time.time_ns()
+    if exc is not None and span.status != "error":
+      span.set_error(exc)
+    current_span.reset(self._token)
+    self._processor.on_end(span)
+
+
+class _NoopScope:
+  __slots__ = ()
+
+  def __enter__(self):
+    return NOOP_SPAN
+
+  def __exit__(self, exc_type, exc, tb) -> None:
+    pass
+
+
+_NOOP_SCOPE = _NoopScope()
+
+
+def span(name: str, root: bool = False, traceparent: Optional[str] = None,
+         kind: str = "internal", **attributes: Any):
+  """
+  Open a span as a child of the current one.
+
+  Outside a trace this is a no-op unless `root` is set, in which case a new
+  trace starts (subject to TRACING_SAMPLE_RATIO); `traceparent` continues
+  an upstream W3C trace instead.
+
+  Usage:
+    with tracing.span("pipeline.analysis", exercise=name) as s:
+      s.set_attribute("issues", 3)
+  """
+  parent = current_span.get()
+  if parent is None:
+    if not root:
+      return _NOOP_SCOPE
+    processor = _get_processor()
+    if processor is None:
+      return _NOOP_SCOPE
+    upstream = parse_traceparent(traceparent)
+    if upstream is None and random.random() >= settings.tracing_sample_ratio:
+      return _NOOP_SCOPE
+    trace_id, parent_id = upstream or (_new_id(16), None)
+  else:
+    processor = _processor
+    if processor is None:  # Tracing was reconfigured mid-trace
+      return _NOOP_SCOPE
+    trace_id, parent_id = parent.trace_id, parent.span_id
+  new = Span(
+    name=name,
+    trace_id=trace_id,
+    span_id=_new_id(8),
+    parent_id=parent_id,
+    kind=kind,
+    start_ns=time.time_ns(),
+    attributes=attributes,
+  )
+  session_id = current_session_id.get()
+  if session_id and "session_id" not in attributes:
+    new.attributes["session_id"] = session_id
+  return _SpanScope(new, processor)
+
+
+def record_span(name: str, start_ns: int, end_ns: int, parent: Optional[Span] = None,
+                **attributes: Any) -> None:
+  """Record an already finished span under `parent` (default: the current span)."""
+  parent = parent or current_span.get()
+  if parent is None or _processor is None:
+    return
+  _processor.on_end(Span(
+    name=name,
+    trace_id=parent.trace_id,
+    span_id=_new_id(8),
+    parent_id=parent.span_id,
+    start_ns=start_ns,
+    end_ns=end_ns,
+    attributes=attributes,
+  ))
+
+
+@contextlib.contextmanager
+def bind_session(session_id: Optional[str]) -> Iterator[None]:
+  """Tag logs and spans in this context with `session_id`."""
+  token = current_session_id.set(session_id)
+  get_current_span().set_attribute("session_id", session_id)
+  try:
+    yield
+  finally:
+    current_session_id.reset(token)
+
+
+def set_session(session_id: Optional[str]) -> None:
+  """Like bind_session for the rest of the current context (e.g. a request task)."""
+  current_session_id.set(session_id)
+  get_current_span().set_attribute("session_id", session_id)
+
+
+class PhaseBatcher:
+  """
+  Rolls per-frame timings up into one span per batch of frames.
+
+  Holds references to the caller's per-phase duration lists (seconds,
+  one entry per frame that went through the phase) and, on each emit(),
+  records a `name` span since the previous emit with one aggregate child
+  per phase summing the new entries.
+  """
+
+  def __init__(self, name: str, phases: Dict[str, List[float]], parent: Span):
+    self.name = name
+    self.phases = phases
+    self.parent = parent
+    self._offsets = {phase: 0 for phase in phases}
+    self._start_ns = time.time_ns()
+    self._index = 0
+
+  def emit(self, frames: int) -> None:
+    end_ns = time.time_ns()
+    batch = Span(
+      name=self.name,
+      trace_id=self.parent.trace_id,
+      span_id=_new_id(8),
+      parent_id=self.parent.span_id,
+      start_ns=self._start_ns,
+      end_ns=end_ns,
+      attributes={"batch": self._index, "frames": frames},
+    )
+    cursor = self._start_ns
+    for phase, values in self.phases.items():
+      new = values[self._offsets[phase]:]
+      self._offsets[phase] = len(values)
+      total_ns = int(sum(new) * 1e9)
+      batch.attributes[f"{phase}_frames"] = len(new)
+      record_span(phase, cursor, cursor + total_ns, parent=batch, aggregate=True, frames=len(new))
+      cursor += total_ns
+    if _processor is not None:
+      _processor.on_end(batch)
+    self._start_ns = end_ns
+    self._index += 1
+
+
+def phase_batcher(name: str, phases: Dict[str, List[float]]) -> Optional[PhaseBatcher]:
+  """A PhaseBatcher under the current span, or None when not tracing."""
+  parent = current_span.get()
+  return PhaseBatcher(name, phases, parent) if parent is not None else None
+
+
+def query_span(statement: Any, module_prefix: str = "db."):
+  """
+  Span for one database execute(), named after the calling db.* function.
+
+  Called from the pools' cursors, so every query in db/queries.py and
+  db/async_queries.py is covered without touching them.
+  """
+  if current_span.get() is None:
+    return _NOOP_SCOPE
+  caller = "query"
+  frame = sys._getframe(2)
+  for _ in range(6):
+    if frame is None:
+      break
+    module = frame.f_globals.get("__name__", "")
+    if module.startswith(module_prefix) and module not in ("db.connection", "db.async_connection"):
+      caller = frame.f_code.co_name
+      break
+    frame = frame.f_back
+  if isinstance(statement, bytes):
+    statement = statement.decode("utf-8", "replace")
+  text = statement if isinstance(statement, str) else type(statement).__name__
+  return span(f"db {caller}", **{"db.system": "postgresql", "db.statement": text[:STATEMENT_MAX_CHARS]})
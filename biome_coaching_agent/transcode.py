@@ -0,0 +1,192 @@
+"""
+Analysis proxies for uploaded videos.
+
+Decode cost in the extractor depends heavily on the source (4K HEVC vs.
+720p H.264), while pose detection only needs a small image at the sampling
+rate. With ANALYSIS_PROXY_ENABLED, every new upload is transcoded once with
+ffmpeg into a normalized proxy: H.264, short side ANALYSIS_PROXY_HEIGHT
+pixels, POSE_DETECTION_FPS frames per second, rotation metadata applied.
+The original stays in storage for playback.
+
+The transcode starts right after ingest in a background thread and runs
+while the original is published, the source is probed and the session is
+written. Proxies are keyed by content hash like the originals and recorded
+on video_objects, so identical uploads share one. The extractor uses a
+proxy when one is recorded (waiting for a transcode still running in the
+same process) and maps proxy frames back to source frame numbers; without
+one it decodes the original as before.
+"""
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import cv2  # type: ignore
+
+from db.connection import get_db_connection  # type: ignore
+from db import queries  # type: ignore
+from biome_coaching_agent.config import settings
+from biome_coaching_agent.logging_config import get_logger
+from biome_coaching_agent.ingest import StoredVideo, uploads_dir
+from biome_coaching_agent.storage import get_storage
+
+# Initialize logger
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class VideoProbe:
+  """Stream properties read from the container header."""
+  fps: float
+  frame_count: int
+  width: int
+  height: int
+
+  @property
+  def duration(self) -> Optional[float]:
+    if self.fps <= 0 or self.frame_count <= 0:
+      return None
+    return self.frame_count / self.fps
+
+
+def probe_video(path: str) -> Optional[VideoProbe]:
+  """Read fps, frame count and size without decoding; None if unreadable."""
+  cap = cv2.VideoCapture(path)
+  try:
+    if not cap.isOpened():
+      return None
+    return VideoProbe(
+      fps=float(cap.get(cv2.CAP_PROP_FPS) or 0.0),
+      frame_count=int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0),
+      width=int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0),
+      height=int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0),
+    )
+  finally:
+    cap.release()
+
+
+def proxy_key(content_hash: str, height: Optional[int] = None, fps: Optional[int] = None) -> str:
+  """Storage key of the proxy for some content at the given size and rate."""
+  height = height or settings.analysis_proxy_height
+  fps = fps or settings.pose_detection_fps
+  return f"{content_hash}.p{height}f{fps}.mp4"
+
+
+def ffmpeg_command(src: str, dest: str, height: int, fps: int) -> List[str]:
+  # Short side scaled down to `height` (never up); ffmpeg applies rotation
+  # metadata before the filters (autorotate) and drops it from the output.
+  scale = (
+    f"scale='if(gt(iw,ih),-2,min({height},iw))':'if(gt(iw,ih),min({height},ih),-2)'"
+    ":flags=bilinear"
+  )
+  return [
+    settings.ffmpeg_binary, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+    "-i", src,
+    "-map", "0:v:0", "-an", "-sn", "-dn",
+    "-vf", f"fps={fps},{scale}",
+    "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-pix_fmt", "yuv420p",
+    "-g", str(fps * 2),
+    "-movflags", "+faststart",
+    "-f", "mp4", dest,
+  ]
+
+
+class ProxyJob(threading.Thread):
+  """Transcodes one upload, publishes the proxy and records it on video_objects."""
+
+  def __init__(self, stored: StoredVideo):
+    super().__init__(name=f"proxy-{stored.content_hash[:12]}", daemon=True)
+    self.stored = stored
+    self.height = settings.analysis_proxy_height
+    self.fps = settings.pose_detection_fps
+    self.key = proxy_key(stored.content_hash, self.height, self.fps)
+    self.proxy_url: Optional[str] = None
+    self.error: Optional[str] = None
+    # Set once the upload's video_objects row is committed (it is written
+    # while the transcode runs, and the proxy is recorded on it)
+    self.registered = threading.Event()
+
+  def run(self) -> None:
+    try:
+      self.proxy_url = self._transcode_and_publish()
+    except Exception as e:
+      self.error = str(e)
+      logger.warning(f"Proxy transcode failed for {self.stored.content_hash}: {e}")
+
+  def _transcode_and_publish(self) -> str:
+    dest = os.path.join(uploads_dir(), self.key)
+    if not os.path.isfile(dest):
+      tmp = os.path.join(uploads_dir(), f".proxy-{uuid.uuid4().hex}.mp4")
+      try:
+        completed = subprocess.run(
+          ffmpeg_command(self.stored.path, tmp, self.height, self.fps),
+          stdout=subprocess.DEVNULL,
+          stderr=subprocess.PIPE,
+          timeout=settings.analysis_proxy_timeout_seconds,
+        )
+        if completed.returncode != 0:
+          raise RuntimeError(completed.stderr.decode("utf-8", "replace").strip()[-500:] or "ffmpeg failed")
+        os.replace(tmp, dest)
+      finally:
+        if os.path.exists(tmp):
+          os.remove(tmp)
+      logger.info(
+        f"Proxy {self.key}: {os.path.getsize(dest)} bytes "
+        f"(source {self.stored.size_bytes} bytes)"
+      )
+
+    storage = get_storage()
+    storage.put_file(self.key, dest)
+    proxy_url = storage.uri(self.key)
+    self.registered.wait(settings.analysis_proxy_timeout_seconds)
+    with get_db_connection() as conn:
+      queries.set_video_proxy(conn, self.stored.content_hash, proxy_url, self.fps)
+    return proxy_url
+
+  def wait(self, timeout: Optional[float] = None) -> Optional[str]:
+    """Proxy URL once the job finished successfully, else None."""
+    self.join(timeout)
+    return self.proxy_url
+
+
+# Jobs of this process by content hash; finished ones stay until the next start
+_jobs: Dict[str, ProxyJob] = {}
+_jobs_lock = threading.Lock()
+
+
+def ffmpeg_available() -> bool:
+  return shutil.which(settings.ffmpeg_binary) is not None
+
+
+def start_proxy(stored: StoredVideo) -> Optional[ProxyJob]:
+  """Start (or join) the proxy transcode for an upload; None when disabled."""
+  if not settings.analysis_proxy_enabled:
+    return None
+  if not ffmpeg_available():
+    logger.warning(f"ANALYSIS_PROXY_ENABLED is set but '{settings.ffmpeg_binary}' was not found")
+    return None
+  with _jobs_lock:
+    for content_hash in [h for h, j in _jobs.items() if not j.is_alive()]:
+      del _jobs[content_hash]
+    job = _jobs.get(stored.content_hash)
+    if job is None:
+      job = ProxyJob(stored)
+      _jobs[stored.content_hash] = job
+      job.start()
+  return job
+
+
+def wait_for_proxy(content_hash: Optional[str], timeout: Optional[float] = None) -> Optional[str]:
+  """Wait for a transcode running in this process; None if there is none or it failed."""
+  if not content_hash:
+    return None
+  with _jobs_lock:
+    job = _jobs.get(content_hash)
+  if job is None:
+    return None
+  if job.is_alive():
+    logger.info(f"Waiting for proxy transcode of {content_hash}")
+  return job.wait(timeout if timeout is not None else settings.analysis_proxy_timeout_seconds)
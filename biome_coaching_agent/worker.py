@@ -0,0 +1,181 @@
+"""
+Standalone analysis worker for Biome Coaching Agent.
+
+Claims queued sessions from PostgreSQL (FOR UPDATE SKIP LOCKED) and runs the
+analysis pipeline against them, so MediaPipe work scales separately from the
+HTTP tier. Each claim carries a lease that a heartbeat thread keeps alive;
+if the worker dies, the lease expires and another worker picks the job up.
+
+Run with:
+  python -m biome_coaching_agent.worker [--once] [--worker-id NAME]
+
+Set METRICS_PORT to expose Prometheus metrics from the worker process.
+"""
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+from typing import Optional
+
+from db.connection import get_db_connection  # type: ignore
+from db import queries  # type: ignore
+from biome_coaching_agent.config import settings
+from biome_coaching_agent.logging_config import get_logger
+from biome_coaching_agent.pipeline import RETRYABLE_ERROR_TYPES, announce_failure, run_analysis
+from biome_coaching_agent import janitor, metrics, progress, tracing
+
+# Initialize logger
+logger = get_logger(__name__)
+
+class _LeaseHeartbeat(threading.Thread):
+  """Background thread that keeps a job lease alive while it is processed."""
+
+  def __init__(self, session_id: str, worker_id: str, lease_seconds: int):
+    super().__init__(name=f"heartbeat-{session_id}", daemon=True)
+    self.session_id = session_id
+    self.worker_id = worker_id
+    self.lease_seconds = lease_seconds
+    self.lost = threading.Event()
+    self._stop_event = threading.Event()
+
+  def run(self) -> None:
+    interval = max(self.lease_seconds / 3, 1)
+    while not self._stop_event.wait(interval):
+      try:
+        with get_db_connection() as conn:
+          held = queries.heartbeat_job(conn, self.session_id, self.worker_id, self.lease_seconds)
+      except Exception as e:
+        logger.warning(f"Heartbeat failed for session {self.session_id}: {e}")
+        continue
+      if not held:
+        logger.error(f"Lease lost for session {self.session_id}; another worker may retry it")
+        self.lost.set()
+        return
+
+  def stop(self) -> None:
+    self._stop_event.set()
+    self.join(timeout=5)
+
+
+class Worker:
+  """Polls the queue and processes one claimed session at a time."""
+
+  def __init__(
+    self,
+    worker_id: Optional[str] = None,
+    lease_seconds: int = settings.worker_lease_seconds,
+    poll_interval: float = settings.worker_poll_interval,
+    max_attempts: int = settings.worker_max_attempts,
+  ):
+    self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    self.lease_seconds = lease_seconds
+    self.poll_interval = poll_interval
+    self.max_attempts = max_attempts
+    self._stopping = threading.Event()
+
+  def stop(self, *_args) -> None:
+    """Finish the current job, then exit the loop."""
+    if not self._stopping.is_set():
+      logger.info(f"Worker {self.worker_id} stopping after current job")
+    self._stopping.set()
+
+  def run_once(self) -> bool:
+    """Claim and process a single job. Returns False if the queue was empty."""
+    with get_db_connection() as conn:
+      queries.fail_exhausted_jobs(conn, self.max_attempts)
+      job = queries.claim_next_job(conn, self.worker_id, self.lease_seconds, self.max_attempts)
+    if not job:
+      return False
+
+    session_id = job["session_id"]
+    heartbeat = _LeaseHeartbeat(session_id, self.worker_id, self.lease_seconds)
+    heartbeat.start()
+    start_time = time.time()
+    try:
+      # Failures are settled below: retryable ones go back to the queue
+      result = run_analysis(
+        session_id, job["exercise_name"],
+        profile=job.get("profile_trigger"), settle_failures=False, lease_owner=self.worker_id,
+      )
+    except Exception as e:
+      logger.critical(f"Unexpected error processing session {session_id}: {e}", exc_info=True)
+      result = {"status": "error", "step": "unknown", "error_type": "unknown", "message": str(e)}
+    finally:
+      heartbeat.stop()
+
+    if result.get("status") == "success":
+      # The completion is guarded by lease_owner, so success means the lease
+      # was still held when the results were committed (the heartbeat may
+      # report it lost afterwards, once completion cleared lease_owner)
+      logger.info(
+        f"Worker {self.worker_id} completed session {session_id} "
+        f"in {time.time() - start_time:.2f}s"
+      )
+      return True
+
+    error_msg = f"{result.get('step')}: {result.get('message')}"
+    if heartbeat.lost.is_set() or result.get("error_type") == "lease_lost":
+      # Someone else owns the job now; do not touch its status.
+      return True
+    step = result.get("step", "unknown")
+    error_type = result.get("error_type", "unknown")
+    if error_type in RETRYABLE_ERROR_TYPES and job["attempts"] < self.max_attempts:
+      with get_db_connection() as conn:
+        queries.requeue_job(conn, session_id, self.worker_id, error_msg)
+      # Not terminal: event stream clients keep waiting for the next attempt
+      progress.publish(session_id, "retrying", {
+        "step": step,
+        "error_type": error_type,
+        "message": result.get("message"),
+        "attempt": job["attempts"],
+        "max_attempts": self.max_attempts,
+      })
+    else:
+      with get_db_connection() as conn:
+        failed = queries.fail_job(conn, session_id, self.worker_id, error_msg)
+      if failed:
+        announce_failure(session_id, step, error_type, result.get("message"))
+    return True
+
+  def run_forever(self) -> None:
+    """Process jobs until stopped, sleeping between empty polls."""
+    logger.info(
+      f"Worker {self.worker_id} started (lease: {self.lease_seconds}s, "
+      f"poll: {self.poll_interval}s, max attempts: {self.max_attempts})"
+    )
+    while not self._stopping.is_set():
+      try:
+        processed = self.run_once()
+      except Exception as e:
+        logger.error(f"Worker {self.worker_id} poll failed: {e}", exc_info=True)
+        processed = False
+      if not processed:
+        self._stopping.wait(self.poll_interval)
+    logger.info(f"Worker {self.worker_id} stopped")
+
+
+def main(argv: Optional[list] = None) -> None:
+  parser = argparse.ArgumentParser(description="Biome analysis queue worker")
+  parser.add_argument("--once", action="store_true", help="Process at most one job and exit")
+  parser.add_argument("--worker-id", default=None, help="Lease owner name (default: host:pid)")
+  args = parser.parse_args(argv)
+
+  worker = Worker(worker_id=args.worker_id)
+  signal.signal(signal.SIGTERM, worker.stop)
+  signal.signal(signal.SIGINT, worker.stop)
+
+  try:
+    if args.once:
+      worker.run_once()
+    else:
+      janitor.start_background()
+      metrics.start_http_server(settings.metrics_port)
+      worker.run_forever()
+  finally:
+    tracing.shutdown()  # Export the spans still queued
+
+
+if __name__ == "__main__":
+  main()
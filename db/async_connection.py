@@ -0,0 +1,118 @@
+"""
+Async database connection utilities for the FastAPI endpoints.
+
+Mirrors `db.connection` with a `psycopg_pool.AsyncConnectionPool` so request
+handlers await database round trips instead of blocking the event loop.
+Tools and workers keep using the synchronous pool. Both pools share the
+DATABASE_URL and DB_POOL_* settings.
+"""
+import asyncio
+import contextlib
+import weakref
+from typing import AsyncIterator, Dict, Optional
+
+import psycopg
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+
+from db.connection import _cursor_kwargs, _get_connection_string, _pool_config
+
+# Import logger - avoid circular import by importing locally if needed
+try:
+  from biome_coaching_agent.logging_config import get_logger
+  logger = get_logger(__name__)
+except ImportError:
+  # Fallback to basic logging if biome_coaching_agent not available
+  import logging
+  logger = logging.getLogger(__name__)
+
+_async_pool: Optional[AsyncConnectionPool] = None
+_async_pool_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = (
+  weakref.WeakKeyDictionary()
+)
+
+
+def _async_pool_lock() -> asyncio.Lock:
+  """The pool lock of the running event loop (an asyncio.Lock is bound to one loop)."""
+  loop = asyncio.get_running_loop()
+  lock = _async_pool_locks.get(loop)
+  if lock is None:
+    lock = _async_pool_locks[loop] = asyncio.Lock()
+  return lock
+
+
+async def open_async_pool() -> AsyncConnectionPool:
+  """Open the async pool (idempotent). Call from the app's startup hook."""
+  global _async_pool
+  if _async_pool is None:
+    # Concurrent first callers wait here instead of each opening a pool
+    async with _async_pool_lock():
+      if _async_pool is None:
+        config = _pool_config()
+        logger.info(
+          f"Opening async database pool (min: {config['min_size']}, max: {config['max_size']}, "
+          f"timeout: {config['timeout']}s)"
+        )
+        pool = AsyncConnectionPool(
+          _get_connection_string(),
+          name="biome-async",
+          kwargs=_cursor_kwargs("async"),
+          check=AsyncConnectionPool.check_connection,
+          open=False,
+          **config,
+        )
+        await pool.open()
+        _async_pool = pool
+  return _async_pool
+
+
+async def close_async_pool() -> None:
+  """Close the async pool (e.g. on application shutdown)."""
+  global _async_pool
+  async with _async_pool_lock():
+    if _async_pool is not None:
+      pool, _async_pool = _async_pool, None
+      await pool.close()
+      logger.info("Async database pool closed")
+
+
+def get_async_pool_stats() -> Dict[str, int]:
+  """Current async pool counters for monitoring."""
+  if _async_pool is None:
+    return {}
+  return dict(_async_pool.get_stats())
+
+
+@contextlib.asynccontextmanager
+async def get_async_db_connection() -> AsyncIterator[psycopg.AsyncConnection]:
+  """
+  Yield an async PostgreSQL connection and ensure proper cleanup.
+
+  Same commit/rollback semantics as `db.connection.get_db_connection`.
+
+  Yields:
+    psycopg.AsyncConnection: Database connection
+
+  Raises:
+    psycopg.Error: Database connection or operation failed
+    psycopg_pool.PoolTimeout: No connection became free within DB_POOL_TIMEOUT
+  """
+  pool = await open_async_pool()
+
+  try:
+    conn = await pool.getconn()
+  except PoolTimeout as timeout_err:
+    logger.error(f"Timed out waiting for an async database connection: {timeout_err}")
+    raise
+  except psycopg.Error as conn_err:
+    logger.error(f"Failed to connect to database: {conn_err}", exc_info=True)
+    raise
+
+  try:
+    yield conn
+    await conn.commit()
+  except Exception as e:
+    await conn.rollback()
+    logger.warning(f"Async database transaction rolled back due to error: {e}")
+    raise
+  finally:
+    await pool.putconn(conn)
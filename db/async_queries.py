@@ -0,0 +1,240 @@
+"""
+Async read queries for the API endpoints.
+
+Async counterparts of the read helpers in `db.queries`, used by the FastAPI
+handlers through `db.async_connection`. Writes stay in `db.queries` (tools
+and workers run them on the synchronous pool).
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg
+
+from db.queries import RESULT_DOCUMENT_SQL
+
+
+async def ping(conn: psycopg.AsyncConnection) -> bool:
+  """Simple connectivity check."""
+  cur = await conn.execute("SELECT 1;")
+  row = await cur.fetchone()
+  return bool(row and row[0] == 1)
+
+
+async def get_session_summary(
+  conn: psycopg.AsyncConnection,
+  session_id: str,
+) -> Optional[Dict[str, Any]]:
+  """Get the client-facing fields of an analysis session."""
+  cur = await conn.execute(
+    (
+      "SELECT id, user_id, exercise_name, video_url, status, created_at, error_message, "
+      "linked_session_id "
+      "FROM analysis_sessions WHERE id = %s"
+    ),
+    (session_id,),
+  )
+  row = await cur.fetchone()
+  if not row:
+    return None
+  return {
+    "session_id": str(row[0]),
+    "user_id": str(row[1]) if row[1] else None,
+    "exercise_name": row[2],
+    "video_url": row[3],
+    "status": row[4],
+    "created_at": row[5].isoformat() if row[5] else None,
+    "error_message": row[6],
+    "linked_session_id": str(row[7]) if row[7] else None,
+  }
+
+
+async def get_session_video(
+  conn: psycopg.AsyncConnection,
+  session_id: str,
+) -> Optional[Dict[str, Any]]:
+  """Get the stored video reference (video_url, content_hash) of a session."""
+  cur = await conn.execute(
+    "SELECT video_url, content_hash FROM analysis_sessions WHERE id = %s",
+    (session_id,),
+  )
+  row = await cur.fetchone()
+  if not row:
+    return None
+  return {"video_url": row[0], "content_hash": row[1]}
+
+
+async def get_session_status(
+  conn: psycopg.AsyncConnection,
+  session_id: str,
+) -> Optional[Dict[str, Any]]:
+  """Get just the status and error message of a session."""
+  cur = await conn.execute(
+    "SELECT status, error_message FROM analysis_sessions WHERE id = %s",
+    (session_id,),
+  )
+  row = await cur.fetchone()
+  if not row:
+    return None
+  return {"status": row[0], "error_message": row[1]}
+
+
+async def get_analysis_result_json(
+  conn: psycopg.AsyncConnection,
+  session_id: str,
+) -> Optional[str]:
+  """Get the complete result document for a session as JSON text (see RESULT_DOCUMENT_SQL)."""
+  cur = await conn.execute(RESULT_DOCUMENT_SQL, {"session_id": session_id})
+  row = await cur.fetchone()
+  return row[0] if row else None
+
+
+async def get_user_progress(
+  conn: psycopg.AsyncConnection,
+  user_id: str,
+  exercise_name: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+  """Aggregate progress rows for a user (one per exercise)."""
+  sql = (
+    "SELECT exercise_name, total_analyses, average_score, ewma_score, improvement_trend, "
+    "last_analysis_date FROM user_progress WHERE user_id = %s"
+  )
+  params: List[Any] = [user_id]
+  if exercise_name:
+    sql += " AND exercise_name = %s"
+    params.append(exercise_name)
+  cur = await conn.execute(sql + " ORDER BY last_analysis_date DESC", params)
+  return [
+    {
+      "exercise_name": row[0],
+      "total_analyses": row[1],
+      "average_score": float(row[2]) if row[2] is not None else None,
+      "recent_score": float(row[3]) if row[3] is not None else None,
+      "improvement_trend": row[4],
+      "last_analysis_date": row[5].isoformat() if row[5] else None,
+    }
+    for row in await cur.fetchall()
+  ]
+
+
+async def list_sessions(
+  conn: psycopg.AsyncConnection,
+  limit: int,
+  after: Optional[Tuple[datetime, str]] = None,
+  user_id: Optional[str] = None,
+  exercise_name: Optional[str] = None,
+  status: Optional[str] = None,
+  created_from: Optional[datetime] = None,
+  created_to: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+  """
+  A page of sessions, newest first, with each session's score.
+  
+  Keyset-paginated on (created_at, id): pass the last row's key as `after`
+  for the next page. Every filter combination has a composite index ending
+  in (created_at DESC, id DESC) (see schema.sql), so a page is one short
+  index range scan however deep the client pages.
+  """
+  conditions: List[str] = []
+  params: List[Any] = []
+  if user_id:
+    conditions.append("s.user_id = %s")
+    params.append(user_id)
+  if exercise_name:
+    conditions.append("s.exercise_name = %s")
+    params.append(exercise_name)
+  if status:
+    conditions.append("s.status = %s")
+    params.append(status)
+  if created_from:
+    conditions.append("s.created_at >= %s")
+    params.append(created_from)
+  if created_to:
+    conditions.append("s.created_at < %s")
+    params.append(created_to)
+  if after:
+    conditions.append("(s.created_at, s.id) < (%s, %s)")
+    params.extend(after)
+  
+  sql = (
+    "SELECT s.id, s.user_id, s.exercise_name, s.status, s.created_at, s.completed_at, "
+    "r.overall_score "
+    "FROM analysis_sessions s "
+    "LEFT JOIN LATERAL ("
+    "SELECT overall_score FROM analysis_results "
+    "WHERE session_id = COALESCE(s.linked_session_id, s.id) "
+    "ORDER BY created_at DESC LIMIT 1"
+    ") r ON TRUE"
+  )
+  if conditions:
+    sql += " WHERE " + " AND ".join(conditions)
+  sql += " ORDER BY s.created_at DESC, s.id DESC LIMIT %s"
+  params.append(limit)
+  
+  cur = await conn.execute(sql, params)
+  return [
+    {
+      "session_id": str(row[0]),
+      "user_id": str(row[1]) if row[1] else None,
+      "exercise_name": row[2],
+      "status": row[3],
+      "created_at": row[4],
+      "completed_at": row[5].isoformat() if row[5] else None,
+      "overall_score": float(row[6]) if row[6] is not None else None,
+    }
+    for row in await cur.fetchall()
+  ]
+
+
+async def list_session_profiles(
+  conn: psycopg.AsyncConnection,
+  limit: int,
+) -> List[Dict[str, Any]]:
+  """Newest stored profiles (summaries only)."""
+  cur = await conn.execute(
+    (
+      "SELECT session_id, trigger, wall_seconds, cpu_seconds, sample_count, "
+      "peak_traced_bytes, created_at FROM session_profiles "
+      "ORDER BY created_at DESC LIMIT %s"
+    ),
+    (limit,),
+  )
+  return [
+    {
+      "session_id": str(row[0]),
+      "trigger": row[1],
+      "wall_seconds": row[2],
+      "cpu_seconds": row[3],
+      "sample_count": row[4],
+      "peak_traced_bytes": row[5],
+      "created_at": row[6].isoformat() if row[6] else None,
+    }
+    for row in await cur.fetchall()
+  ]
+
+
+async def get_session_profile(
+  conn: psycopg.AsyncConnection,
+  session_id: str,
+) -> Optional[Dict[str, Any]]:
+  """Stored profile report of a session (without the folded stacks), or None."""
+  cur = await conn.execute(
+    "SELECT report, created_at FROM session_profiles WHERE session_id = %s",
+    (session_id,),
+  )
+  row = await cur.fetchone()
+  if not row:
+    return None
+  return {**row[0], "created_at": row[1].isoformat() if row[1] else None}
+
+
+async def get_session_profile_stacks(
+  conn: psycopg.AsyncConnection,
+  session_id: str,
+) -> Optional[str]:
+  """Folded stacks of a session's profile (flamegraph.pl / speedscope input), or None."""
+  cur = await conn.execute(
+    "SELECT folded_stacks FROM session_profiles WHERE session_id = %s",
+    (session_id,),
+  )
+  row = await cur.fetchone()
+  return row[0] if row else None
@@ -0,0 +1,451 @@
+"""
+Partition maintenance and data retention for the analysis tables.
+
+After db/migrations/0001_partition_analysis_tables.sql the analysis tables
+are range-partitioned by month of created_at (`<table>_pYYYYMM`, plus a
+`<table>_default` catch-all). Run this module from cron or a scheduler:
+
+  python -m db.maintenance partitions          # create upcoming months
+  python -m db.maintenance retention --dry-run # show what would be archived
+  python -m db.maintenance retention           # archive + drop old months
+  python -m db.maintenance all
+
+Retention exports each expired partition to `<ARCHIVE_DIR>/<partition>.csv.gz`
+with COPY, then detaches and drops it. Dropping a partition is a metadata
+operation, so cleanup costs the same no matter how many rows it held.
+Deduplicated sessions that outlive the session they link to get their own
+copy of its results first (see materialize_linked_results), dropped
+sessions release their references to stored videos (video_objects), and
+results stored in a later month than their session are archived to
+`<table>_orphans_<timestamp>.csv.gz` and deleted once the session is gone.
+Defaults come from PARTITION_MONTHS_AHEAD, DATA_RETENTION_MONTHS and
+ARCHIVE_DIR (biome_coaching_agent.config).
+
+On databases that have not been migrated every command is a no-op.
+"""
+import argparse
+import gzip
+import os
+import re
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg
+from psycopg import sql
+
+from db.connection import get_db_connection
+from db import queries
+
+# Import logger - avoid circular import by importing locally if needed
+try:
+  from biome_coaching_agent.logging_config import get_logger
+  logger = get_logger(__name__)
+except ImportError:
+  # Fallback to basic logging if biome_coaching_agent not available
+  import logging
+  logger = logging.getLogger(__name__)
+
+# Children before parents, so retention never leaves child rows whose result
+# month was already dropped
+PARTITIONED_TABLES = (
+  "form_issues",
+  "metrics",
+  "strengths",
+  "recommendations",
+  "analysis_results",
+  "analysis_sessions",
+)
+
+# Unpartitioned per-session tables purged by created_at alongside retention
+PURGED_TABLES = ("pose_series", "session_profiles")
+
+# Columns copied with a result when a linked session inherits it
+_RESULT_COLUMNS = ("overall_score", "total_frames", "processing_time", "rules_version")
+_RESULT_CHILD_COLUMNS = {
+  "form_issues": (
+    "issue_type", "severity", "frame_start", "frame_end", "coaching_cue", "confidence_score",
+  ),
+  "metrics": ("metric_name", "actual_value", "target_value", "status"),
+  "strengths": ("strength_text",),
+  "recommendations": ("recommendation_text", "priority"),
+}
+
+# Sessions created from `cutoff` on that link to a session created in [month, upper)
+_SURVIVING_LINKS = (
+  "FROM analysis_sessions l JOIN analysis_sessions o ON o.id = l.linked_session_id "
+  "WHERE o.created_at >= %s AND o.created_at < %s AND l.created_at >= %s "
+)
+
+_PARTITION_SUFFIX = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def _month_start(day: date) -> date:
+  return date(day.year, day.month, 1)
+
+
+def _add_months(month: date, months: int) -> date:
+  index = month.year * 12 + (month.month - 1) + months
+  return date(index // 12, index % 12 + 1, 1)
+
+
+def _exists(conn: psycopg.Connection, relation: str) -> bool:
+  row = conn.execute("SELECT to_regclass(%s)", (relation,)).fetchone()
+  return row[0] is not None
+
+
+def partitioned_tables(conn: psycopg.Connection) -> List[str]:
+  """The analysis tables that are actually partitioned in this database."""
+  rows = conn.execute(
+    "SELECT c.relname FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+    "WHERE c.relname = ANY(%s)",
+    (list(PARTITIONED_TABLES),),
+  ).fetchall()
+  present = {row[0] for row in rows}
+  return [table for table in PARTITIONED_TABLES if table in present]
+
+
+def list_partitions(conn: psycopg.Connection, table: str) -> List[Tuple[str, date]]:
+  """Monthly partitions of a table as (name, first day of month), oldest first."""
+  rows = conn.execute(
+    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+    "WHERE i.inhparent = %s::regclass",
+    (table,),
+  ).fetchall()
+  partitions = []
+  for (name,) in rows:
+    match = _PARTITION_SUFFIX.search(name)
+    if match:
+      partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+  return sorted(partitions, key=lambda item: item[1])
+
+
+def create_month_partition(conn: psycopg.Connection, table: str, month: date) -> Optional[str]:
+  """
+  Create the partition for `month` if missing; returns its name when created.
+
+  Rows for that month that already landed in the default partition are
+  moved into the new partition before it is attached.
+  """
+  name = f"{table}_p{month:%Y%m}"
+  if _exists(conn, name):
+    return None
+  upper = _add_months(month, 1)
+  conn.execute(
+    sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)").format(
+      sql.Identifier(name), sql.Identifier(table)
+    )
+  )
+  default = f"{table}_default"
+  if _exists(conn, default):
+    moved = conn.execute(
+      sql.SQL(
+        "WITH moved AS (DELETE FROM {} WHERE created_at >= %s AND created_at < %s RETURNING *) "
+        "INSERT INTO {} SELECT * FROM moved"
+      ).format(sql.Identifier(default), sql.Identifier(name)),
+      (month, upper),
+    ).rowcount
+    if moved:
+      logger.warning(f"Moved {moved} rows from {default} into {name}")
+  # DDL takes no bind parameters; bounds are rendered as literals
+  conn.execute(
+    sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM ({}) TO ({})").format(
+      sql.Identifier(table), sql.Identifier(name), sql.Literal(month), sql.Literal(upper)
+    )
+  )
+  logger.info(f"Created partition {name}")
+  return name
+
+
+def ensure_partitions(months_ahead: int = 3, today: Optional[date] = None) -> List[str]:
+  """Create partitions from the current month through `months_ahead` months ahead."""
+  current = _month_start(today or date.today())
+  created = []
+  with get_db_connection() as conn:
+    for table in partitioned_tables(conn):
+      for offset in range(months_ahead + 1):
+        name = create_month_partition(conn, table, _add_months(current, offset))
+        if name:
+          created.append(name)
+  return created
+
+
+def _export(
+  conn: psycopg.Connection,
+  source: sql.Composable,
+  archive_dir: Path,
+  name: str,
+  keep_empty: bool = True,
+) -> Tuple[Optional[Path], int]:
+  """COPY a table or query to `<archive_dir>/<name>.csv.gz`; returns (path, rows)."""
+  archive_dir.mkdir(parents=True, exist_ok=True)
+  path = archive_dir / f"{name}.csv.gz"
+  temp_path = archive_dir / f".{name}.csv.gz.part"
+  cur = conn.cursor()
+  with open(temp_path, "wb") as raw:
+    with gzip.GzipFile(filename=f"{name}.csv", mode="wb", fileobj=raw) as gz:
+      copy_sql = sql.SQL("COPY {} TO STDOUT WITH (FORMAT csv, HEADER)").format(source)
+      with cur.copy(copy_sql) as copy:
+        for chunk in copy:
+          gz.write(chunk)
+    raw.flush()
+    os.fsync(raw.fileno())
+  if not cur.rowcount and not keep_empty:
+    temp_path.unlink()
+    return None, 0
+  # Only a complete, durable archive gets the final name
+  os.replace(temp_path, path)
+  return path, cur.rowcount
+
+
+def archive_partition(conn: psycopg.Connection, partition: str, archive_dir: Path) -> Tuple[Path, int]:
+  """Export a partition to `<archive_dir>/<partition>.csv.gz`; returns (path, rows)."""
+  return _export(conn, sql.Identifier(partition), archive_dir, partition)
+
+
+def purge_orphaned_results(conn: psycopg.Connection, archive_dir: Path, stamp: str) -> Dict[str, int]:
+  """
+  Archive and delete results and result rows whose session no longer exists.
+
+  Partitions are dropped on each table's own created_at, so a result
+  written in a later month than its session (a late completion, every
+  re-score) outlives the session's partition. Such rows are exported to
+  `<archive_dir>/<table>_orphans_<stamp>.csv.gz` and deleted, child rows
+  first. Returns the rows removed per table.
+  """
+  orphaned = {
+    "analysis_results": sql.SQL(
+      "NOT EXISTS (SELECT 1 FROM analysis_sessions s WHERE s.id = t.session_id)"
+    ),
+  }
+  for table in _RESULT_CHILD_COLUMNS:
+    orphaned[table] = sql.SQL(
+      "NOT EXISTS (SELECT 1 FROM analysis_results r JOIN analysis_sessions s ON s.id = r.session_id "
+      "WHERE r.id = t.result_id)"
+    )
+  removed = {}
+  for table in list(_RESULT_CHILD_COLUMNS) + ["analysis_results"]:
+    condition = orphaned[table]
+    query = sql.SQL("(SELECT * FROM {} t WHERE {})").format(sql.Identifier(table), condition)
+    path, rows = _export(conn, query, archive_dir, f"{table}_orphans_{stamp}", keep_empty=False)
+    if not rows:
+      continue
+    deleted = conn.execute(
+      sql.SQL("DELETE FROM {} t WHERE {}").format(sql.Identifier(table), condition)
+    ).rowcount
+    logger.info(f"Archived {rows} orphaned rows of {table} to {path}, deleted {deleted}")
+    removed[table] = deleted
+  return removed
+
+
+def _copy_rows(
+  conn: psycopg.Connection,
+  table: str,
+  columns: Tuple[str, ...],
+  key: str,
+  old_key: Any,
+  new_key: Any,
+  created_at: Any,
+) -> None:
+  column_list = sql.SQL(", ").join(map(sql.Identifier, columns))
+  conn.execute(
+    sql.SQL("INSERT INTO {} ({}, {}, created_at) SELECT %s, {}, %s FROM {} WHERE {} = %s").format(
+      sql.Identifier(table), sql.Identifier(key), column_list, column_list,
+      sql.Identifier(table), sql.Identifier(key),
+    ),
+    (new_key, created_at, old_key),
+  )
+
+
+def count_linked_survivors(conn: psycopg.Connection, month: date, cutoff: date) -> int:
+  """Sessions kept by retention that link to a session created in `month`."""
+  row = conn.execute("SELECT count(*) " + _SURVIVING_LINKS, (month, _add_months(month, 1), cutoff)).fetchone()
+  return row[0]
+
+
+def materialize_linked_results(conn: psycopg.Connection, month: date, cutoff: date) -> int:
+  """
+  Detach sessions kept by retention from linked sessions created in `month`.
+
+  A deduplicated session has no results of its own; it reads those of the
+  session it links to. For each linked session about to be dropped, the
+  oldest survivor inherits a copy of its latest result (stamped with the
+  survivor's created_at, so they expire together) and its pose series,
+  and the other survivors are re-pointed at it. Returns the sessions
+  updated.
+  """
+  pairs = conn.execute(
+    "SELECT DISTINCT ON (l.linked_session_id) l.linked_session_id, l.id, l.created_at "
+    + _SURVIVING_LINKS
+    + "ORDER BY l.linked_session_id, l.created_at, l.id",
+    (month, _add_months(month, 1), cutoff),
+  ).fetchall()
+  updated = 0
+  for original_id, heir_id, heir_created_at in pairs:
+    result = conn.execute(
+      "SELECT id FROM analysis_results WHERE session_id = %s ORDER BY created_at DESC LIMIT 1",
+      (original_id,),
+    ).fetchone()
+    if result:
+      column_list = sql.SQL(", ").join(map(sql.Identifier, _RESULT_COLUMNS))
+      new_result_id = conn.execute(
+        sql.SQL(
+          "INSERT INTO analysis_results (session_id, {}, created_at) "
+          "SELECT %s, {}, %s FROM analysis_results WHERE id = %s RETURNING id"
+        ).format(column_list, column_list),
+        (heir_id, heir_created_at, result[0]),
+      ).fetchone()[0]
+      for table, columns in _RESULT_CHILD_COLUMNS.items():
+        _copy_rows(conn, table, columns, "result_id", result[0], new_result_id, heir_created_at)
+    conn.execute(
+      (
+        "UPDATE pose_series SET session_id = %s, created_at = %s WHERE session_id = %s "
+        "AND NOT EXISTS (SELECT 1 FROM pose_series WHERE session_id = %s)"
+      ),
+      (heir_id, heir_created_at, original_id, heir_id),
+    )
+    updated += conn.execute(
+      (
+        "UPDATE analysis_sessions "
+        "SET linked_session_id = CASE WHEN id = %s THEN NULL ELSE %s::uuid END "
+        "WHERE linked_session_id = %s AND created_at >= %s"
+      ),
+      (heir_id, heir_id, original_id, cutoff),
+    ).rowcount
+  if updated:
+    logger.info(f"Gave {updated} sessions linked to {month:%Y-%m} analyses their own results")
+  return updated
+
+
+def release_partition_videos(conn: psycopg.Connection, partition: str) -> int:
+  """Drop the video_objects references held by the sessions in a partition."""
+  rows = conn.execute(
+    sql.SQL(
+      "SELECT content_hash, count(*) FROM {} WHERE content_hash IS NOT NULL GROUP BY content_hash"
+    ).format(sql.Identifier(partition))
+  ).fetchall()
+  remaining = queries.release_video_objects(conn, {row[0]: row[1] for row in rows})
+  return len(remaining)
+
+
+def apply_retention(
+  retention_months: int,
+  archive_dir: Path,
+  dry_run: bool = False,
+  today: Optional[date] = None,
+) -> List[Dict[str, Any]]:
+  """
+  Archive, detach and drop partitions for months older than the retention window.
+
+  Months are handled oldest first. Sessions that survive but link to a
+  session of an expiring month are detached from it before anything of
+  that month is dropped; then each partition is dropped in its own
+  transaction, after its archive file is safely on disk, so an
+  interrupted run can simply be repeated. Results that outlived their
+  session's partition are archived and deleted last
+  (purge_orphaned_results).
+  """
+  cutoff = _add_months(_month_start(today or date.today()), -retention_months)
+  with get_db_connection() as conn:
+    tables = partitioned_tables(conn)
+    expired = sorted(
+      (
+        (month, PARTITIONED_TABLES.index(table), table, name)
+        for table in tables
+        for name, month in list_partitions(conn, table)
+        if month < cutoff
+      ),
+      key=lambda item: item[:2],
+    )
+
+  report = []
+  detached: Dict[date, int] = {}
+  for month, _, table, name in expired:
+    if month not in detached and "analysis_sessions" in tables:
+      with get_db_connection() as conn:
+        if dry_run:
+          detached[month] = count_linked_survivors(conn, month, cutoff)
+        else:
+          detached[month] = materialize_linked_results(conn, month, cutoff)
+    entry: Dict[str, Any] = {"table": table, "partition": name, "month": month.isoformat()}
+    if table == "analysis_sessions":
+      entry["linked_sessions"] = detached.get(month, 0)
+    if dry_run:
+      report.append(entry)
+      continue
+    with get_db_connection() as conn:
+      path, rows = archive_partition(conn, name, archive_dir)
+      if table == "analysis_sessions":
+        release_partition_videos(conn, name)
+      conn.execute(
+        sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(sql.Identifier(table), sql.Identifier(name))
+      )
+      conn.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+    entry.update(archive=str(path), rows=rows, archive_bytes=path.stat().st_size)
+    logger.info(f"Archived {rows} rows of {name} to {path} and dropped the partition")
+    report.append(entry)
+
+  if "analysis_sessions" in tables and not dry_run:
+    with get_db_connection() as conn:
+      stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+      for table, deleted in purge_orphaned_results(conn, archive_dir, stamp).items():
+        report.append({"table": table, "orphans": deleted})
+
+  if tables and not dry_run:
+    with get_db_connection() as conn:
+      for table in PURGED_TABLES:
+        if _exists(conn, table):
+          deleted = conn.execute(
+            sql.SQL("DELETE FROM {} WHERE created_at < %s").format(sql.Identifier(table)),
+            (cutoff,),
+          ).rowcount
+          if deleted:
+            logger.info(f"Purged {deleted} rows from {table} older than {cutoff}")
+  return report
+
+
+def main() -> None:
+  from biome_coaching_agent.config import settings
+
+  parser = argparse.ArgumentParser(description="Partition maintenance for the analysis tables")
+  parser.add_argument("command", choices=["partitions", "retention", "all"])
+  parser.add_argument(
+    "--months-ahead", type=int, default=settings.partition_months_ahead,
+    help="Months of partitions to create ahead of the current one",
+  )
+  parser.add_argument(
+    "--retention-months", type=int, default=settings.data_retention_months,
+    help="Keep this many whole months before the current one",
+  )
+  parser.add_argument(
+    "--archive-dir", default=settings.archive_dir,
+    help="Where expired partitions are exported before they are dropped",
+  )
+  parser.add_argument("--dry-run", action="store_true", help="Only report expired partitions")
+  args = parser.parse_args()
+
+  if args.command in ("partitions", "all"):
+    created = ensure_partitions(args.months_ahead)
+    print(f"Created {len(created)} partitions" + (f": {', '.join(created)}" if created else ""))
+
+  if args.command in ("retention", "all"):
+    report = apply_retention(args.retention_months, Path(args.archive_dir).resolve(), args.dry_run)
+    for entry in report:
+      if "orphans" in entry:
+        print(f"Archived and deleted {entry['orphans']} {entry['table']} rows whose session was dropped")
+        continue
+      if args.dry_run:
+        print(f"Would archive {entry['partition']} ({entry['month']})")
+      else:
+        print(
+          f"Archived {entry['partition']}: {entry['rows']} rows, "
+          f"{entry['archive_bytes']} bytes -> {entry['archive']}"
+        )
+      if entry.get("linked_sessions"):
+        print(f"  {entry['linked_sessions']} newer sessions linked to it {'would get' if args.dry_run else 'got'} their own results")
+    if not report:
+      print("No partitions past retention")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,107 @@
+-- Biome Coaching - migration 0001: monthly range partitioning on created_at
+-- Run once, after schema.sql, during a maintenance window:
+--   psql -d biome_coaching -f db/migrations/0001_partition_analysis_tables.sql
+-- Then keep partitions ahead of time with:
+--   python -m db.maintenance partitions
+--
+-- Converts analysis_sessions, analysis_results and the result child tables
+-- (form_issues, metrics, strengths, recommendations) into tables partitioned
+-- by month of created_at. Rows are copied into the new partitions inside one
+-- transaction; secondary indexes are recreated as partitioned indexes.
+--
+-- Postgres requires unique keys on a partitioned table to include the
+-- partition key, so primary keys become (id, created_at) and the foreign
+-- keys *between* these tables (results -> sessions, children -> results,
+-- linked_session_id) are dropped. Referential cleanup is done by
+-- partition: the retention job (db/maintenance.py) archives and drops the
+-- same months from every table. Foreign keys to users and exercises stay.
+--
+-- Idempotent: tables that are already partitioned are skipped.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION pg_temp.partition_by_month(tbl TEXT) RETURNS VOID AS $$
+DECLARE
+  legacy TEXT := tbl || '_unpartitioned';
+  index_defs TEXT[];
+  index_def TEXT;
+  first_month DATE;
+  last_month DATE := (date_trunc('month', now()) + interval '3 months')::date;
+  month DATE;
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = tbl::regclass) THEN
+    RAISE NOTICE '% is already partitioned, skipping', tbl;
+    RETURN;
+  END IF;
+
+  -- Secondary index definitions to recreate on the partitioned table
+  -- (captured before the rename, so they already name the new table)
+  SELECT coalesce(array_agg(pg_get_indexdef(i.indexrelid)), '{}')
+    INTO index_defs
+    FROM pg_index i
+   WHERE i.indrelid = tbl::regclass AND NOT i.indisprimary;
+
+  EXECUTE format('ALTER TABLE %I RENAME TO %I', tbl, legacy);
+  EXECUTE format('UPDATE %I SET created_at = now() WHERE created_at IS NULL', legacy);
+
+  EXECUTE format(
+    'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE (created_at)',
+    tbl, legacy
+  );
+  EXECUTE format('ALTER TABLE %I ALTER COLUMN created_at SET NOT NULL', tbl);
+
+  -- One partition per month from the oldest row to three months ahead,
+  -- plus a default partition as a safety net
+  EXECUTE format('SELECT date_trunc(''month'', min(created_at))::date FROM %I', legacy) INTO first_month;
+  month := coalesce(least(first_month, date_trunc('month', now())::date), date_trunc('month', now())::date);
+  WHILE month <= last_month LOOP
+    EXECUTE format(
+      'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+      tbl || '_p' || to_char(month, 'YYYYMM'), tbl, month, (month + interval '1 month')::date
+    );
+    month := (month + interval '1 month')::date;
+  END LOOP;
+  EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', tbl || '_default', tbl);
+
+  EXECUTE format('INSERT INTO %I SELECT * FROM %I', tbl, legacy);
+  EXECUTE format('DROP TABLE %I CASCADE', legacy);
+
+  -- Keys and indexes once the legacy names are free
+  EXECUTE format('ALTER TABLE %I ADD PRIMARY KEY (id, created_at)', tbl);
+  FOREACH index_def IN ARRAY index_defs LOOP
+    EXECUTE index_def;
+  END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Children first so dropping each legacy parent only removes FKs that are
+-- going away anyway
+SELECT pg_temp.partition_by_month('form_issues');
+SELECT pg_temp.partition_by_month('metrics');
+SELECT pg_temp.partition_by_month('strengths');
+SELECT pg_temp.partition_by_month('recommendations');
+SELECT pg_temp.partition_by_month('analysis_results');
+SELECT pg_temp.partition_by_month('analysis_sessions');
+
+-- LIKE does not copy foreign keys; restore the ones to unpartitioned tables
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_constraint
+     WHERE conrelid = 'analysis_sessions'::regclass AND contype = 'f'
+  ) THEN
+    ALTER TABLE analysis_sessions
+      ADD FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+      ADD FOREIGN KEY (exercise_id) REFERENCES exercises(id);
+  END IF;
+END;
+$$;
+
+COMMIT;
+
+ANALYZE analysis_sessions;
+ANALYZE analysis_results;
+ANALYZE form_issues;
+ANALYZE metrics;
+ANALYZE strengths;
+ANALYZE recommendations;
@@ -0,0 +1,46 @@
+"""
+Keyset pagination cursors.
+
+A cursor is the sort key of the last row on a page, encoded as an opaque
+URL-safe token. The next page continues with `(created_at, id) < cursor`
+instead of OFFSET, so every page costs the same index range scan no matter
+how deep the client has paged.
+"""
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+  """Opaque token for the position after (created_at, id)."""
+  raw = json.dumps([created_at.isoformat(), str(row_id)], separators=(",", ":"))
+  return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, str]]:
+  """
+  Decode a token from `encode_cursor`.
+
+  Raises:
+    ValueError: The token is malformed.
+  """
+  if not cursor:
+    return None
+  try:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    return datetime.fromisoformat(created_at), str(uuid.UUID(row_id))
+  except Exception as e:
+    raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def clamp_page_size(limit: Optional[int]) -> int:
+  """Page size within 1..MAX_PAGE_SIZE (DEFAULT_PAGE_SIZE when unset)."""
+  if not limit:
+    return DEFAULT_PAGE_SIZE
+  return max(1, min(limit, MAX_PAGE_SIZE))
@@ -3,7 +3,9 @@ Raw SQL query helpers for Biome Coaching Agent.
 
 Phase 1-3: Session management and analysis result persistence.
 """
-from typing import Any, Dict, Optional
+import json
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 from decimal import Decimal
 
 import psycopg
@@ -35,6 +37,8 @@ def create_analysis_session(
   video_url: str,
   duration: Optional[float],
   file_size: Optional[int],
+  content_hash: Optional[str] = None,
+  pipeline_version: Optional[str] = None,
 ) -> str:
   """Create a new analysis session record."""
   logger.debug(
@@ -58,10 +62,14 @@ def create_analysis_session(
     cur.execute(
       (
         "INSERT INTO analysis_sessions "
-        "(id, user_id, exercise_name, video_url, video_duration, file_size, status, created_at) "
-        "VALUES (%s, %s, %s, %s, %s, %s, 'pending', NOW()) RETURNING id"
+        "(id, user_id, exercise_name, video_url, video_duration, file_size, "
+        "content_hash, pipeline_version, status, created_at) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'pending', NOW()) RETURNING id"
+      ),
+      (
+        session_id, parsed_user_id, exercise_name, video_url, duration, file_size,
+        content_hash, pipeline_version,
       ),
-      (session_id, parsed_user_id, exercise_name, video_url, duration, file_size),
     )
     row = cur.fetchone()
     created_id = row[0]
@@ -82,6 +90,22 @@ def get_analysis_session(
   return cur.fetchone()
 
 
+def get_session_status(
+  conn: psycopg.Connection,
+  session_id: str,
+) -> Optional[Dict[str, Any]]:
+  """Get just the status and error message of a session."""
+  cur = conn.cursor()
+  cur.execute(
+    "SELECT status, error_message FROM analysis_sessions WHERE id = %s",
+    (session_id,),
+  )
+  row = cur.fetchone()
+  if not row:
+    return None
+  return {"status": row[0], "error_message": row[1]}
+
+
 def update_session_status(
   conn: psycopg.Connection,
   session_id: str,
@@ -97,7 +121,8 @@ def update_session_status(
       cur.execute(
         (
           "UPDATE analysis_sessions "
-          "SET status = %s, error_message = %s, completed_at = NOW() WHERE id = %s"
+          "SET status = %s, error_message = %s, completed_at = NOW(), "
+          "lease_owner = NULL, lease_expires_at = NULL WHERE id = %s"
         ),
         (status, error_message, session_id),
       )
@@ -113,7 +138,11 @@ def update_session_status(
       logger.info(f"Session {session_id} marked as processing")
     else:
       cur.execute(
-        "UPDATE analysis_sessions SET status = %s, error_message = %s WHERE id = %s",
+        (
+          "UPDATE analysis_sessions "
+          "SET status = %s, error_message = %s, lease_owner = NULL, lease_expires_at = NULL "
+          "WHERE id = %s"
+        ),
         (status, error_message, session_id),
       )
       if error_message:
@@ -125,6 +154,517 @@ def update_session_status(
     raise
 
 
+# Content-hash deduplication
+def acquire_video_object(
+  conn: psycopg.Connection,
+  content_hash: str,
+  storage_path: str,
+  size_bytes: int,
+) -> int:
+  """Register a reference to a stored file; returns the new reference count."""
+  cur = conn.cursor()
+  cur.execute(
+    (
+      "INSERT INTO video_objects (content_hash, storage_path, size_bytes) "
+      "VALUES (%s, %s, %s) "
+      "ON CONFLICT (content_hash) DO UPDATE "
+      "SET ref_count = video_objects.ref_count + 1, storage_path = EXCLUDED.storage_path, "
+      "last_used_at = NOW() "
+      "RETURNING ref_count"
+    ),
+    (content_hash, storage_path, size_bytes),
+  )
+  return cur.fetchone()[0]
+
+
+def record_video_probe(conn: psycopg.Connection, content_hash: str, source_fps: Optional[float]) -> None:
+  cur = conn.cursor()
+  cur.execute(
+    "UPDATE video_objects SET source_fps = %s WHERE content_hash = %s",
+    (source_fps, content_hash),
+  )
+
+
+def set_video_proxy(
+  conn: psycopg.Connection,
+  content_hash: str,
+  proxy_path: str,
+  proxy_fps: float,
+) -> None:
+  """Record the analysis proxy of stored content."""
+  cur = conn.cursor()
+  cur.execute(
+    "UPDATE video_objects SET proxy_path = %s, proxy_fps = %s WHERE content_hash = %s",
+    (proxy_path, proxy_fps, content_hash),
+  )
+
+
+def get_session_media(conn: psycopg.Connection, session_id: str) -> Optional[Dict[str, Any]]:
+  """A session's video plus its stored object's probe and proxy, if any."""
+  cur = conn.cursor()
+  cur.execute(
+    (
+      "SELECT s.video_url, s.content_hash, v.source_fps, v.proxy_path, v.proxy_fps "
+      "FROM analysis_sessions s "
+      "LEFT JOIN video_objects v ON v.content_hash = s.content_hash "
+      "WHERE s.id = %s"
+    ),
+    (session_id,),
+  )
+  row = cur.fetchone()
+  if not row:
+    return None
+  return {
+    "video_url": row[0],
+    "content_hash": row[1],
+    "source_fps": row[2],
+    "proxy_url": row[3],
+    "proxy_fps": row[4],
+  }
+
+
+def get_issue_clip_source(
+  conn: psycopg.Connection,
+  session_id: str,
+  issue_id: str,
+) -> Optional[Dict[str, Any]]:
+  """
+  An issue of a session's results with the video and pose series it was found in.
+
+  Reused sessions (linked_session_id) resolve to the session that was analyzed.
+  """
+  cur = conn.cursor()
+  cur.execute(
+    (
+      "SELECT a.id, a.video_url, fi.issue_type, fi.severity, fi.frame_start, fi.frame_end, "
+      "fi.coaching_cue "
+      "FROM analysis_sessions s "
+      "JOIN analysis_sessions a ON a.id = COALESCE(s.linked_session_id, s.id) "
+      "JOIN analysis_results r ON r.session_id = a.id "
+      "JOIN form_issues fi ON fi.result_id = r.id "
+      "WHERE s.id = %s AND fi.id = %s"
+    ),
+    (session_id, issue_id),
+  )
+  row = cur.fetchone()
+  if not row:
+    return None
+  return {
+    "analyzed_session_id": str(row[0]),
+    "video_url": row[1],
+    "issue_type": row[2],
+    "severity": row[3],
+    "frame_start": row[4],
+    "frame_end": row[5],
+    "coaching_cue": row[6],
+  }
+
+
+def get_thumbnail_source(conn: psycopg.Connection, session_id: str) -> Optional[Dict[str, Any]]:
+  """
+  The analyzed session behind `session_id`, its video and its latest result id.
+
+  result_id is None until results are saved.
+  """
+  cur = conn.cursor()
+  cur.execute(
+    (
+      "SELECT a.id, a.video_url, "
+      "(SELECT r.id FROM analysis_results r WHERE r.session_id = a.id "
+      "ORDER BY r.created_at DESC LIMIT 1) "
+      "FROM analysis_sessions s "
+      "JOIN analysis_sessions a ON a.id = COALESCE(s.linked_session_id, s.id) "
+      "WHERE s.id = %s"
+    ),
+    (session_id,),
+  )
+  row = cur.fetchone()
+  if not row:
+    return None
+  return {
+    "analyzed_session_id": str(row[0]),
+    "video_url": row[1],
+    "result_id": str(row[2]) if row[2] else None,
+  }
+
+
+def get_content_usage(conn: psycopg.Connection, content_hashes: List[str]) -> Dict[str, bool]:
+  """
+  Which of `content_hashes` are still referenced.
+
+  Returns {content_hash: in_flight} for hashes that sessions refer to or
+  whose video_objects row still counts references, where in_flight means
+  some session using the content is not finished yet.
+  """
+  cur = conn.cursor()
+  cur.execute(
+    (
+      "SELECT content_hash, bool_or(status IN ('pending', 'queued', 'processing')) "
+      "FROM analysis_sessions WHERE content_hash = ANY(%s) GROUP BY content_hash"
+    ),
+    (content_hashes,),
+  )
+  usage = {row[0]: bool(row[1]) for row in cur.fetchall()}
+  cur.execute(
+    "SELECT content_hash FROM video_objects WHERE content_hash = ANY(%s) AND ref_count > 0",
+    (content_hashes,),
+  )
+  for (content_hash,) in cur.fetchall():
+    usage.setdefault(content_hash, False)
+  return usage
+
+
+def delete_video_object(conn: psycopg.Connection, content_hash: str) -> bool:
+  """Forget a stored file nothing references any more; False if it was acquired again."""
+  cur = conn.cursor()
+  cur.execute(
+    "DELETE FROM video_objects WHERE content_hash = %s AND ref_count = 0",
+    (content_hash,),
+  )
+  return cur.rowcount > 0
+
+
+def clear_video_proxy(conn: psycopg.Connection, content_hash: str, proxy_path: str) -> None:
+  """Forget a proxy that was deleted (unless a newer one was recorded meanwhile)."""
+  conn.execute(
+    (
+      "UPDATE video_objects SET proxy_path = NULL, proxy_fps = NULL "
+      "WHERE content_hash = %s AND proxy_path = %s"
+    ),
+    (content_hash, proxy_path),
+  )
+
+
+def release_video_objects(conn: psycopg.Connection, references: Dict[str, int]) -> Dict[str, int]:
+  """
+  Drop references to stored files, `{content_hash: references}`.
+
+  Called when sessions are deleted (db.maintenance retention). Returns the
+  remaining count per tracked hash; the janitor deletes files whose count
+  reached 0 once no session refers to them.
+  """
+  if not references:
+    return {}
+  hashes = list(references)
+  cur = conn.cursor()
+  cur.execute(
+    (
+      "UPDATE video_objects v SET ref_count = GREATEST(v.ref_count - d.refs, 0) "
+      "FROM unnest(%s::text[], %s::int[]) AS d(content_hash, refs) "
+      "WHERE v.content_hash = d.content_hash RETURNING v.content_hash, v.ref_count"
+    ),
+    (hashes, [references[h] for h in hashes]),
+  )
+  return {row[0]: row[1] for row in cur.fetchall()}
+
+
+def find_reusable_session(
+  conn: psycopg.Connection,
+  content_hash: str,
+  exercise_name: str,
+  pipeline_version: str,
+) -> Optional[str]:
+  """Most recent completed analysis of the same content, exercise and pipeline version."""
+  cur = conn.cursor()
+  cur.execute(
+    (
+      "SELECT s.id FROM analysis_sessions s "
+      "WHERE s.content_hash = %s AND s.exercise_name = %s AND s.pipeline_version = %s "
+      "AND s.status = 'completed' AND s.linked_session_id IS NULL "
+      "AND EXISTS (SELECT 1 FROM analysis_results r WHERE r.session_id = s.id) "
+      "ORDER BY s.completed_at DESC LIMIT 1"
+    ),
+    (content_hash, exercise_name, pipeline_version),
+  )
+  row = cur.fetchone()
+  return str(row[0]) if row else None
+
+
+def link_session(conn: psycopg.Connection, session_id: str, source_session_id: str) -> None:
+  """Complete a session by pointing it at another session's results."""
+  cur = conn.cursor()
+  cur.execute(
+    (
+      "UPDATE analysis_sessions "
+      "SET status = 'completed', linked_session_id = %s, error_message = NULL, "
+      "started_at = NOW(), completed_at = NOW() WHERE id = %s"
+    ),
+    (source_session_id, session_id),
+  )
+  cur.execute(
+    "SELECT overall_score FROM analysis_results WHERE session_id = %s ORDER BY created_at DESC LIMIT 1",
+    (source_session_id,),
+  )
+  row = cur.fetchone()
+  if row:
+    # The reused analysis still counts towards this user's progress
+    record_user_progress(conn, session_id, row[0])
+  logger.info(f"Session {session_id} linked to completed session {source_session_id}")
+
+
+# Stored pose series (see biome_coaching_agent.pose_store for the blob format)
+def upsert_pose_series(
+  conn: psycopg.Connection,
+  session_id: str,
+  frame_count: int,
+  codec: str,
+  data: bytes,
+) -> None:
+  """Store (or replace) a session's encoded pose series."""
+  cur = conn.cursor()
+  cur.execute(
+    (
+      "INSERT INTO pose_series (session_id, frame_count, codec, byte_size, data, created_at) "
+      "VALUES (%s, %s, %s, %s, %s, NOW()) "
+      "ON CONFLICT (session_id) DO UPDATE SET frame_count = EXCLUDED.frame_count, "
+      "codec = EXCLUDED.codec, byte_size = EXCLUDED.byte_size, data = EXCLUDED.data"
+    ),
+    (session_id, frame_count, codec, len(data), data),
+  )
+
+
+def get_pose_series(conn: psycopg.Connection, session_id: str) -> Optional[bytes]:
+  """Encoded pose series of a session, or None."""
+  cur = conn.cursor()
+  cur.execute("SELECT data FROM pose_series WHERE session_id = %s", (session_id,))
+  row = cur.fetchone()
+  return bytes(row[0]) if row else None
+
+
+# Opt-in pipeline profiles (see biome_coaching_agent.profiling)
+def request_profile(conn: psycopg.Connection, session_id: str, trigger: str) -> None:
+  """Ask whoever analyzes the session (API or worker) to profile the run."""
+  cur = conn.cursor()
+  cur.execute(
+    "UPDATE analysis_sessions SET profile_trigger = %s WHERE id = %s",
+    (trigger, session_id),
+  )
+
+
+def save_session_profile(
+  conn: psycopg.Connection,
+  session_id: str,
+  trigger: str,
+  wall_seconds: float,
+  cpu_seconds: float,
+  sample_count: int,
+  peak_traced_bytes: Optional[int],
+  folded_stacks: str,
+  report: Dict[str, Any],
+) -> None:
+  """Store (or replace) the profile of a session's latest run and clear the request."""
+  cur = conn.cursor()
+  cur.execute(
+    (
+      "INSERT INTO session_profiles "
+      "(session_id, trigger, wall_seconds, cpu_seconds, sample_count, peak_traced_bytes, "
+      "folded_stacks, report, created_at) "
+      "VALUES (%s, %s, %s, %s, %s, %s, %s, %s::jsonb, NOW()) "
+      "ON CONFLICT (session_id) DO UPDATE SET trigger = EXCLUDED.trigger, "
+      "wall_seconds = EXCLUDED.wall_seconds, cpu_seconds = EXCLUDED.cpu_seconds, "
+      "sample_count = EXCLUDED.sample_count, peak_traced_bytes = EXCLUDED.peak_traced_bytes, "
+      "folded_stacks = EXCLUDED.folded_stacks, report = EXCLUDED.report, created_at = NOW()"
+    ),
+    (
+      session_id, trigger, wall_seconds, cpu_seconds, sample_count, peak_traced_bytes,
+      folded_stacks, json.dumps(report),
+    ),
+  )
+  cur.execute(
+    "UPDATE analysis_sessions SET profile_trigger = NULL WHERE id = %s",
+    (session_id,),
+  )
+
+
+# Per-user progress aggregates
+# Weight of the newest score in the exponentially weighted average, and how
+# far (in score points) that average must move away from the all-time mean
+# before the trend is reported as improving/declining.
+PROGRESS_EWMA_ALPHA = Decimal("0.3")
+PROGRESS_TREND_THRESHOLD = Decimal("0.25")
+
+_NEW_EWMA = (
+  "(%(alpha)s * EXCLUDED.score_total + (1 - %(alpha)s) * "
+  "COALESCE(user_progress.ewma_score, user_progress.average_score, EXCLUDED.score_total))"
+)
+_NEW_MEAN = "((user_progress.score_total + EXCLUDED.score_total) / (user_progress.total_analyses + 1))"
+
+RECORD_USER_PROGRESS_SQL = (
+  "INSERT INTO user_progress "
+  "(user_id, exercise_id, exercise_name, average_score, total_analyses, last_analysis_date, "
+  "improvement_trend, score_total, ewma_score, created_at, updated_at) "
+  "SELECT s.user_id, s.exercise_id, s.exercise_name, %(score)s, 1, NOW(), "
+  "'stable', %(score)s, %(score)s, NOW(), NOW() "
+  "FROM analysis_sessions s WHERE s.id = %(session_id)s AND s.user_id IS NOT NULL "
+  "ON CONFLICT (user_id, exercise_name) DO UPDATE SET "
+  "total_analyses = user_progress.total_analyses + 1, "
+  "score_total = user_progress.score_total + EXCLUDED.score_total, "
+  f"average_score = ROUND({_NEW_MEAN}, 1), "
+  f"ewma_score = {_NEW_EWMA}, "
+  "improvement_trend = CASE "
+  f"WHEN {_NEW_EWMA} - {_NEW_MEAN} > %(threshold)s THEN 'improving' "
+  f"WHEN {_NEW_MEAN} - {_NEW_EWMA} > %(threshold)s THEN 'declining' "
+  "ELSE 'stable' END, "
+  "last_analysis_date = NOW(), updated_at = NOW()"
+)
+
+
+def record_user_progress(
+  conn: psycopg.Connection,
+  session_id: str,
+  overall_score: float,
+) -> None:
+  """
+  Fold one analysis into the user's aggregate row for that exercise.
+  
+  Maintains the count, running total/mean, an exponentially weighted
+  average and the trend (EWMA vs. mean) in a single upsert, so progress
+  reads never scan analysis history. Demo sessions (no user) are skipped.
+  """
+  cur = conn.cursor()
+  cur.execute(
+    RECORD_USER_PROGRESS_SQL,
+    {
+      "session_id": session_id,
+      "score": Decimal(str(overall_score)),
+      "alpha": PROGRESS_EWMA_ALPHA,
+      "threshold": PROGRESS_TREND_THRESHOLD,
+    },
+  )
+
+
+# Work queue: analysis_sessions doubles as the job table
+def claim_next_job(
+  conn: psycopg.Connection,
+  worker_id: str,
+  lease_seconds: int,
+  max_attempts: int,
+) -> Optional[Dict[str, Any]]:
+  """
+  Claim the oldest queued session (or one whose lease expired) for a worker.
+
+  Uses FOR UPDATE SKIP LOCKED so concurrent workers never block on, or
+  double-claim, the same row. Returns None when there is nothing to do.
+  """
+  cur = conn.cursor()
+  cur.execute(
+    (
+      "WITH next_job AS ("
+      "  SELECT id FROM analysis_sessions "
+      "  WHERE (status = 'queued' "
+      "     OR (status = 'processing' AND lease_expires_at < NOW())) "
+      "    AND COALESCE(attempts, 0) < %s "
+      "  ORDER BY created_at "
+      "  LIMIT 1 "
+      "  FOR UPDATE SKIP LOCKED"
+      ") "
+      "UPDATE analysis_sessions s "
+      "SET status = 'processing', lease_owner = %s, "
+      "lease_expires_at = NOW() + make_interval(secs => %s), "
+      "attempts = COALESCE(s.attempts, 0) + 1, "
+      "started_at = COALESCE(s.started_at, NOW()), error_message = NULL "
+      "FROM next_job WHERE s.id = next_job.id "
+      "RETURNING s.id, s.exercise_name, s.video_url, s.attempts, s.profile_trigger"
+    ),
+    (max_attempts, worker_id, lease_seconds),
+  )
+  row = cur.fetchone()
+  if not row:
+    return None
+  logger.info(f"Worker {worker_id} claimed session {row[0]} (attempt {row[3]})")
+  return {
+    "session_id": str(row[0]),
+    "exercise_name": row[1],
+    "video_url": row[2],
+    "attempts": row[3],
+    "profile_trigger": row[4],
+  }
+
+
+def heartbeat_job(
+  conn: psycopg.Connection,
+  session_id: str,
+  worker_id: str,
+  lease_seconds: int,
+) -> bool:
+  """Extend a held lease. Returns False if the lease was lost to another worker."""
+  cur = conn.cursor()
+  cur.execute(
+    (
+      "UPDATE analysis_sessions "
+      "SET lease_expires_at = NOW() + make_interval(secs => %s) "
+      "WHERE id = %s AND lease_owner = %s AND status = 'processing'"
+    ),
+    (lease_seconds, session_id, worker_id),
+  )
+  return cur.rowcount > 0
+
+
+def requeue_job(
+  conn: psycopg.Connection,
+  session_id: str,
+  worker_id: str,
+  error_message: Optional[str] = None,
+) -> None:
+  """Hand a claimed session back to the queue after a transient failure."""
+  cur = conn.cursor()
+  cur.execute(
+    (
+      "UPDATE analysis_sessions "
+      "SET status = 'queued', error_message = %s, lease_owner = NULL, lease_expires_at = NULL "
+      "WHERE id = %s AND status <> 'completed' "
+      "AND (lease_owner = %s OR lease_owner IS NULL)"
+    ),
+    (error_message, session_id, worker_id),
+  )
+  logger.warning(f"Session {session_id} requeued by {worker_id}: {error_message}")
+
+
+def fail_job(
+  conn: psycopg.Connection,
+  session_id: str,
+  worker_id: str,
+  error_message: Optional[str] = None,
+) -> bool:
+  """Mark a claimed session failed for good; False if the worker no longer holds its lease."""
+  cur = conn.cursor()
+  cur.execute(
+    (
+      "UPDATE analysis_sessions "
+      "SET status = 'failed', error_message = %s, lease_owner = NULL, lease_expires_at = NULL "
+      "WHERE id = %s AND status <> 'completed' AND lease_owner = %s"
+    ),
+    (error_message, session_id, worker_id),
+  )
+  if cur.rowcount:
+    logger.info(f"Session {session_id} failed by {worker_id}: {error_message}")
+  return cur.rowcount > 0
+
+
+def fail_exhausted_jobs(conn: psycopg.Connection, max_attempts: int) -> int:
+  """Mark sessions that crashed out of every allowed attempt as failed."""
+  cur = conn.cursor()
+  cur.execute(
+    (
+      "UPDATE analysis_sessions "
+      "SET status = 'failed', error_message = 'Exceeded maximum processing attempts', "
+      "lease_owner = NULL, lease_expires_at = NULL "
+      "WHERE status = 'processing' AND lease_expires_at < NOW() AND attempts >= %s"
+    ),
+    (max_attempts,),
+  )
+  if cur.rowcount:
+    logger.warning(f"Marked {cur.rowcount} exhausted sessions as failed")
+  return cur.rowcount
+
+
+def count_queued_jobs(conn: psycopg.Connection) -> int:
+  """Number of sessions waiting for a worker."""
+  cur = conn.cursor()
+  cur.execute("SELECT COUNT(*) FROM analysis_sessions WHERE status = 'queued'")
+  return int(cur.fetchone()[0])
+
+
 # Phase 3: Analysis result persistence
 def create_analysis_result(
   conn: psycopg.Connection,
@@ -232,101 +772,378 @@ def create_recommendation(
   )
 
 
-def get_analysis_result_by_session(
+def _result_child_rows(
+  result_id: str,
+  issues: List[Dict[str, Any]],
+  metrics: List[Dict[str, Any]],
+  strengths: List[str],
+  recommendations: List[Dict[str, Any]],
+) -> Tuple[List[tuple], List[tuple], List[tuple], List[tuple]]:
+  """Row tuples for form_issues, metrics, strengths and recommendations of one result."""
+  issue_rows = [
+    (
+      result_id,
+      issue.get("issue_type", "Unknown Issue"),
+      issue.get("severity", "moderate"),
+      issue.get("frame_start", 0),
+      issue.get("frame_end", 0),
+      issue.get("coaching_cue", ""),
+      Decimal(str(issue["confidence_score"])) if issue.get("confidence_score") is not None else None,
+    )
+    for issue in issues
+  ]
+  metric_rows = [
+    (
+      result_id,
+      metric.get("metric_name", "Unknown"),
+      metric.get("actual_value", ""),
+      metric.get("target_value", ""),
+      metric.get("status", "warning"),
+    )
+    for metric in metrics
+  ]
+  strength_rows = [(result_id, text) for text in strengths]
+  recommendation_rows = [
+    (result_id, rec.get("recommendation_text", ""), rec.get("priority", 1))
+    for rec in recommendations
+  ]
+  return issue_rows, metric_rows, strength_rows, recommendation_rows
+
+
+def save_analysis_bundle(
   conn: psycopg.Connection,
   session_id: str,
-) -> Optional[Dict[str, Any]]:
+  overall_score: float,
+  total_frames: int,
+  processing_time: Optional[float],
+  issues: List[Dict[str, Any]],
+  metrics: List[Dict[str, Any]],
+  strengths: List[str],
+  recommendations: List[Dict[str, Any]],
+  rules_version: Optional[str] = None,
+  lease_owner: Optional[str] = None,
+) -> Optional[str]:
   """
-  Get complete analysis result with all related data for a session.
-  
-  Returns nested dict with result, issues, metrics, strengths, recommendations.
+  Persist a result, all of its child rows and the session completion in one batch.
+
+  The result ID is generated client-side so child rows do not wait on
+  RETURNING; every statement is sent in pipeline mode, so the whole save
+  costs a single network round trip instead of one per row. The user's
+  progress aggregate is updated in the same batch.
+
+  With `lease_owner` (queue workers) the session is only completed while
+  that worker still holds its lease; otherwise the whole batch is rolled
+  back and None is returned.
   """
-  cur = conn.cursor()
-  
-  # Get analysis result
-  cur.execute(
-    "SELECT id, session_id, overall_score, total_frames, processing_time, created_at "
-    "FROM analysis_results WHERE session_id = %s ORDER BY created_at DESC LIMIT 1",
-    (session_id,),
+  result_id = str(uuid.uuid4())
+  issue_rows, metric_rows, strength_rows, recommendation_rows = _result_child_rows(
+    result_id, issues, metrics, strengths, recommendations
   )
-  result_row = cur.fetchone()
-  if not result_row:
-    return None
-  
-  result_id = str(result_row[0])
-  
-  # Get form issues
+
+  try:
+    with conn.pipeline():
+      cur = conn.cursor()
+      cur.execute(
+        (
+          "INSERT INTO analysis_results "
+          "(id, session_id, overall_score, total_frames, processing_time, rules_version, created_at) "
+          "VALUES (%s, %s, %s, %s, %s, %s, NOW())"
+        ),
+        (
+          result_id,
+          session_id,
+          Decimal(str(overall_score)),
+          total_frames,
+          Decimal(str(processing_time)) if processing_time else None,
+          rules_version,
+        ),
+      )
+      if issue_rows:
+        cur.executemany(
+          (
+            "INSERT INTO form_issues "
+            "(result_id, issue_type, severity, frame_start, frame_end, coaching_cue, confidence_score, created_at) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())"
+          ),
+          issue_rows,
+        )
+      if metric_rows:
+        cur.executemany(
+          (
+            "INSERT INTO metrics "
+            "(result_id, metric_name, actual_value, target_value, status, created_at) "
+            "VALUES (%s, %s, %s, %s, %s, NOW())"
+          ),
+          metric_rows,
+        )
+      if strength_rows:
+        cur.executemany(
+          "INSERT INTO strengths (result_id, strength_text, created_at) VALUES (%s, %s, NOW())",
+          strength_rows,
+        )
+      if recommendation_rows:
+        cur.executemany(
+          (
+            "INSERT INTO recommendations "
+            "(result_id, recommendation_text, priority, created_at) "
+            "VALUES (%s, %s, %s, NOW())"
+          ),
+          recommendation_rows,
+        )
+      record_user_progress(conn, session_id, overall_score)
+      if lease_owner is None:
+        update_session_status(conn, session_id, "completed", None)
+      else:
+        completed = conn.cursor()
+        completed.execute(
+          (
+            "UPDATE analysis_sessions "
+            "SET status = 'completed', error_message = NULL, completed_at = NOW(), "
+            "lease_owner = NULL, lease_expires_at = NULL WHERE id = %s AND lease_owner = %s"
+          ),
+          (session_id, lease_owner),
+        )
+    if lease_owner is not None and completed.rowcount == 0:
+      conn.rollback()
+      logger.warning(f"Discarded results for session {session_id}: {lease_owner} no longer holds its lease")
+      return None
+  except psycopg.Error as e:
+    logger.error(f"Failed to save analysis bundle for session {session_id}: {e}", exc_info=True)
+    raise
+
+  logger.debug(
+    f"Saved analysis bundle {result_id} - issues: {len(issue_rows)}, metrics: {len(metric_rows)}, "
+    f"strengths: {len(strength_rows)}, recommendations: {len(recommendation_rows)}"
+  )
+  return result_id
+
+
+# Bulk re-scoring (biome_coaching_agent.rescore)
+_COPY_TARGETS = (
+  ("form_issues", "result_id, issue_type, severity, frame_start, frame_end, coaching_cue, confidence_score"),
+  ("metrics", "result_id, metric_name, actual_value, target_value, status"),
+  ("strengths", "result_id, strength_text"),
+  ("recommendations", "result_id, recommendation_text, priority"),
+)
+
+
+def copy_analysis_results(
+  conn: psycopg.Connection,
+  results: Sequence[Dict[str, Any]],
+  rules_version: str,
+) -> int:
+  """
+  Insert many results with their child rows using COPY.
+
+  Each item is an `analyze_workout_form` result plus its `session_id`.
+  Sessions are not touched: status, timestamps and user progress keep
+  describing the original analysis. Returns the number of results written.
+  """
+  result_rows: List[tuple] = []
+  child_rows: Tuple[List[tuple], ...] = ([], [], [], [])
+  for result in results:
+    result_id = str(uuid.uuid4())
+    result_rows.append((
+      result_id,
+      result["session_id"],
+      Decimal(str(result["overall_score"])),
+      result.get("total_frames", 0),
+      rules_version,
+    ))
+    for rows, new_rows in zip(child_rows, _result_child_rows(
+      result_id,
+      result.get("issues", []),
+      result.get("metrics", []),
+      result.get("strengths", []),
+      result.get("recommendations", []),
+    )):
+      rows.extend(new_rows)
+
+  cur = conn.cursor()
+  with cur.copy(
+    "COPY analysis_results (id, session_id, overall_score, total_frames, rules_version) FROM STDIN"
+  ) as copy:
+    for row in result_rows:
+      copy.write_row(row)
+  for (table, columns), rows in zip(_COPY_TARGETS, child_rows):
+    if rows:
+      with cur.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+        for row in rows:
+          copy.write_row(row)
+  return len(result_rows)
+
+
+def get_rescore_candidates(
+  conn: psycopg.Connection,
+  rules_version: str,
+  after: Optional[str] = None,
+  limit: int = 500,
+) -> List[Tuple[str, str, bytes]]:
+  """
+  Next batch of (session_id, exercise_name, pose blob) for completed sessions
+  whose latest result was not produced by `rules_version`, in session_id order.
+
+  Keyset-paginated: pass the last session_id of the previous batch (or a
+  checkpoint) as `after`.
+  """
+  cur = conn.cursor()
   cur.execute(
     (
-      "SELECT id, issue_type, severity, frame_start, frame_end, coaching_cue, confidence_score "
-      "FROM form_issues WHERE result_id = %s ORDER BY severity DESC, frame_start"
+      "SELECT p.session_id, s.exercise_name, p.data "
+      "FROM pose_series p "
+      "JOIN analysis_sessions s ON s.id = p.session_id "
+      "WHERE p.session_id > COALESCE(%(after)s::uuid, '00000000-0000-0000-0000-000000000000') "
+      "AND s.status = 'completed' "
+      "AND (SELECT r.rules_version FROM analysis_results r WHERE r.session_id = p.session_id "
+      "     ORDER BY r.created_at DESC LIMIT 1) IS DISTINCT FROM %(rules_version)s "
+      "ORDER BY p.session_id LIMIT %(limit)s"
     ),
-    (result_id,),
+    {"after": after, "rules_version": rules_version, "limit": limit},
   )
-  issues = [
-    {
-      "id": str(row[0]),
-      "issue_type": row[1],
-      "severity": row[2],
-      "frame_start": row[3],
-      "frame_end": row[4],
-      "coaching_cue": row[5],
-      "confidence_score": float(row[6]) if row[6] else None,
-    }
-    for row in cur.fetchall()
-  ]
-  
-  # Get metrics
+  return [(str(session_id), exercise_name, bytes(data)) for session_id, exercise_name, data in cur.fetchall()]
+
+
+def get_rescore_checkpoint(conn: psycopg.Connection, rules_version: str) -> Optional[Dict[str, Any]]:
+  cur = conn.cursor()
   cur.execute(
-    "SELECT id, metric_name, actual_value, target_value, status "
-    "FROM metrics WHERE result_id = %s ORDER BY metric_name",
-    (result_id,),
+    (
+      "SELECT last_session_id, processed, started_at, completed_at "
+      "FROM rescore_checkpoints WHERE rules_version = %s"
+    ),
+    (rules_version,),
   )
-  metrics = [
-    {
-      "id": str(row[0]),
-      "metric_name": row[1],
-      "actual_value": row[2],
-      "target_value": row[3],
-      "status": row[4],
-    }
-    for row in cur.fetchall()
-  ]
-  
-  # Get strengths
+  row = cur.fetchone()
+  if not row:
+    return None
+  return {
+    "last_session_id": str(row[0]) if row[0] else None,
+    "processed": row[1] or 0,
+    "started_at": row[2],
+    "completed_at": row[3],
+  }
+
+
+def save_rescore_checkpoint(
+  conn: psycopg.Connection,
+  rules_version: str,
+  last_session_id: Optional[str],
+  processed: int,
+  completed: bool = False,
+) -> None:
+  """Upsert the resume point; written in the same transaction as the batch it covers."""
+  cur = conn.cursor()
   cur.execute(
-    "SELECT id, strength_text FROM strengths WHERE result_id = %s ORDER BY created_at",
-    (result_id,),
+    (
+      "INSERT INTO rescore_checkpoints "
+      "(rules_version, last_session_id, processed, started_at, updated_at, completed_at) "
+      "VALUES (%(rules_version)s, %(last)s, %(processed)s, NOW(), NOW(), "
+      "CASE WHEN %(completed)s THEN NOW() END) "
+      "ON CONFLICT (rules_version) DO UPDATE SET "
+      "last_session_id = COALESCE(EXCLUDED.last_session_id, rescore_checkpoints.last_session_id), "
+      "processed = EXCLUDED.processed, updated_at = NOW(), completed_at = EXCLUDED.completed_at"
+    ),
+    {"rules_version": rules_version, "last": last_session_id, "processed": processed, "completed": completed},
   )
-  strengths = [{"id": str(row[0]), "strength_text": row[1]} for row in cur.fetchall()]
-  
-  # Get recommendations
-  cur.execute(
-    "SELECT id, recommendation_text, priority FROM recommendations WHERE result_id = %s ORDER BY priority, created_at",
-    (result_id,),
+
+
+def reset_rescore_checkpoint(conn: psycopg.Connection, rules_version: str) -> None:
+  conn.execute("DELETE FROM rescore_checkpoints WHERE rules_version = %s", (rules_version,))
+
+
+# The full nested result document in one statement. The newest result for
+# the session is picked first (index: session_id, created_at DESC), then each
+# child collection is aggregated by a LATERAL subquery on its result_id index.
+# Sessions deduplicated onto an earlier analysis (linked_session_id) read that
+# session's results. Shared with db.async_queries.
+RESULT_DOCUMENT_SQL = """
+SELECT json_build_object(
+  'result', json_build_object(
+    'id', r.id::text,
+    'session_id', %(session_id)s::text,
+    'overall_score', r.overall_score::float8,
+    'total_frames', r.total_frames,
+    'processing_time', NULLIF(r.processing_time, 0)::float8,
+    'created_at', r.created_at
+  ),
+  'issues', COALESCE(fi.items, '[]'::json),
+  'metrics', COALESCE(m.items, '[]'::json),
+  'strengths', COALESCE(s.items, '[]'::json),
+  'recommendations', COALESCE(rec.items, '[]'::json)
+)::text
+FROM (
+  SELECT id, overall_score, total_frames, processing_time, created_at
+  FROM analysis_results
+  WHERE session_id = COALESCE(
+    (SELECT linked_session_id FROM analysis_sessions WHERE id = %(session_id)s),
+    %(session_id)s
   )
-  recommendations = [
-    {
-      "id": str(row[0]),
-      "recommendation_text": row[1],
-      "priority": row[2],
-    }
-    for row in cur.fetchall()
-  ]
+  ORDER BY created_at DESC
+  LIMIT 1
+) r
+LEFT JOIN LATERAL (
+  SELECT json_agg(json_build_object(
+    'id', id::text,
+    'issue_type', issue_type,
+    'severity', severity,
+    'frame_start', frame_start,
+    'frame_end', frame_end,
+    'coaching_cue', coaching_cue,
+    'confidence_score', NULLIF(confidence_score, 0)::float8
+  ) ORDER BY severity DESC, frame_start) AS items
+  FROM form_issues WHERE result_id = r.id
+) fi ON TRUE
+LEFT JOIN LATERAL (
+  SELECT json_agg(json_build_object(
+    'id', id::text,
+    'metric_name', metric_name,
+    'actual_value', actual_value,
+    'target_value', target_value,
+    'status', status
+  ) ORDER BY metric_name) AS items
+  FROM metrics WHERE result_id = r.id
+) m ON TRUE
+LEFT JOIN LATERAL (
+  SELECT json_agg(json_build_object(
+    'id', id::text,
+    'strength_text', strength_text
+  ) ORDER BY created_at) AS items
+  FROM strengths WHERE result_id = r.id
+) s ON TRUE
+LEFT JOIN LATERAL (
+  SELECT json_agg(json_build_object(
+    'id', id::text,
+    'recommendation_text', recommendation_text,
+    'priority', priority
+  ) ORDER BY priority, created_at) AS items
+  FROM recommendations WHERE result_id = r.id
+) rec ON TRUE
+"""
+
+
+def get_analysis_result_json(
+  conn: psycopg.Connection,
+  session_id: str,
+) -> Optional[str]:
+  """
+  Get the complete result document for a session as JSON text.
   
-  return {
-    "result": {
-      "id": result_id,
-      "session_id": session_id,
-      "overall_score": float(result_row[2]),
-      "total_frames": result_row[3],
-      "processing_time": float(result_row[4]) if result_row[4] else None,
-      "created_at": result_row[5].isoformat() if result_row[5] else None,
-    },
-    "issues": issues,
-    "metrics": metrics,
-    "strengths": strengths,
-    "recommendations": recommendations,
-  }
+  Postgres builds the document, so callers that only forward it (the API)
+  can send the text as-is without decoding.
+  """
+  cur = conn.cursor()
+  cur.execute(RESULT_DOCUMENT_SQL, {"session_id": session_id})
+  row = cur.fetchone()
+  return row[0] if row else None
 
 
+def get_analysis_result_by_session(
+  conn: psycopg.Connection,
+  session_id: str,
+) -> Optional[Dict[str, Any]]:
+  """
+  Get complete analysis result with all related data for a session.
+  
+  Returns nested dict with result, issues, metrics, strengths, recommendations.
+  """
+  document = get_analysis_result_json(conn, session_id)
+  return json.loads(document) if document else None
@@ -46,7 +46,28 @@ CREATE TABLE IF NOT EXISTS analysis_sessions (
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   started_at TIMESTAMP,
   completed_at TIMESTAMP,
-  error_message TEXT
+  error_message TEXT,
+  attempts INTEGER DEFAULT 0,
+  lease_owner VARCHAR(255),
+  lease_expires_at TIMESTAMP,
+  content_hash CHAR(64),
+  pipeline_version VARCHAR(20),
+  linked_session_id UUID REFERENCES analysis_sessions(id) ON DELETE SET NULL
+);
+
+-- Stored video files, keyed by SHA-256 of their content. Sessions that
+-- upload identical bytes share one file; ref_count tracks how many do.
+CREATE TABLE IF NOT EXISTS video_objects (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  content_hash CHAR(64) NOT NULL,
+  storage_path TEXT NOT NULL,
+  size_bytes BIGINT NOT NULL,
+  ref_count INTEGER NOT NULL DEFAULT 1,
+  source_fps REAL,
+  proxy_path TEXT,
+  proxy_fps REAL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 CREATE TABLE IF NOT EXISTS analysis_results (
@@ -104,23 +125,147 @@ CREATE TABLE IF NOT EXISTS user_progress (
   total_analyses INTEGER DEFAULT 0,
   last_analysis_date TIMESTAMP,
   improvement_trend VARCHAR(20),
+  score_total DECIMAL(12,2) DEFAULT 0,
+  ewma_score DECIMAL(5,3),
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Extracted pose data kept for re-analysis without re-decoding the video.
+-- `data` is a self-describing compressed blob (biome_coaching_agent/pose_store.py).
+-- No foreign key: analysis_sessions may be partitioned (db/migrations/0001),
+-- and partitioned tables cannot be referenced by id alone.
+CREATE TABLE IF NOT EXISTS pose_series (
+  session_id UUID PRIMARY KEY,
+  frame_count INTEGER NOT NULL,
+  codec VARCHAR(10) NOT NULL,
+  byte_size INTEGER NOT NULL,
+  data BYTEA NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+-- Already compressed: store out of line without another TOAST compression pass
+ALTER TABLE pose_series ALTER COLUMN data SET STORAGE EXTERNAL;
+
+-- Progress of `python -m biome_coaching_agent.rescore`, one row per rules version.
+-- Sessions are processed in session_id order; last_session_id is the resume point.
+CREATE TABLE IF NOT EXISTS rescore_checkpoints (
+  rules_version VARCHAR(20) PRIMARY KEY,
+  last_session_id UUID,
+  processed BIGINT DEFAULT 0,
+  started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  completed_at TIMESTAMP
+);
+
+-- Opt-in profiles of single pipeline runs (biome_coaching_agent/profiling.py):
+-- folded stacks for flamegraphs plus per-stage timings and top allocations.
+-- Latest run per session; no foreign key for the same reason as pose_series.
+CREATE TABLE IF NOT EXISTS session_profiles (
+  session_id UUID PRIMARY KEY,
+  trigger VARCHAR(16) NOT NULL,
+  wall_seconds DOUBLE PRECISION NOT NULL,
+  cpu_seconds DOUBLE PRECISION NOT NULL,
+  sample_count INTEGER NOT NULL,
+  peak_traced_bytes BIGINT,
+  folded_stacks TEXT NOT NULL,
+  report JSONB NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- ============================================
+-- UPGRADES FOR EXISTING DATABASES
+-- ============================================
+
+-- Work queue leases (added after the initial schema)
+ALTER TABLE analysis_sessions ADD COLUMN IF NOT EXISTS attempts INTEGER DEFAULT 0;
+ALTER TABLE analysis_sessions ADD COLUMN IF NOT EXISTS lease_owner VARCHAR(255);
+ALTER TABLE analysis_sessions ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP;
+
+-- Profiling requested for the run that analyzes the session ("header" or
+-- "sampled"); read by workers when they claim the job
+ALTER TABLE analysis_sessions ADD COLUMN IF NOT EXISTS profile_trigger VARCHAR(16);
+
+-- Content-hash deduplication (added after the initial schema)
+ALTER TABLE analysis_sessions ADD COLUMN IF NOT EXISTS content_hash CHAR(64);
+ALTER TABLE analysis_sessions ADD COLUMN IF NOT EXISTS pipeline_version VARCHAR(20);
+ALTER TABLE analysis_sessions ADD COLUMN IF NOT EXISTS linked_session_id UUID
+  REFERENCES analysis_sessions(id) ON DELETE SET NULL;
+
+-- Incremental progress aggregates (added after the initial schema)
+ALTER TABLE user_progress ADD COLUMN IF NOT EXISTS score_total DECIMAL(12,2) DEFAULT 0;
+ALTER TABLE user_progress ADD COLUMN IF NOT EXISTS ewma_score DECIMAL(5,3);
+
+-- Analysis proxies (added after the initial schema)
+ALTER TABLE video_objects ADD COLUMN IF NOT EXISTS source_fps REAL;
+ALTER TABLE video_objects ADD COLUMN IF NOT EXISTS proxy_path TEXT;
+ALTER TABLE video_objects ADD COLUMN IF NOT EXISTS proxy_fps REAL;
+
+-- Sessions stored content-addressed before content_hash existed
+UPDATE analysis_sessions
+SET content_hash = substring(video_url from '([0-9a-f]{64})\.[a-z0-9]+$')
+WHERE content_hash IS NULL AND video_url ~ '[0-9a-f]{64}\.[a-z0-9]+$';
+
+-- Scoring rules that produced a result (NULL: before rules were versioned)
+ALTER TABLE analysis_results ADD COLUMN IF NOT EXISTS rules_version VARCHAR(20);
+
 -- ============================================
 -- INDEXES FOR PERFORMANCE
 -- ============================================
 
-CREATE INDEX IF NOT EXISTS idx_analysis_sessions_user_id ON analysis_sessions(user_id);
-CREATE INDEX IF NOT EXISTS idx_analysis_sessions_status ON analysis_sessions(status);
-CREATE INDEX IF NOT EXISTS idx_analysis_sessions_created_at ON analysis_sessions(created_at DESC);
-CREATE INDEX IF NOT EXISTS idx_analysis_results_session_id ON analysis_results(session_id);
+-- Session listings are keyset-paginated on (created_at DESC, id DESC); each
+-- filter gets a composite index ending in that key so a page is a single
+-- index range scan. These supersede the single-column user_id, status and
+-- created_at indexes.
+CREATE INDEX IF NOT EXISTS idx_analysis_sessions_user_recent
+  ON analysis_sessions(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_analysis_sessions_user_exercise_recent
+  ON analysis_sessions(user_id, exercise_name, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_analysis_sessions_recent
+  ON analysis_sessions(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_analysis_sessions_status_recent
+  ON analysis_sessions(status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_analysis_sessions_exercise_recent
+  ON analysis_sessions(exercise_name, created_at DESC, id DESC);
+DROP INDEX IF EXISTS idx_analysis_sessions_user_id;
+DROP INDEX IF EXISTS idx_analysis_sessions_status;
+DROP INDEX IF EXISTS idx_analysis_sessions_created_at;
+-- Latest result per session (ORDER BY created_at DESC LIMIT 1); INCLUDE makes
+-- the /api/results lookup an index-only scan. Supersedes the plain session_id index.
+CREATE INDEX IF NOT EXISTS idx_analysis_results_session_latest
+  ON analysis_results(session_id, created_at DESC)
+  INCLUDE (id, overall_score, total_frames, processing_time);
+DROP INDEX IF EXISTS idx_analysis_results_session_id;
 CREATE INDEX IF NOT EXISTS idx_form_issues_result_id ON form_issues(result_id);
 CREATE INDEX IF NOT EXISTS idx_form_issues_severity ON form_issues(severity);
 CREATE INDEX IF NOT EXISTS idx_metrics_result_id ON metrics(result_id);
 CREATE INDEX IF NOT EXISTS idx_strengths_result_id ON strengths(result_id);
 CREATE INDEX IF NOT EXISTS idx_recommendations_result_id ON recommendations(result_id);
+-- One aggregate row per user and exercise (upserted on every save)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_user_progress_user_exercise
+  ON user_progress(user_id, exercise_name);
+
+-- Work queue: workers claim 'queued' sessions (and 'processing' ones whose
+-- lease has expired) with SELECT ... FOR UPDATE SKIP LOCKED.
+CREATE INDEX IF NOT EXISTS idx_analysis_sessions_queued
+  ON analysis_sessions(created_at) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_analysis_sessions_leases
+  ON analysis_sessions(lease_expires_at) WHERE status = 'processing';
+
+CREATE INDEX IF NOT EXISTS idx_pose_series_created_at ON pose_series(created_at);
+CREATE INDEX IF NOT EXISTS idx_session_profiles_created_at ON session_profiles(created_at DESC);
+
+-- Deduplication: one row per stored file, and the lookup for a completed
+-- analysis of the same content, exercise and pipeline version.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_video_objects_content_hash ON video_objects(content_hash);
+CREATE INDEX IF NOT EXISTS idx_analysis_sessions_reusable
+  ON analysis_sessions(content_hash, exercise_name, pipeline_version, completed_at DESC)
+  WHERE status = 'completed' AND linked_session_id IS NULL;
+-- Janitor: which stored files sessions still refer to
+CREATE INDEX IF NOT EXISTS idx_analysis_sessions_content_hash
+  ON analysis_sessions(content_hash) WHERE content_hash IS NOT NULL;
+-- Lets deletes of a source session find its linked sessions (ON DELETE SET NULL)
+CREATE INDEX IF NOT EXISTS idx_analysis_sessions_linked
+  ON analysis_sessions(linked_session_id) WHERE linked_session_id IS NOT NULL;
 
 -- ============================================
 -- SEED DATA
@@ -0,0 +1,101 @@
+"""
+Recorded-video client for the /ws/live endpoint.
+
+Plays a video file at its native frame rate (or --fps), sends JPEG frames
+over the WebSocket like a phone camera would, and reports rep counts plus
+end-to-end latency percentiles. Run several copies to load-test an instance.
+
+Usage:
+    python vision_test/live_client.py squat.mp4 --exercise squat
+    python vision_test/live_client.py pushups.mp4 --url ws://localhost:8080/ws/live --clients 24
+"""
+
+import argparse
+import asyncio
+import json
+import struct
+import time
+
+import cv2
+import numpy as np
+import websockets
+
+FRAME_HEADER = struct.Struct("<Id")
+
+
+async def run_client(url, video_path, exercise, fps, width, quality, client_no):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise SystemExit(f"Could not open {video_path}")
+    native_fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    send_fps = fps or native_fps
+    interval = 1.0 / send_fps
+
+    latencies = []
+    last_update = {}
+
+    async with websockets.connect(f"{url}?exercise={exercise}", max_size=None) as ws:
+        async def receiver():
+            async for raw in ws:
+                msg = json.loads(raw)
+                if msg.get("type") == "update":
+                    latencies.append(time.time() * 1000 - msg["client_ts"])
+                    last_update.update(msg)
+
+        recv_task = asyncio.create_task(receiver())
+        seq = 0
+        next_send = time.perf_counter()
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if width and frame.shape[1] > width:
+                scale = width / frame.shape[1]
+                frame = cv2.resize(frame, (width, int(frame.shape[0] * scale)))
+            ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not ok:
+                continue
+            seq += 1
+            await ws.send(FRAME_HEADER.pack(seq, time.time() * 1000) + jpeg.tobytes())
+
+            # Pace like a live camera
+            next_send += interval
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        await asyncio.sleep(0.5)  # Let the last updates arrive
+        recv_task.cancel()
+    cap.release()
+
+    if latencies:
+        arr = np.array(latencies)
+        print(
+            f"[client {client_no}] sent: {seq}, updates: {len(arr)}, "
+            f"reps: {last_update.get('reps')}, dropped: {last_update.get('dropped')}, "
+            f"latency ms p50/p95/max: {np.percentile(arr, 50):.1f}/"
+            f"{np.percentile(arr, 95):.1f}/{arr.max():.1f}"
+        )
+    else:
+        print(f"[client {client_no}] sent: {seq}, no updates received")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Replay a video against /ws/live")
+    parser.add_argument("video")
+    parser.add_argument("--url", default="ws://localhost:8080/ws/live")
+    parser.add_argument("--exercise", default="squat")
+    parser.add_argument("--fps", type=float, default=None, help="Send rate (default: video fps)")
+    parser.add_argument("--width", type=int, default=480, help="Downscale frames to this width")
+    parser.add_argument("--quality", type=int, default=70, help="JPEG quality")
+    parser.add_argument("--clients", type=int, default=1, help="Concurrent connections")
+    args = parser.parse_args()
+
+    await asyncio.gather(*(
+        run_client(args.url, args.video, args.exercise, args.fps, args.width, args.quality, i)
+        for i in range(args.clients)
+    ))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,153 @@
+"""
+Tests for the HTTP byte-range helpers (biome_coaching_agent/http_range.py)
+Pure functions: no server, database or video needed
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from biome_coaching_agent import http_range  # noqa: E402
+from biome_coaching_agent.http_range import RangeNotSatisfiable  # noqa: E402
+
+SIZE = 1000
+ETAG = '"0123456789abcdef"'
+
+
+def check_range(header, size, expected):
+    got = http_range.parse_range(header, size)
+    print(f"  {header!r} of {size} bytes -> {got}")
+    assert got == expected, f"{header!r}: expected {expected}, got {got}"
+
+
+def check_unsatisfiable(header, size):
+    try:
+        got = http_range.parse_range(header, size)
+    except RangeNotSatisfiable:
+        print(f"  {header!r} of {size} bytes -> 416 [OK]")
+    else:
+        raise AssertionError(f"{header!r} of {size} bytes should be unsatisfiable, got {got}")
+
+
+def test_single_ranges():
+    """Closed, open-ended and suffix ranges resolve to inclusive bounds"""
+    print("Testing single ranges...")
+
+    check_range("bytes=0-99", SIZE, (0, 99))
+    check_range("bytes=100-", SIZE, (100, SIZE - 1))
+    check_range("bytes=500-500", SIZE, (500, 500))
+    check_range("bytes=900-5000", SIZE, (900, SIZE - 1))
+    check_range("bytes=-100", SIZE, (SIZE - 100, SIZE - 1))
+    check_range("bytes=-5000", SIZE, (0, SIZE - 1))
+    check_range("Bytes = 0-9", SIZE, (0, 9))
+
+    print("[PASS] Single range tests passed!\n")
+
+
+def test_unsatisfiable_ranges():
+    """Ranges that select no bytes are answered with 416"""
+    print("Testing unsatisfiable ranges...")
+
+    check_unsatisfiable("bytes=-0", SIZE)
+    check_unsatisfiable(f"bytes={SIZE}-", SIZE)
+    check_unsatisfiable(f"bytes={SIZE + 10}-{SIZE + 20}", SIZE)
+    check_unsatisfiable("bytes=0-", 0)
+    check_unsatisfiable("bytes=-10", 0)
+
+    print("[PASS] Unsatisfiable range tests passed!\n")
+
+
+def test_ignored_ranges():
+    """Malformed, inverted, multi-range and foreign-unit headers serve the whole file"""
+    print("Testing ignored ranges...")
+
+    for header in (
+        None,
+        "",
+        "bytes=9-3",
+        "bytes=0-1,5-9",
+        "bytes=0-1, 5-9",
+        "items=0-9",
+        "bytes",
+        "bytes=",
+        "bytes=-",
+        "bytes=5",
+        "bytes=abc-",
+        "bytes=--5",
+        "bytes=+1-2",
+        "bytes=1-2-3",
+    ):
+        check_range(header, SIZE, None)
+
+    print("[PASS] Ignored range tests passed!\n")
+
+
+def test_if_range():
+    """If-Range only allows the range for the current strong ETag"""
+    print("Testing If-Range...")
+
+    for if_range, expected in (
+        (None, True),
+        ("", True),
+        (ETAG, True),
+        (f" {ETAG} ", True),
+        ('"somethingelse"', False),
+        (f"W/{ETAG}", False),
+        ("Wed, 21 Oct 2015 07:28:00 GMT", False),
+    ):
+        got = http_range.if_range_allows(if_range, ETAG)
+        print(f"  If-Range {if_range!r} -> {got}")
+        assert got == expected, f"If-Range {if_range!r}: expected {expected}"
+
+    print("[PASS] If-Range tests passed!\n")
+
+
+def test_iter_file():
+    """Positional reads return exactly the requested bytes"""
+    print("Testing iter_file...")
+
+    data = bytes(range(256)) * 40
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "video.mp4")
+        with open(path, "wb") as f:
+            f.write(data)
+        for start, end, chunk_size in ((0, len(data) - 1, 1024), (10, 4000, 1000), (7, 7, 64), (100, 99999, 4096)):
+            chunks = list(http_range.iter_file(path, start, end, chunk_size=chunk_size))
+            print(f"  {start}-{end} in {len(chunks)} chunks of up to {chunk_size}")
+            assert b"".join(chunks) == data[start:end + 1], f"Bytes {start}-{end} differ"
+            assert all(len(c) <= chunk_size for c in chunks), "Chunk larger than chunk_size"
+
+    print("[PASS] iter_file tests passed!\n")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("HTTP Range Tests")
+    print("=" * 60 + "\n")
+
+    try:
+        test_single_ranges()
+        test_unsatisfiable_ranges()
+        test_ignored_ranges()
+        test_if_range()
+        test_iter_file()
+
+        print("=" * 60)
+        print("[SUCCESS] ALL TESTS PASSED!")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n[FAIL] TEST FAILED: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n[ERROR] UNEXPECTED ERROR: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
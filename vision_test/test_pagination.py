@@ -0,0 +1,126 @@
+"""
+Tests for keyset pagination cursors (db/pagination.py)
+No database needed: only the cursor encoding and the page size bounds
+"""
+
+import base64
+import json
+import os
+import sys
+import uuid
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import pagination  # noqa: E402
+
+ROW_ID = "3f1c2a4e-5b6d-4c7e-8f90-a1b2c3d4e5f6"
+
+
+def encode_raw(value):
+    """A cursor built by hand, the way a client could tamper with one"""
+    raw = json.dumps(value).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def test_round_trip():
+    """Cursors decode back to the exact sort key they were built from"""
+    print("Testing cursor round trip...")
+
+    for created_at in (
+        datetime(2026, 10, 19, 8, 30, 0),
+        datetime(2026, 1, 1, 0, 0, 0, 123456),
+        datetime(2026, 3, 5, 12, 0, 0, tzinfo=timezone.utc),
+    ):
+        for row_id in (ROW_ID, uuid.UUID(ROW_ID), ROW_ID.upper()):
+            cursor = pagination.encode_cursor(created_at, row_id)
+            assert "=" not in cursor and "/" not in cursor and "+" not in cursor, "Cursor is not URL-safe"
+            decoded = pagination.decode_cursor(cursor)
+            assert decoded == (created_at, ROW_ID), f"Round trip changed {created_at}, {row_id}: {decoded}"
+        print(f"  {created_at.isoformat()} -> {cursor} [OK]")
+    assert pagination.decode_cursor(None) is None and pagination.decode_cursor("") is None
+
+    print("[PASS] Cursor round trip tests passed!\n")
+
+
+def test_rejected_cursors():
+    """Garbage and tampered cursors raise ValueError, which the API answers with 400"""
+    print("Testing rejected cursors...")
+
+    valid = pagination.encode_cursor(datetime(2026, 10, 19, 8, 30), ROW_ID)
+    for label, cursor in (
+        ("garbage", "not-a-cursor"),
+        ("bad base64", "!!!!"),
+        ("non-ascii", "ñandú"),
+        ("truncated", valid[:-6]),
+        ("flipped character", valid[:10] + ("A" if valid[10] != "A" else "B") + valid[11:]),
+        ("not json", base64.urlsafe_b64encode(b"\xff\xfe").decode("ascii")),
+        ("json object", encode_raw({"created_at": "2026-10-19"})),
+        ("one element", encode_raw(["2026-10-19T08:30:00"])),
+        ("three elements", encode_raw(["2026-10-19T08:30:00", ROW_ID, "x"])),
+        ("bad timestamp", encode_raw(["yesterday", ROW_ID])),
+        ("timestamp not a string", encode_raw([1760862600, ROW_ID])),
+        ("bad id", encode_raw(["2026-10-19T08:30:00", "1 OR 1=1"])),
+        ("id not a string", encode_raw(["2026-10-19T08:30:00", 42])),
+    ):
+        try:
+            pagination.decode_cursor(cursor)
+        except ValueError as e:
+            assert str(e).startswith("Invalid cursor"), f"{label}: unexpected message {e}"
+            print(f"  {label}: rejected [OK]")
+        except Exception as e:
+            raise AssertionError(f"{label}: raised {type(e).__name__} instead of ValueError (a 500)")
+        else:
+            raise AssertionError(f"{label}: tampered cursor was accepted")
+
+    print("[PASS] Rejected cursor tests passed!\n")
+
+
+def test_clamp_page_size():
+    """Page sizes stay within 1..MAX_PAGE_SIZE; unset means the default"""
+    print("Testing page size clamping...")
+
+    for limit, expected in (
+        (None, pagination.DEFAULT_PAGE_SIZE),
+        (0, pagination.DEFAULT_PAGE_SIZE),
+        (1, 1),
+        (-5, 1),
+        (50, 50),
+        (pagination.MAX_PAGE_SIZE, pagination.MAX_PAGE_SIZE),
+        (pagination.MAX_PAGE_SIZE + 1, pagination.MAX_PAGE_SIZE),
+        (10 ** 9, pagination.MAX_PAGE_SIZE),
+    ):
+        got = pagination.clamp_page_size(limit)
+        print(f"  limit {limit} -> {got}")
+        assert got == expected, f"limit {limit}: expected {expected}, got {got}"
+
+    print("[PASS] Page size clamping tests passed!\n")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Pagination Cursor Tests")
+    print("=" * 60 + "\n")
+
+    try:
+        test_round_trip()
+        test_rejected_cursors()
+        test_clamp_page_size()
+
+        print("=" * 60)
+        print("[SUCCESS] ALL TESTS PASSED!")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n[FAIL] TEST FAILED: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n[ERROR] UNEXPECTED ERROR: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,155 @@
+"""
+Round-trip tests for the stored pose series format (biome_coaching_agent/pose_store.py)
+No database, camera or MediaPipe needed: only encode_frames/decode_blob
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from biome_coaching_agent import pose_store  # noqa: E402
+
+# Quantization step is 1 / LANDMARK_SCALE; rounding is off by at most half of it
+TOLERANCE = 0.5 / pose_store.LANDMARK_SCALE + 1e-6
+LIMIT = 32767 / pose_store.LANDMARK_SCALE
+
+
+def make_frames(coords, angles=None, start_frame=0):
+    """Extractor-style frames from an (n, 33, 3) array of coordinates"""
+    frames = []
+    for i, frame_coords in enumerate(coords):
+        frames.append({
+            "frame": start_frame + 3 * i,
+            "angles": angles[i] if angles else {"left_knee": 90.0 + i, "back": 170.5},
+            "landmarks": [{"x": x, "y": y, "z": z} for x, y, z in frame_coords],
+        })
+    return frames
+
+
+def test_round_trip():
+    """Landmarks come back within one quantization step, the rest exactly"""
+    print("Testing round trip...")
+
+    rng = np.random.default_rng(7)
+    coords = rng.uniform(-0.5, 1.5, size=(40, pose_store.NUM_LANDMARKS, 3))
+    angles = [{"left_knee": float(a), "right_knee": float(b)} for a, b in rng.uniform(0, 180, (40, 2))]
+    frames = make_frames(coords, angles, start_frame=120)
+
+    series = pose_store.decode_blob(pose_store.encode_frames(frames))
+    assert series.frame_count == 40, "Frame count changed"
+    assert series.angle_keys == ["left_knee", "right_knee"], "Angle keys changed"
+    assert series.frame_indices.tolist() == [f["frame"] for f in frames], "Frame indices changed"
+    expected_angles = np.array([[a["left_knee"], a["right_knee"]] for a in angles], dtype=np.float32)
+    assert np.array_equal(series.angles, expected_angles), "Angles are not float32-exact"
+    error = np.max(np.abs(series.landmarks - coords))
+    print(f"  Max landmark error: {error:.6f} (tolerance {TOLERANCE:.6f})")
+    assert error <= TOLERANCE, "Landmarks drifted beyond one quantization step"
+
+    print("[PASS] Round trip tests passed!\n")
+
+
+def test_quantization_edges():
+    """Values on, between and past the int16 fixed-point limits"""
+    print("Testing quantization edges...")
+
+    step = 1 / pose_store.LANDMARK_SCALE
+    values = [0.0, step / 2 - 1e-9, step / 2 + 1e-9, -step / 2 - 1e-9, LIMIT, -LIMIT, 5.0, -5.0]
+    coords = np.array([np.full((pose_store.NUM_LANDMARKS, 3), v) for v in values])
+    series = pose_store.decode_blob(pose_store.encode_frames(make_frames(coords)))
+    decoded = series.landmarks[:, 0, 0].tolist()
+    expected = [0.0, 0.0, step, -step, LIMIT, -LIMIT, LIMIT, -3.2768]
+    for value, got, want in zip(values, decoded, expected):
+        print(f"  {value:+.6f} -> {got:+.6f} (expected {want:+.6f})")
+        assert abs(got - want) < 1e-6, f"Quantizing {value} gave {got}"
+
+    print("[PASS] Quantization edge tests passed!\n")
+
+
+def test_delta_wraparound():
+    """Jumps between the extremes overflow int16 deltas; decoding must wrap back"""
+    print("Testing delta wraparound...")
+
+    extremes = [LIMIT, -3.2768, LIMIT, 0.0, -3.2768, -3.2768, LIMIT]
+    coords = np.array([np.full((pose_store.NUM_LANDMARKS, 3), v) for v in extremes])
+    series = pose_store.decode_blob(pose_store.encode_frames(make_frames(coords)))
+    decoded = series.landmarks[:, pose_store.NUM_LANDMARKS - 1, 2].tolist()
+    print(f"  Decoded: {[round(v, 4) for v in decoded]}")
+    assert np.allclose(decoded, extremes, atol=TOLERANCE), "Wrapped deltas did not decode exactly"
+
+    print("[PASS] Delta wraparound tests passed!\n")
+
+
+def test_single_frame_and_codecs():
+    """A one-frame series, written with each available codec"""
+    print("Testing single frame and codecs...")
+
+    coords = np.full((1, pose_store.NUM_LANDMARKS, 3), 0.25)
+    frames = make_frames(coords)
+    saved = pose_store.zstandard
+    try:
+        for name, module in (("zstd", saved), ("zlib", None)):
+            if name == "zstd" and module is None:
+                print("  zstd: zstandard not installed, skipped")
+                continue
+            pose_store.zstandard = module
+            blob = pose_store.encode_frames(frames)
+            assert pose_store.CODEC_NAMES[blob[len(pose_store.MAGIC)]] == name, f"Blob not written with {name}"
+            series = pose_store.decode_blob(blob)
+            assert series.frame_count == 1 and abs(series.landmarks[0, 5, 1] - 0.25) <= TOLERANCE
+            print(f"  {name}: {len(blob)} bytes [OK]")
+    finally:
+        pose_store.zstandard = saved
+
+    print("[PASS] Single frame and codec tests passed!\n")
+
+
+def test_invalid_input():
+    """Empty series and foreign blobs are rejected"""
+    print("Testing invalid input...")
+
+    for label, call in (
+        ("empty frames", lambda: pose_store.encode_frames([])),
+        ("bad magic", lambda: pose_store.decode_blob(b"NOPE\x01\x00\x00\x00data")),
+    ):
+        try:
+            call()
+        except ValueError as e:
+            print(f"  {label}: ValueError({e}) [OK]")
+        else:
+            raise AssertionError(f"{label} was accepted")
+
+    print("[PASS] Invalid input tests passed!\n")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Pose Series Storage Tests")
+    print("=" * 60 + "\n")
+
+    try:
+        test_round_trip()
+        test_quantization_edges()
+        test_delta_wraparound()
+        test_single_frame_and_codecs()
+        test_invalid_input()
+
+        print("=" * 60)
+        print("[SUCCESS] ALL TESTS PASSED!")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n[FAIL] TEST FAILED: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n[ERROR] UNEXPECTED ERROR: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
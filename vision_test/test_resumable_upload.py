@@ -0,0 +1,206 @@
+"""
+Tests for resumable chunked uploads (biome_coaching_agent/resumable_upload.py)
+Covers the received-range bookkeeping, checksum-mismatch retries and finalize
+No database needed: uploads go to a temporary directory
+"""
+
+import contextlib
+import hashlib
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from biome_coaching_agent import ingest, resumable_upload  # noqa: E402
+from biome_coaching_agent.exceptions import ValidationError  # noqa: E402
+
+SIZE = 1000
+DATA = bytes((i * 7) % 251 for i in range(SIZE))
+
+
+@contextlib.contextmanager
+def temp_uploads_dir():
+    """Point the upload store at a temporary directory"""
+    saved = ingest.uploads_dir, resumable_upload.uploads_dir
+    with tempfile.TemporaryDirectory() as workdir:
+        ingest.uploads_dir = resumable_upload.uploads_dir = lambda: workdir
+        try:
+            yield workdir
+        finally:
+            ingest.uploads_dir, resumable_upload.uploads_dir = saved
+
+
+def send(upload_id, start, end, data=DATA, checksum=None):
+    """PUT one chunk the way the API does: streamed in pieces, then committed"""
+    chunk = data[start:end]
+    writer = resumable_upload.open_chunk(upload_id, start, len(chunk))
+    try:
+        for i in range(0, len(chunk), 64):
+            writer.write(chunk[i:i + 64])
+        return writer.commit(checksum or hashlib.sha256(chunk).hexdigest())
+    finally:
+        writer.close()
+
+
+def expect_validation_error(call, label):
+    try:
+        call()
+    except ValidationError as e:
+        print(f"  {label}: {e} [OK]")
+        return str(e)
+    raise AssertionError(f"{label} was accepted")
+
+
+def test_range_bookkeeping():
+    """Merging and subtracting [start, end) ranges"""
+    print("Testing range bookkeeping...")
+
+    merge = resumable_upload._merge_range
+    subtract = resumable_upload._subtract_range
+    for ranges, new, expected in (
+        ([], (0, 10), [[0, 10]]),
+        ([[0, 10]], (10, 20), [[0, 20]]),
+        ([[0, 10]], (5, 15), [[0, 15]]),
+        ([[20, 30]], (0, 10), [[0, 10], [20, 30]]),
+        ([[0, 10], [20, 30]], (10, 20), [[0, 30]]),
+        ([[0, 50]], (10, 20), [[0, 50]]),
+        ([[10, 20], [30, 40]], (0, 100), [[0, 100]]),
+    ):
+        got = merge(ranges, *new)
+        print(f"  {ranges} + {list(new)} -> {got}")
+        assert got == expected, f"Merging {new} into {ranges} gave {got}"
+    for ranges, gone, expected in (
+        ([[0, 100]], (20, 30), [[0, 20], [30, 100]]),
+        ([[0, 100]], (0, 30), [[30, 100]]),
+        ([[0, 100]], (90, 120), [[0, 90]]),
+        ([[0, 10], [20, 30], [40, 50]], (5, 45), [[0, 5], [45, 50]]),
+        ([[0, 10]], (20, 30), [[0, 10]]),
+        ([[0, 10]], (0, 10), []),
+    ):
+        got = subtract(ranges, *gone)
+        print(f"  {ranges} - {list(gone)} -> {got}")
+        assert got == expected, f"Subtracting {gone} from {ranges} gave {got}"
+
+    print("[PASS] Range bookkeeping tests passed!\n")
+
+
+def test_out_of_order_and_overlapping_chunks():
+    """Chunks in any order, overlapping or adjacent, assemble the original file"""
+    print("Testing out-of-order and overlapping chunks...")
+
+    with temp_uploads_dir():
+        upload_id = resumable_upload.initiate_upload("squat.mp4", SIZE, "squat").upload_id
+        for start, end, received in (
+            (500, 800, [[500, 800]]),
+            (0, 300, [[0, 300], [500, 800]]),
+            (250, 520, [[0, 800]]),
+            (800, SIZE, [[0, SIZE]]),
+        ):
+            manifest = send(upload_id, start, end)
+            print(f"  Sent {start}-{end}: received {manifest.received}")
+            assert manifest.received == received, f"Unexpected ranges after {start}-{end}"
+        assert manifest.is_complete and manifest.missing == [], "Upload not complete"
+
+        manifest, stored = resumable_upload.finalize_upload(upload_id, hashlib.sha256(DATA).hexdigest())
+        with open(stored.path, "rb") as f:
+            assert f.read() == DATA, "Assembled file differs"
+        assert stored.content_hash == hashlib.sha256(DATA).hexdigest()
+        print(f"  Finalized into {os.path.basename(stored.path)} [OK]")
+
+    print("[PASS] Out-of-order and overlapping chunk tests passed!\n")
+
+
+def test_bad_retry_forgets_range():
+    """A retry with bad bytes drops that range and every chunk overlapping it"""
+    print("Testing retry with a bad checksum...")
+
+    with temp_uploads_dir():
+        upload_id = resumable_upload.initiate_upload("squat.mp4", SIZE, "squat").upload_id
+        send(upload_id, 0, 300)
+        send(upload_id, 250, 520)
+        send(upload_id, 600, SIZE)
+
+        corrupt = bytearray(DATA)
+        corrupt[10] ^= 0xFF
+        expect_validation_error(
+            lambda: send(upload_id, 0, 300, data=bytes(corrupt), checksum=hashlib.sha256(DATA[:300]).hexdigest()),
+            "Corrupt retry",
+        )
+        manifest = resumable_upload.get_upload(upload_id)
+        print(f"  Received after the bad retry: {manifest.received}")
+        assert manifest.received == [[600, SIZE]], "Overwritten ranges still counted as received"
+        assert sorted(manifest.chunk_checksums) == ["600"], "Stale chunk checksums kept"
+        assert manifest.to_status()["missing_ranges"] == [[0, 600]]
+
+        for start, end in ((0, 300), (250, 520), (520, 600)):
+            send(upload_id, start, end)
+        _, stored = resumable_upload.finalize_upload(upload_id)
+        with open(stored.path, "rb") as f:
+            assert f.read() == DATA, "Re-sent ranges did not restore the file"
+
+    print("[PASS] Bad retry tests passed!\n")
+
+
+def test_finalize_reports_problems():
+    """Finalize lists missing ranges and chunks whose bytes changed on disk"""
+    print("Testing finalize checks...")
+
+    with temp_uploads_dir():
+        upload_id = resumable_upload.initiate_upload("squat.mp4", SIZE, "squat").upload_id
+        send(upload_id, 100, 400)
+        send(upload_id, 700, 900)
+        message = expect_validation_error(lambda: resumable_upload.finalize_upload(upload_id), "Incomplete")
+        assert "0-99, 400-699, 900-999" in message, "Missing ranges not reported"
+
+        send(upload_id, 0, 100)
+        send(upload_id, 400, 700)
+        send(upload_id, 900, SIZE)
+        # A torn write after the chunk was acknowledged
+        with open(resumable_upload._part_path(upload_id), "r+b") as f:
+            f.seek(450)
+            f.write(b"\x00" * 10)
+        message = expect_validation_error(lambda: resumable_upload.finalize_upload(upload_id), "Torn chunk")
+        assert "400" in message, "Bad chunk offset not reported"
+        manifest = resumable_upload.get_upload(upload_id)
+        assert manifest.missing == [[400, 700]], f"Expected 400-700 missing, got {manifest.missing}"
+
+        send(upload_id, 400, 700)
+        expect_validation_error(
+            lambda: resumable_upload.finalize_upload(upload_id, "0" * 64), "Whole-file hash mismatch"
+        )
+        _, stored = resumable_upload.finalize_upload(upload_id, hashlib.sha256(DATA).hexdigest())
+        assert stored.size_bytes == SIZE
+        print("  Finalized after re-sending [OK]")
+
+    print("[PASS] Finalize tests passed!\n")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Resumable Upload Tests")
+    print("=" * 60 + "\n")
+
+    try:
+        test_range_bookkeeping()
+        test_out_of_order_and_overlapping_chunks()
+        test_bad_retry_forgets_range()
+        test_finalize_reports_problems()
+
+        print("=" * 60)
+        print("[SUCCESS] ALL TESTS PASSED!")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n[FAIL] TEST FAILED: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n[ERROR] UNEXPECTED ERROR: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,158 @@
+"""
+S3 storage backend tests against moto's in-memory S3 (biome_coaching_agent/storage.py)
+Covers multipart put, ranged fetch with content-hash verification and the local cache
+Requires: pip install "moto[s3]" boto3
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for _name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_SESSION_TOKEN"):
+    os.environ[_name] = "testing"
+os.environ.pop("AWS_PROFILE", None)
+
+from boto3.s3.transfer import TransferConfig  # noqa: E402
+from moto import mock_aws  # noqa: E402
+
+from biome_coaching_agent import storage  # noqa: E402
+from biome_coaching_agent.exceptions import StorageError  # noqa: E402
+
+BUCKET = "vids"
+# S3's minimum part size, so the test object is uploaded in three parts
+PART_SIZE = 5 * 1024 * 1024
+VIDEO_SIZE = 2 * PART_SIZE + 12345
+
+
+class CountingClient:
+    """Wraps the boto3 client to count ranged GETs"""
+
+    def __init__(self, client):
+        self._client = client
+        self.ranges = []
+
+    def get_object(self, **kwargs):
+        self.ranges.append(kwargs.get("Range"))
+        return self._client.get_object(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def make_backend(cache_dir):
+    backend = storage.S3Storage(bucket=BUCKET, prefix="videos/", region="us-east-1", cache_dir=cache_dir)
+    backend.client = CountingClient(backend.client)
+    backend._transfer = TransferConfig(multipart_threshold=PART_SIZE, multipart_chunksize=PART_SIZE)
+    return backend
+
+
+def write_video(directory, data):
+    key = f"{hashlib.sha256(data).hexdigest()}.mp4"
+    path = os.path.join(directory, key)
+    with open(path, "wb") as f:
+        f.write(data)
+    return key, path
+
+
+def check_multipart_put(workdir, data):
+    """Uploads above the part size go out as multipart; re-puts are skipped"""
+    print("Testing multipart put...")
+
+    uploader = make_backend(os.path.join(workdir, "ingest"))
+    key, path = write_video(uploader.cache.root, data)
+    assert uploader.put_file(key, path), "First put did not create the object"
+    head = uploader.client.head_object(Bucket=BUCKET, Key=f"videos/{key}")
+    parts = head["ETag"].strip('"').partition("-")[2]
+    print(f"  Uploaded {head['ContentLength']} bytes in {parts or 1} parts, type {head['ContentType']}")
+    assert head["ContentLength"] == len(data), "Object size differs"
+    assert parts == "3", "Upload was not split into parts"
+    assert head["ContentType"] == "video/mp4", "Content type not set"
+    assert not uploader.put_file(key, path), "Second put rewrote an existing object"
+    assert uploader.uri(key) == f"s3://{BUCKET}/videos/{key}"
+    assert uploader.key_for(uploader.uri(key)) == key
+
+    print("[PASS] Multipart put tests passed!\n")
+    return key
+
+
+def check_ranged_fetch_and_cache(workdir, key, data):
+    """A worker without the file fetches it by ranges, verifies it, then reads its cache"""
+    print("Testing ranged fetch and cache...")
+
+    worker = make_backend(os.path.join(workdir, "worker"))
+    path = worker.local_path(key)
+    with open(path, "rb") as f:
+        assert f.read() == data, "Cached copy differs from the upload"
+    expected = -(-len(data) // storage.TRANSFER_CHUNK_SIZE)
+    print(f"  Fetched with {len(worker.client.ranges)} ranged GETs: {worker.client.ranges}")
+    assert len(worker.client.ranges) == expected, "Unexpected number of ranged GETs"
+    assert all(r and r.startswith("bytes=") for r in worker.client.ranges), "GET without a Range"
+    assert not [n for n in os.listdir(worker.cache.root) if n.endswith(".part")], "Temp file left behind"
+
+    worker.client.ranges.clear()
+    assert worker.local_path(key) == path, "Cache hit resolved to another path"
+    print(f"  Second read: {len(worker.client.ranges)} GETs (cache hit)")
+    assert worker.client.ranges == [], "Cache hit downloaded the object again"
+
+    tail = b"".join(worker.iter_range(key, len(data) - 100, len(data) - 1, chunk_size=64))
+    assert tail == data[-100:], "Partial ranged read returned wrong bytes"
+
+    print("[PASS] Ranged fetch and cache tests passed!\n")
+
+
+def check_hash_mismatch(workdir, data):
+    """An object whose bytes do not match its content-hash key is never cached"""
+    print("Testing hash verification...")
+
+    worker = make_backend(os.path.join(workdir, "verifier"))
+    key = f"{hashlib.sha256(b'something else').hexdigest()}.mp4"
+    worker.client.put_object(Bucket=BUCKET, Key=f"videos/{key}", Body=data[:1000])
+    try:
+        worker.local_path(key)
+    except StorageError as e:
+        print(f"  Rejected: {e} [OK]")
+    else:
+        raise AssertionError("Corrupt object was accepted")
+    assert os.listdir(worker.cache.root) == [], "Corrupt or partial copy left in the cache"
+
+    print("[PASS] Hash verification tests passed!\n")
+
+
+def test_s3_storage():
+    """Upload, fetch and verify one video through a mocked bucket"""
+    with mock_aws(), tempfile.TemporaryDirectory() as workdir:
+        storage.boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        data = os.urandom(VIDEO_SIZE)
+        key = check_multipart_put(workdir, data)
+        check_ranged_fetch_and_cache(workdir, key, data)
+        check_hash_mismatch(workdir, data)
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("S3 Storage Backend Tests (moto)")
+    print("=" * 60 + "\n")
+
+    try:
+        test_s3_storage()
+
+        print("=" * 60)
+        print("[SUCCESS] ALL TESTS PASSED!")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n[FAIL] TEST FAILED: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n[ERROR] UNEXPECTED ERROR: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())